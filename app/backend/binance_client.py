@@ -11,6 +11,3 @@ def get_spot() -> Spot:
         api_secret=settings.BINANCE_API_SECRET,
         base_url=settings.BINANCE_BASE_URL if settings.BINANCE_TESTNET else None
     )
-
-# Cliente global (opcional)
-c = get_spot()
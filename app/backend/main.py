@@ -10,39 +10,55 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from app.backend.routes import equity
 from app.backend.routes import profitability
 from app.core import router_bot  # 👈 import nuevo
-from app.core.binance_client import get_spot
-from app.core.data_preparator import prepare_ohlcv_csv, DataPreparatorAPI
+from app.core.data_preparator import DataPreparatorAPI
 from app.core.db import engine, Base
 from app.core.db import SessionLocal
 from app.core.order_service import open_market_quote, close_position_market
+from app.core.price_cache import price_cache
+from app.core.exchange import AsyncExchange, get_exchange
+from app.core.symbol_index import symbol_index
+from app.core.liquidation import liquidate
+from app.core.user_stream import account_state
+from app.core.reconciler import reconciler
+from app.core.write_queue import write_queue
+from app.core.db_writer import DB_WRITER_LISTEN, get_writer
+from app.core.pg_migrate import tune_postgres
+from app.core.candle_cache import candle_cache, empty_candles_payload
+from app.core.optimizer import SearchSpace, SweepJob, apply_best
+from app.core.candle_store import candle_store
+from app.core.feature_store import feature_store
+from app.core.train_jobs import train_params, training_service
+from app.core.smart_search import SMART_RETRAIN_HOURS
+from app.core.model_registry import STRATEGIES, model_registry
+from app.core.smart_signals import score_symbols
+from app.core.trade_queries import closed_positions_query, after_cursor, encode_cursor
+from app.core import pnl_stats
+from app.core import equity_rollups
 # from app.core.scheduler import start_scheduler
-from app.core.smart_trading_api import SmartTradingAPI, load_manifest, GoldenRules, smart_train_and_export
+from app.core.smart_trading_api import SmartTradingAPI, load_manifest
 from app.ws import router as ws_router
 from app.ws.router import register_cache_preloader
 from app.ws.binance_stream import launch_all
 
 
-from app.core.smart_trading_api import (GoldenRules, smart_train_and_export, load_manifest, load_xgb_model, add_indicators, ensure_features, apply_dsl_rules, predict_signal_from_model)
+from app.core.smart_trading_api import (load_manifest, load_xgb_model)
 
 from datetime import datetime, timedelta
 from multiprocessing import Manager
 
 from ..core.config import settings
 from ..core.db import Base
-from ..core.models import Position, Trade, EquitySnapshot, DecisionLog,TradingConfig
+from ..core.models import Position, EquitySnapshot, DecisionLog,TradingConfig
 from ..core.migrate import run_sqlite_migrations
-from ..core.binance_client import get_spot
 from ..core.db import engine, get_session
-from ..core.indicators import ema, rsi, macd
 
 from binance.error import ClientError
 
 from fastapi import FastAPI, Depends, Query, Body, APIRouter, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse 
+from fastapi.responses import StreamingResponse, Response
 from fastapi import File, UploadFile
 from fastapi import WebSocket, WebSocketDisconnect
-from functools import lru_cache
 
 
 from starlette.websockets import WebSocketState
@@ -54,13 +70,12 @@ from typing import Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-import pandas as pd
 import xgboost as xgb
 import numpy as np
 import uuid
 import json, asyncio
 import os, traceback
-import math
+import time
 import logging
 import sys
 import uvicorn
@@ -156,17 +171,17 @@ async def get_open_positions(session: AsyncSession):
 
 async def close_position_obj(session: AsyncSession, pos: Position):
     """Cierra una posición abierta en el exchange y la marca como cerrada."""
-    c = get_spot()
+    c = get_exchange()
     try:
         side = "SELL" if pos.side == "BUY" else "BUY"
 
-        precision = get_symbol_precision(pos.symbol)
-        qty = round(float(pos.qty), precision)
+        await symbol_index.ensure()
+        qty = adjust_quantity(pos.symbol, float(pos.qty))
         if qty <= 0:
             logger.error(f"[close_position_obj] ❌ Cantidad 0 para {pos.symbol}")
             return
 
-        order = c.new_order(
+        order = await c.new_order(
             symbol=pos.symbol,
             side=side,
             type="MARKET",
@@ -174,9 +189,7 @@ async def close_position_obj(session: AsyncSession, pos: Position):
         )
         logger.info(f"[close_position_obj] ✅ Cerrada {pos.symbol}: qty={qty}, side={side}")
 
-        pos.status = "CLOSED"
-        pos.closed_at = datetime.utcnow()
-        await session.commit()
+        await get_writer().call("close_positions", ids=[pos.id])
 
     except Exception as e:
         await session.rollback()
@@ -185,17 +198,18 @@ async def close_position_obj(session: AsyncSession, pos: Position):
 
 async def sync_positions_with_binance(session: AsyncSession):
     """Sincroniza las posiciones locales con Binance (actualiza status y qty)."""
-    c = get_spot()
+    c = get_exchange()
     try:
         # 1️⃣ Traer balances y posiciones abiertas desde Binance
-        account_info = c.account()
+        account_info = await c.account()
         balances = {b["asset"]: float(b["free"]) + float(b["locked"]) for b in account_info["balances"]}
-        open_orders = c.get_open_orders()  # si tu API wrapper lo soporta
+        open_orders = await c.get_open_orders()  # si tu API wrapper lo soporta
 
         # 2️⃣ Buscar todas las posiciones locales abiertas
         result = await session.execute(select(Position).where(Position.status == "OPEN"))
         open_positions = result.scalars().all()
 
+        to_close = []
         for pos in open_positions:
             symbol = pos.symbol
             base_asset = symbol.replace("USDT", "")  # asumiendo pares tipo XXXUSDT
@@ -204,11 +218,11 @@ async def sync_positions_with_binance(session: AsyncSession):
             # Verificar si Binance ya no tiene posición o balance
             if balance <= 0:
                 logger.info(f"[sync] Cerrando localmente {symbol} (balance {balance})")
-                pos.status = "CLOSED"
-                pos.qty = 0.0
-                pos.closed_at = datetime.utcnow()
+                to_close.append(pos.id)
 
-        await session.commit()
+        # 3️⃣ Mutaciones por el escritor único
+        if to_close:
+            await get_writer().call("close_positions", ids=to_close)
         logger.info(f"[sync] 🔁 Sincronización completa ({len(open_positions)} posiciones revisadas).")
 
     except Exception as e:
@@ -219,24 +233,11 @@ async def sync_positions_with_binance(session: AsyncSession):
 # ------------------------------------------
 # ✅ Ajuste de cantidad según LOT_SIZE Binance
 # ------------------------------------------
-def adjust_quantity_from_info(symbol: str, qty: float, exchange_info: dict) -> float:
-    """Ajusta la cantidad (qty) según el filtro LOT_SIZE del símbolo."""
-    try:
-        symbol_info = next((s for s in exchange_info["symbols"] if s["symbol"] == symbol), None)
-        if not symbol_info:
-            return round(qty, 6)
-
-        lot_filter = next((f for f in symbol_info["filters"] if f["filterType"] == "LOT_SIZE"), None)
-        if not lot_filter:
-            return round(qty, 6)
-
-        step_size = float(lot_filter["stepSize"])
-        precision = abs(int(round(-math.log10(step_size)))) if step_size < 1 else 0
-        adj_qty = math.floor(qty / step_size) * step_size
-        return round(adj_qty, precision)
-    except Exception as e:
-        logger.error(f"[adjust_quantity_from_info] ⚠️ Error ajustando {symbol}: {e}")
+def adjust_quantity(symbol: str, qty: float) -> float:
+    """Ajusta la cantidad (qty) según el filtro LOT_SIZE del símbolo (índice en memoria)."""
+    if symbol not in symbol_index:
         return round(qty, 6)
+    return symbol_index.round_qty(symbol, qty)
 
 
 
@@ -246,105 +247,71 @@ def adjust_quantity_from_info(symbol: str, qty: float, exchange_info: dict) -> f
 async def close_all_open_positions(session: AsyncSession):
     """
     Cierra todas las posiciones abiertas en Binance y en la base local.
-    - Cancela órdenes pendientes
-    - Envía orden MARKET inversa
-    - Verifica que el balance sea cero
-    - Sincroniza posiciones al final
+    - Agrupa por símbolo y liquida todos los símbolos en paralelo
+      (cancela órdenes pendientes + MARKET inversa)
+    - Confirma el fill con la respuesta de la orden / user-data stream
+    - Registra el trade de salida y reconcilia balances una sola vez al final
     """
-    c = get_spot()
-    closed_symbols = []
+    c = get_exchange()
+    t0 = time.perf_counter()
 
     try:
-        # Cachear info de símbolos para evitar llamadas repetidas
-        exchange_info = c.exchange_info()
-
         # Obtener posiciones abiertas
         result = await session.execute(select(Position).where(Position.status == "OPEN"))
         open_positions = result.scalars().all()
 
         if not open_positions:
             logger.info("[close_all_open_positions] No hay posiciones abiertas.")
-            return {"closed": [], "count": 0}
+            return {"closed": [], "count": 0, "results": []}
 
         logger.info(f"[close_all_open_positions] 🔍 Cerrando {len(open_positions)} posiciones abiertas...")
 
-        # Recorremos posiciones abiertas
-        for pos in open_positions:
-            try:
-                symbol = pos.symbol.upper()
-                side = pos.side
-                qty = float(pos.qty)
-
-                if qty <= 0:
-                    continue
-
-                opposite = "SELL" if side == "BUY" else "BUY"
-
-                # 1️⃣ Cancelar órdenes pendientes
-                try:
-                    c.cancel_open_orders(symbol)
-                    logger.info(f"[close_all_open_positions] 🧹 Órdenes pendientes canceladas para {symbol}")
-                except Exception as e:
-                    if "-2011" in str(e) or "Unknown order" in str(e):
-                       # No hay órdenes abiertas, ignorar
-                       logger.info(f"[close_all_open_positions] ℹ️ Sin órdenes pendientes para {symbol}")
-                    else:
-                       logger.error(f"[close_all_open_positions] ⚠️ Error cancelando órdenes en {symbol}: {e}")
-
-
-                # 2️⃣ Ajustar cantidad según LOT_SIZE
-                adj_qty = adjust_quantity_from_info(symbol, qty, exchange_info)
-                if adj_qty <= 0:
-                    logger.error(f"[close_all_open_positions] ⚠️ Cantidad ajustada inválida ({adj_qty}) para {symbol}, saltando...")
-                    continue
-
-                # 3️⃣ Enviar orden de cierre
-                try:
-                    order = c.new_order(symbol=symbol, side=opposite, type="MARKET", quantity=adj_qty)
-                    logger.info(f"[close_all_open_positions] ✅ Orden de cierre enviada para {symbol} ({adj_qty})")
-                except Exception as e:
-                    logger.error(f"[close_all_open_positions] ❌ Error al cerrar {symbol}: {e}")
-                    continue
-
-                # 4️⃣ Esperar confirmación
-                await asyncio.sleep(1.5)
-
-                # 5️⃣ Verificar balances post-cierre
-                try:
-                    account_info = c.account()
-                    balances = {
-                        b["asset"]: float(b["free"]) + float(b["locked"])
-                        for b in account_info["balances"]
-                    }
-                    base_asset = symbol.replace("USDT", "")
-                    balance = balances.get(base_asset, 0.0)
-
-                    if balance <= 0.0001:
-                        pos.status = "CLOSED"
-                        pos.closed_at = datetime.utcnow()
-                        pos.qty = 0.0
-                        closed_symbols.append(symbol)
-                        logger.info(f"[close_all_open_positions] ✅ Confirmado cerrado {symbol} (balance={balance})")
-                    else:
-                        logger.error(f"[close_all_open_positions] ⚠️ Balance residual en {symbol}: {balance}")
-                except Exception as e:
-                    logger.error(f"[close_all_open_positions] ⚠️ No se pudo verificar balance de {symbol}: {e}")
-
-            except Exception as e:
-                logger.error(f"[close_all_open_positions] ❌ Error en {getattr(pos, 'symbol', '?')}: {e}")
-
-        # 6️⃣ Commit local
-        await session.commit()
-
-        # 7️⃣ Sincronizar con Binance
+        results = await liquidate(c, open_positions)
+        by_id = {p.id: p for p in open_positions}
+        closed_symbols = []
+        exits = []
+
+        for r in results:
+            if not r.flat:
+                logger.error(f"[close_all_open_positions] ⚠️ {r.symbol} no quedó flat ({r.status}): {r.error}")
+                continue
+            positions = [by_id[i] for i in r.position_ids]
+            total_qty = sum(float(p.qty) for p in positions) or 1.0
+            for pos in positions:
+                share = float(pos.qty) / total_qty
+                exit_price = r.avg_price or pos.last_price or pos.entry_price
+                exit_qty = float(pos.qty)
+                fees = r.fees * share
+                pnl = (exit_price - pos.entry_price) * exit_qty if pos.side == "BUY" else (pos.entry_price - exit_price) * exit_qty
+                exits.append({
+                    "position_id": pos.id,
+                    "side": "SELL" if pos.side == "BUY" else "BUY",
+                    "qty": exit_qty,
+                    "price": exit_price,
+                    "fees": fees,
+                    "pnl": pnl - fees,
+                })
+            closed_symbols.append(r.symbol)
+
+        # Trades de salida + cierre en una transacción del escritor único
+        await session.rollback()  # soltar el snapshot de lectura
+        await get_writer().call("record_exits", exits=exits, close_method="STOP_ALL")
+
+        # Reconciliación única con Binance
         try:
             await sync_positions_with_binance(session)
             logger.info("[close_all_open_positions] 🔄 Sincronización completada post-cierre.")
         except Exception as e:
             logger.error(f"[close_all_open_positions] ⚠️ Error en sincronización final: {e}")
 
-        logger.info(f"✅ Todas las posiciones cerradas: {closed_symbols}")
-        return {"closed": closed_symbols, "count": len(closed_symbols)}
+        elapsed_ms = round((time.perf_counter() - t0) * 1000, 1)
+        logger.info(f"✅ Posiciones cerradas en {elapsed_ms} ms: {closed_symbols}")
+        return {
+            "closed": closed_symbols,
+            "count": len(closed_symbols),
+            "elapsed_ms": elapsed_ms,
+            "results": [r.as_dict() for r in results],
+        }
 
     except Exception as e:
         await session.rollback()
@@ -359,10 +326,10 @@ async def clean_local_positions(session: AsyncSession):
     """
     Limpia posiciones inconsistentes (qty=0 o sin balance real en Binance).
     """
-    c = get_spot()
+    c = get_exchange()
     cleaned = []
     try:
-        account = c.account()
+        account = await c.account()
         balances = {
             b["asset"]: float(b["free"]) + float(b["locked"])
             for b in account.get("balances", [])
@@ -371,6 +338,7 @@ async def clean_local_positions(session: AsyncSession):
         result = await session.execute(select(Position).where(Position.status == "OPEN"))
         positions = result.scalars().all()
 
+        ids = []
         for p in positions:
             base = p.symbol.replace("USDT", "")
             balance = balances.get(base, 0.0)
@@ -378,12 +346,11 @@ async def clean_local_positions(session: AsyncSession):
             # Condiciones de cierre local
             if p.qty <= 0 or balance <= 0.0001 or (p.method or "").upper().startswith("BINANCE_SYNC"):
                 logger.info(f"[clean_local_positions] 🧹 Corrigiendo {p.symbol} (qty={p.qty}, balance={balance}, method={p.method})")
-                p.status = "CLOSED"
-                p.qty = 0
-                p.closed_at = datetime.utcnow()
+                ids.append(p.id)
                 cleaned.append(p.symbol)
 
-        await session.commit()
+        if ids:
+            await get_writer().call("close_positions", ids=ids)
         logger.info(f"[clean_local_positions] ✅ Limpieza completada ({len(cleaned)} posiciones corregidas).")
         return {"cleaned": cleaned, "count": len(cleaned)}
 
@@ -397,45 +364,41 @@ async def calculate_equity(session: AsyncSession) -> dict:
     """
     Calcula equity total = saldo líquido USDT + valor de posiciones abiertas.
     """
-    c = get_spot()
-    info = c.account()
+    if account_state.live:
+        # Balance mantenido por el user-data stream (sin REST)
+        balance_usdt = account_state.total("USDT")
+    else:
+        c = get_exchange()
+        info = await c.account()
 
-    usdt_free = usdt_locked = 0.0
-    for b in info.get("balances", []):
-        if b.get("asset") == "USDT":
-            usdt_free = float(b.get("free", 0))
-            usdt_locked = float(b.get("locked", 0))
-            break
-    balance_usdt = usdt_free + usdt_locked
+        usdt_free = usdt_locked = 0.0
+        for b in info.get("balances", []):
+            if b.get("asset") == "USDT":
+                usdt_free = float(b.get("free", 0))
+                usdt_locked = float(b.get("locked", 0))
+                break
+        balance_usdt = usdt_free + usdt_locked
 
     rows = (await session.execute(
         select(Position).where(Position.status == "OPEN")
     )).scalars().all()
 
-    try:
-        prices = {p["symbol"]: float(p["price"]) for p in c.ticker_price()}
-    except Exception:
-        prices = {}
-
     invested = 0.0
+    stale = set()
     for p in rows:
-        last = prices.get(p.symbol, p.entry_price)
-        invested += p.qty * last
+        quote = price_cache.read(p.symbol, fallback=p.entry_price)
+        if quote["stale"]:
+            stale.add(p.symbol)
+        invested += p.qty * quote["price"]
 
     equity = balance_usdt + invested
-    return {"balance_usdt": balance_usdt, "invested_usdt": invested, "equity": equity}
-
-
-@lru_cache(maxsize=100)
-def get_symbol_precision(symbol: str) -> int:
-    c = get_spot()
-    info = c.exchange_info(symbol=symbol)
-    filters = info["symbols"][0]["filters"]
-    lot_filter = next((f for f in filters if f["filterType"] == "LOT_SIZE"), None)
-    if not lot_filter:
-        return 3
-    step_size = float(lot_filter["stepSize"])
-    return abs(int(round(math.log10(step_size)))) if step_size < 1 else 0
+    return {
+        "balance_usdt": balance_usdt,
+        "invested_usdt": invested,
+        "equity": equity,
+        "prices_stale": bool(stale),          # alguna posición valuada con precio viejo o de entrada
+        "stale_symbols": sorted(stale),
+    }
 
 
 @app.get("/health")
@@ -535,64 +498,69 @@ async def get_decision_logs(
 @app.get("/equity")
 async def get_equity(
     days: int = Query(30, description="Cantidad de días a traer"),
+    points: int = Query(equity_rollups.DEFAULT_POINTS, ge=10, le=5000, description="Puntos máximos (LTTB)"),
+    resolution: Optional[str] = Query(None, description="1m | 5m | 1h | 1d (por defecto automática)"),
     session: AsyncSession = Depends(get_session)
 ):
-    q = await session.execute(
-        select(EquitySnapshot)
-        .order_by(EquitySnapshot.ts.desc())
-        .limit(days * 24 * 12)
-    )
-    rows = q.scalars().all()
-
-    results = []
-    for r in rows:
-        invested_usdt = max(r.equity - r.balance_usdt, 0.0)
-        results.append({
-            "ts": r.ts.isoformat(),
-            "balance_usdt": float(r.balance_usdt),
-            "invested_usdt": float(invested_usdt),
-            "equity": float(r.equity),
-        })
-    return results
+    rows = await equity_rollups.history(session, timedelta(days=days), resolution=resolution, points=points)
+    return [
+        {
+            "ts": r["ts"],
+            "balance_usdt": float(r["free"]),
+            "invested_usdt": float(r["invested"]),
+            "equity": float(r["close"]),
+        }
+        for r in rows
+    ]
+
+
+PCT_WINDOWS = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+    "3m": timedelta(days=90),
+    "6m": timedelta(days=180),
+    "12m": timedelta(days=365),
+}
 
 
 @app.get("/profitability")
-async def profitability(session: AsyncSession = Depends(get_session)):
-    snaps = (await session.execute(
-        select(EquitySnapshot).order_by(EquitySnapshot.ts.asc())
-    )).scalars().all()
+async def profitability(
+    range: str = Query("30d", description="Rango de `snapshots` (1h, 24h, 7d, 30d, 6m, 12m, all)"),
+    points: int = Query(equity_rollups.DEFAULT_POINTS, ge=10, le=5000),
+    session: AsyncSession = Depends(get_session)
+):
+    last = await equity_rollups.latest_snapshot(session)
 
-    if not snaps:
+    if not last:
         return {
             "latest_balance": 0.0, "latest_equity": 0.0,
             "pct": {}, "balance_change": {}, "projected_30d": {}
         }
 
-    now = snaps[-1].ts
+    try:
+        span = equity_rollups.parse_span(range)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    now = last.ts
     latest = await calculate_equity(session)
     latest_equity = latest["equity"]
     latest_balance = latest["balance_usdt"]
 
-    def pct_from(delta: timedelta):
-        ref_snap = _closest_snapshot(snaps, now - delta)
+    refs = {k: await equity_rollups.nearest_total(session, now - d) for k, d in PCT_WINDOWS.items()}
+
+    def pct_from(window: str):
+        ref_snap = refs[window]
         if ref_snap is None or ref_snap == 0:
             return 0.0
         return round((latest_equity - ref_snap) / ref_snap * 100.0, 2)
 
-    pct_map = {
-        "1h": pct_from(timedelta(hours=1)),
-        "24h": pct_from(timedelta(hours=24)),
-        "7d": pct_from(timedelta(days=7)),
-        "30d": pct_from(timedelta(days=30)),
-        "3m": pct_from(timedelta(days=90)),
-        "6m": pct_from(timedelta(days=180)),
-        "12m": pct_from(timedelta(days=365)),
-    }
+    pct_map = {k: pct_from(k) for k in PCT_WINDOWS}
 
     balance_change = {
-        "1h": latest_equity - (_closest_snapshot(snaps, now - timedelta(hours=1)) or latest_equity),
-        "24h": latest_equity - (_closest_snapshot(snaps, now - timedelta(hours=24)) or latest_equity),
-        "30d": latest_equity - (_closest_snapshot(snaps, now - timedelta(days=30)) or latest_equity),
+        k: latest_equity - (refs[k] or latest_equity) for k in ("1h", "24h", "30d")
     }
 
     def proj_30d_from_pct(pct: float, window: str) -> float:
@@ -617,12 +585,14 @@ async def profitability(session: AsyncSession = Depends(get_session)):
     return {
         "latest_balance": latest_balance,
         "latest_equity": latest_equity,
+        "prices_stale": latest["prices_stale"],
+        "stale_symbols": latest["stale_symbols"],
         "pct": pct_map,
         "balance_change": balance_change,
         "projected_30d": projected_30d,
         "snapshots": [
-            {"ts": s.ts.isoformat(), "equity": s.equity, "balance_usdt": s.balance_usdt}
-            for s in snaps
+            {"ts": r["ts"], "equity": r["close"], "balance_usdt": r["free"]}
+            for r in await equity_rollups.history(session, span, end=now, points=points)
         ]
     }
 
@@ -631,19 +601,14 @@ async def profitability(session: AsyncSession = Depends(get_session)):
 # -----------------------
 # Selección de símbolos
 # -----------------------
-def pick_10_symbols_lazy() -> List[str]:
+async def pick_10_symbols_lazy() -> List[str]:
     if getattr(app.state, "symbols", None):
         return app.state.symbols
 
     try:
-        c = get_spot()
         try:
-            ex = c.exchange_info()
-            all_usdt = [
-                s["symbol"]
-                for s in ex.get("symbols", [])
-                if s.get("status") == "TRADING" and s.get("quoteAsset") == "USDT"
-            ]
+            await symbol_index.ensure()
+            all_usdt = symbol_index.symbols(quote="USDT")
         except Exception:
             all_usdt = []
 
@@ -666,8 +631,8 @@ def pick_10_symbols_lazy() -> List[str]:
 
 
 @app.get("/status")
-def status():
-    syms = pick_10_symbols_lazy()
+async def status():
+    syms = await pick_10_symbols_lazy()
     return {
         "live": True,
         "env": "TESTNET" if settings.BINANCE_TESTNET else "REAL",
@@ -679,10 +644,9 @@ def status():
 # Balance de cuenta
 # -----------------------
 @app.get("/account/balance")
-def account_balance():
+async def account_balance(c: AsyncExchange = Depends(get_exchange)):
     try:
-        c = get_spot()
-        info = c.account()
+        info = await c.account()
 
         usdt_free = usdt_locked = 0.0
         for b in info.get("balances", []):
@@ -714,18 +678,55 @@ def account_balance():
 # Tickers
 # -----------------------
 @app.get("/tickers")
-def tickers():
-    try:
-        c = get_spot()
-        prices = {p["symbol"]: float(p["price"]) for p in c.ticker_price()}
-    except Exception as e:
-        # Si Binance no responde, devolvemos precios None
-        prices = {}
+async def tickers():
+    # Lectura desde caché (sin REST): incluye antigüedad del precio
+    return [price_cache.read(s) for s in await pick_10_symbols_lazy()]
 
-    return [
-        {"symbol": s, "price": prices.get(s)}
-        for s in pick_10_symbols_lazy()
-    ]
+
+@app.get("/tickers/cache")
+def tickers_cache_stats():
+    return price_cache.stats()
+
+
+@app.get("/exchange/metrics")
+def exchange_metrics(c: AsyncExchange = Depends(get_exchange)):
+    # Latencia / peso por endpoint y estado del limitador de REQUEST_WEIGHT
+    return c.metrics()
+
+
+@app.get("/persistence/stats")
+def persistence_stats():
+    # Profundidad de la cola write-behind y latencia de flush
+    return write_queue.stats()
+
+
+@app.get("/persistence/writer")
+def db_writer_stats():
+    # Escritor único: comandos, lotes, latencia de encolado→commit
+    return get_writer().stats()
+
+
+@app.get("/account/stream")
+def account_stream_status():
+    # Estado del user-data stream / reconciliador (balances en memoria, eventos, snapshots)
+    return reconciler.stats()
+
+
+@app.get("/exchange/symbols/{symbol}")
+async def exchange_symbol_filters(symbol: str):
+    await symbol_index.ensure()
+    f = symbol_index.get(symbol)
+    if not f:
+        raise HTTPException(status_code=404, detail=f"Símbolo desconocido: {symbol}")
+    return {
+        "symbol": f.symbol,
+        "status": f.status,
+        "step_size": str(f.step_size),
+        "min_qty": str(f.min_qty),
+        "tick_size": str(f.tick_size),
+        "min_notional": str(f.min_notional),
+        "index": symbol_index.stats(),
+    }
 
 
 
@@ -738,17 +739,11 @@ async def positions_open(session: AsyncSession = Depends(get_session)):
         await session.execute(select(Position).where(Position.status == "OPEN"))
     ).scalars().all()
 
-    prices: Dict[str, float] = {}
-    try:
-        c = get_spot()
-        prices = {p["symbol"]: float(p["price"]) for p in c.ticker_price()}
-    except Exception as e:
-        # Si no hay conexión a Binance, seguimos con entry_price
-        prices = {}
-
     out = []
     for p in rows:
-        last = prices.get(p.symbol, p.entry_price)
+        # Si no hay precio en caché, seguimos con entry_price (marcado stale)
+        quote = price_cache.read(p.symbol, fallback=p.entry_price)
+        last = quote["price"]
         pnl = (last - p.entry_price) * (p.qty if p.side == "BUY" else -p.qty)
         out.append({
             "id": p.id,
@@ -756,6 +751,8 @@ async def positions_open(session: AsyncSession = Depends(get_session)):
             "qty": p.qty,
             "entry_price": p.entry_price,
             "last_price": last,
+            "price_age_ms": quote["age_ms"],
+            "price_stale": quote["stale"],
             "sl": p.sl,
             "tp": p.tp,
             "side": p.side,
@@ -771,21 +768,14 @@ async def positions_open(session: AsyncSession = Depends(get_session)):
 
 @app.get("/positions/aggregate-by-symbol")
 async def positions_aggregate_by_symbol(session: AsyncSession = Depends(get_session)):
-    syms = pick_10_symbols_lazy()
+    syms = await pick_10_symbols_lazy()
     rows = (
         await session.execute(select(Position).where(Position.status == "OPEN"))
     ).scalars().all()
 
-    prices: Dict[str, float] = {}
-    try:
-        c = get_spot()
-        prices = {p["symbol"]: float(p["price"]) for p in c.ticker_price()}
-    except Exception:
-        prices = {}
-
     acc: Dict[str, Dict[str, float]] = {s: {"count": 0, "invested": 0.0, "pnl": 0.0} for s in syms}
     for p in rows:
-        last = prices.get(p.symbol, p.entry_price)
+        last = price_cache.read(p.symbol, fallback=p.entry_price)["price"]
         invested = p.qty * p.entry_price
         pnl = (last - p.entry_price) * p.qty if p.side == "BUY" else 0.0
         a = acc.setdefault(p.symbol, {"count": 0, "invested": 0.0, "pnl": 0.0})
@@ -803,50 +793,50 @@ async def positions_aggregate_by_symbol(session: AsyncSession = Depends(get_sess
             "invested_usdt": a["invested"],
             "pnl_usdt": a["pnl"],
             "pnl_pct": pct,
+            "price_stale": price_cache.read(s)["stale"],
         })
     return result
 
 
 @app.get("/positions/pnl-by-token")
 async def pnl_by_token(session: AsyncSession = Depends(get_session)):
-    syms = pick_10_symbols_lazy()
+    syms = await pick_10_symbols_lazy()
     rows = (
         await session.execute(select(Position).where(Position.status == "OPEN"))
     ).scalars().all()
 
-    prices: Dict[str, float] = {}
-    try:
-        c = get_spot()
-        prices = {p["symbol"]: float(p["price"]) for p in c.ticker_price()}
-    except Exception:
-        prices = {}
-
     acc: Dict[str, float] = {s: 0.0 for s in syms}
     for p in rows:
-        last = prices.get(p.symbol, p.entry_price)
+        last = price_cache.read(p.symbol, fallback=p.entry_price)["price"]
         pnl = (last - p.entry_price) * (p.qty if p.side == "BUY" else -p.qty)
         if p.symbol in acc:
             acc[p.symbol] += pnl
 
-    return [{"symbol": s, "pnl_usdt": acc.get(s, 0.0)} for s in syms]
+    return [
+        {"symbol": s, "pnl_usdt": acc.get(s, 0.0), "price_stale": price_cache.read(s)["stale"]}
+        for s in syms
+    ]
 
 
 
 @app.get("/trades/closed")
-async def trades_closed(session: AsyncSession = Depends(get_session)):
-    rows = (await session.execute(select(Position).where(Position.status=="CLOSED").order_by(Position.closed_at.desc()))).scalars().all()
+async def trades_closed(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    session: AsyncSession = Depends(get_session),
+):
+    stmt = after_cursor(closed_positions_query(), cursor)
+    if limit:
+        stmt = stmt.limit(limit)
+    rows = (await session.execute(stmt)).all()
+
     out = []
-    for p in rows:
-        t_first = (await session.execute(
-            select(Trade).where(Trade.position_id==p.id).order_by(Trade.created_at.asc())
-        )).scalars().first()
-        t_last = (await session.execute(
-            select(Trade).where(Trade.position_id==p.id).order_by(Trade.created_at.desc())
-        )).scalars().first()
-        entry = t_first.price if t_first else p.entry_price
-        exitp = t_last.price if t_last else p.entry_price
+    for p, entry_t, entry_fees, exit_t, exit_fees in rows:
+        entry = entry_t if entry_t is not None else p.entry_price
+        exitp = exit_t if exit_t is not None else p.entry_price
         pnl = (exitp - entry) * p.qty
-        fees = (t_first.fees if t_first else 0.0) + (t_last.fees if t_last else 0.0)
+        fees = (entry_fees or 0.0) + (exit_fees or 0.0)
         out.append({
             "position_id": p.id, "symbol": p.symbol, "qty": p.qty,
             "entry_price": entry, "exit_price": exitp,
@@ -854,22 +844,25 @@ async def trades_closed(session: AsyncSession = Depends(get_session)):
             "pnl_usdt": pnl, "fees_total": fees,
             "open_method": p.open_method, "close_method": p.close_method or ""
         })
+
+    if limit and len(rows) == limit:
+        last = rows[-1][0]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.closed_at, last.id)
     return out
 
 
 @app.get("/distribution/open-holdings")
-async def distribution_open_holdings(session: AsyncSession = Depends(get_session)):
+async def distribution_open_holdings(
+    session: AsyncSession = Depends(get_session),
+    c: AsyncExchange = Depends(get_exchange),
+):
     usdt_free = 0.0
     info = {}
-    prices: Dict[str, float] = {}
 
     try:
-        c = get_spot()
-        info = c.account()
-        prices = {p["symbol"]: float(p["price"]) for p in c.ticker_price()}
+        info = await c.account()
     except Exception:
         info = {}
-        prices = {}
 
     # Saldo USDT libre
     for b in info.get("balances", []):
@@ -883,73 +876,70 @@ async def distribution_open_holdings(session: AsyncSession = Depends(get_session
     ).scalars().all()
 
     acc: Dict[str, float] = {}
+    stale: Dict[str, bool] = {}
     for p in rows:
-        last = prices.get(p.symbol, p.entry_price)
-        acc[p.symbol] = acc.get(p.symbol, 0.0) + p.qty * last
+        quote = price_cache.read(p.symbol, fallback=p.entry_price)
+        acc[p.symbol] = acc.get(p.symbol, 0.0) + p.qty * quote["price"]
+        stale[p.symbol] = stale.get(p.symbol, False) or quote["stale"]
 
     out = [{"label": "CASH", "usdt": usdt_free}]
     for sym, usd in acc.items():
-        out.append({"label": sym, "usdt": usd})
+        out.append({"label": sym, "usdt": usd, "price_stale": stale[sym]})
 
     return out
 
 
+@app.get("/candles/batch")
+async def candles_batch(
+    symbols: str = Query(..., description="Lista separada por comas: BTCUSDT,ETHUSDT"),
+    interval: str = Query("1m"),
+    limit: int = Query(120, ge=50, le=1000),
+):
+    """
+    Velas + indicadores de varios símbolos en una sola llamada.
+    Las descargas corren en paralelo (pool acotado) y se sirven desde la caché
+    incremental por (symbol, interval).
+    """
+    syms = [s.strip().upper() for s in symbols.split(",") if s.strip()]
+    t0 = time.perf_counter()
+    data = await candle_cache.get_many(syms, interval, limit)
+    logger.info(f"⏱️ Timer [Candles batch {len(syms)} syms]: {(time.perf_counter() - t0) * 1000:.2f} ms")
+    return data
+
+
+@app.get("/candles/store")
+def candles_store_stats():
+    # Lago local de velas: particiones, rango guardado y descargas hechas
+    return candle_store.stats()
+
+
+@app.get("/candles/features")
+def candles_features_stats():
+    # Feature store SmartTrading: versión, features y filas calculadas por serie
+    return feature_store.stats()
+
+
 @app.get("/candles/{symbol}")
-def candles(symbol: str, interval: str = Query("1m"), limit: int = Query(120, ge=50, le=1000)):
+async def candles(symbol: str, interval: str = Query("1m"), limit: int = Query(120, ge=50, le=1000)):
     """
     Devuelve velas + indicadores (EMA, RSI, MACD) con `x` como timestamp en ms.
     Esto asegura compatibilidad con Chart.js time scale.
     """
-    kl = []
     try:
-        c = get_spot()
-        kl = c.klines(symbol.upper(), interval, limit=limit)
+        return await candle_cache.get(symbol, interval, limit)
     except ClientError:
-        return {"symbol": symbol.upper(), "last": None, "ema20": [], "rsi14": [], "macd": [], "signal": [], "candles": []}
+        return empty_candles_payload(symbol)
     except Exception:
-        return {"symbol": symbol.upper(), "last": None, "ema20": [], "rsi14": [], "macd": [], "signal": [], "candles": []}
-
-    # Extraemos datos
-    closes = [float(k[4]) for k in kl]
-    opens = [float(k[1]) for k in kl]
-    highs = [float(k[2]) for k in kl]
-    lows = [float(k[3]) for k in kl]
-    times = [int(k[0]) for k in kl]  # ⬅️ timestamp en ms
-
-    # Calculamos indicadores
-    e20 = ema(closes, 20) if closes else []
-    r14 = rsi(closes, 14) if closes else []
-    m_line, s_line, _ = macd(closes, 12, 26, 9) if closes else ([], [], [])
-
-    # Construcción de respuesta con timestamps
-    candles = [
-        {"x": times[i], "o": opens[i], "h": highs[i], "l": lows[i], "c": closes[i]}
-        for i in range(len(closes))
-    ]
-
-    ema20 = [{"x": times[i], "y": e20[i]} for i in range(len(e20))]
-    rsi14 = [{"x": times[i], "y": r14[i]} for i in range(len(r14))]
-    macd_line = [{"x": times[i], "y": m_line[i]} for i in range(len(m_line))]
-    signal_line = [{"x": times[i], "y": s_line[i]} for i in range(len(s_line))]
-
-    return {
-        "symbol": symbol.upper(),
-        "last": closes[-1] if closes else None,
-        "ema20": ema20,
-        "rsi14": rsi14,
-        "macd": macd_line,
-        "signal": signal_line,
-        "candles": candles,
-    }
+        return empty_candles_payload(symbol)
 
 
 
 @app.post("/actions/stop-all")
 async def stop_all(session: AsyncSession = Depends(get_session)):
     try:
+        # close_all_open_positions ya reconcilia con Binance al final
         res = await close_all_open_positions(session)
-        await sync_positions_with_binance(session)
-        logger.info(f"✅ Todas las posiciones cerradas y sincronizadas: {res}")
+        logger.info(f"✅ Todas las posiciones cerradas y sincronizadas: {res['closed']}")
         return res
     except Exception as e:
         logger.error(f"❌ Error en stop_all: {e}")
@@ -1018,34 +1008,10 @@ async def trades_stats(session: AsyncSession = Depends(get_session)):
     # Total de posiciones
     total = await session.scalar(select(func.count()).select_from(Position))
 
-    # Todas las cerradas
-    closed_positions = (
-        await session.execute(
-            select(Position).where(Position.status == "CLOSED")
-        )
-    ).scalars().all()
-
-    wins = 0
-    for p in closed_positions:
-        # Buscar primer y último trade
-        t_first = (
-            await session.execute(
-                select(Trade).where(Trade.position_id == p.id).order_by(Trade.created_at.asc())
-            )
-        ).scalars().first()
-        t_last = (
-            await session.execute(
-                select(Trade).where(Trade.position_id == p.id).order_by(Trade.created_at.desc())
-            )
-        ).scalars().first()
-
-        entry_price = t_first.price if t_first else None
-        exit_price = t_last.price if t_last else None
-
-        if p.side == "BUY" and entry_price and exit_price and exit_price > entry_price:
-            wins += 1
-        elif p.side == "SELL" and entry_price and exit_price and exit_price < entry_price:
-            wins += 1
+    # Ganadoras y cierres por ventana: agregados materializados (app.core.pnl_stats)
+    totals = await pnl_stats.get_totals(session)
+    closed24h = (await pnl_stats.get_window(session, window="24h"))["closed"]
+    closed1h = (await pnl_stats.get_window(session, window="1h"))["closed"]
 
     now = datetime.utcnow()
     since_24h = now - timedelta(hours=24)
@@ -1054,42 +1020,16 @@ async def trades_stats(session: AsyncSession = Depends(get_session)):
     open24h = await session.scalar(
         select(func.count()).select_from(Position).where(Position.opened_at >= since_24h)
     )
-    closed24h = await session.scalar(
-        select(func.count()).select_from(Position).where(Position.closed_at >= since_24h)
-    )
-
     open1h = await session.scalar(
         select(func.count()).select_from(Position).where(Position.opened_at >= since_1h)
     )
-    closed1h = await session.scalar(
-        select(func.count()).select_from(Position).where(Position.closed_at >= since_1h)
-    )
 
-    last5_positions = (
-        await session.execute(
-            select(Position)
-            .where(Position.status == "CLOSED")
-            .order_by(Position.closed_at.desc())
-            .limit(5)
-        )
-    ).scalars().all()
+    last5_rows = (
+        await session.execute(after_cursor(closed_positions_query(), None).limit(5))
+    ).all()
 
     last5 = []
-    for p in last5_positions:
-        t_first = (
-            await session.execute(
-                select(Trade).where(Trade.position_id == p.id).order_by(Trade.created_at.asc())
-            )
-        ).scalars().first()
-        t_last = (
-            await session.execute(
-                select(Trade).where(Trade.position_id == p.id).order_by(Trade.created_at.desc())
-            )
-        ).scalars().first()
-
-        entry_price = t_first.price if t_first else None
-        exit_price = t_last.price if t_last else None
-
+    for p, entry_price, _, exit_price, _ in last5_rows:
         if p.side == "BUY" and entry_price and exit_price:
             last5.append(1 if exit_price > entry_price else 0)
         elif p.side == "SELL" and entry_price and exit_price:
@@ -1099,7 +1039,7 @@ async def trades_stats(session: AsyncSession = Depends(get_session)):
 
     return {
         "total": total or 0,
-        "wins": wins,
+        "wins": int(totals["wins"]),
         "open24h": open24h or 0,
         "closed24h": closed24h or 0,
         "open1h": open1h or 0,
@@ -1111,16 +1051,9 @@ async def trades_stats(session: AsyncSession = Depends(get_session)):
 async def get_symbol_metrics(symbol: str, session: AsyncSession = Depends(get_session)):
     symbol = symbol.upper()
 
-    # Precios actuales
-    prices: Dict[str, float] = {}
-    last_price = None
-    try:
-        c = get_spot()
-        prices = {p["symbol"]: float(p["price"]) for p in c.ticker_price()}
-        last_price = prices.get(symbol)
-    except Exception:
-        prices = {}
-        last_price = None
+    # Precio actual (caché, con su antigüedad)
+    quote = price_cache.read(symbol)
+    last_price = quote["price"]
 
     # Posiciones abiertas
     open_positions = (
@@ -1136,17 +1069,9 @@ async def get_symbol_metrics(symbol: str, session: AsyncSession = Depends(get_se
     )
     nr_open = len(open_positions)
 
-    # Rentabilidad acumulada de cerradas
-    closed_positions = (
-        await session.execute(
-            select(Position).where(Position.symbol == symbol, Position.status == "CLOSED")
-        )
-    ).scalars().all()
-
-    acc_profit = sum(
-        (p.fees_total * -1) + ((p.tp or 0) - (p.sl or 0))
-        for p in closed_positions
-    )
+    # Rentabilidad acumulada de cerradas (agregado materializado)
+    totals = await pnl_stats.get_totals(session, symbol)
+    acc_profit = totals["realized_pnl"] - totals["fees"]
 
     return {
         "symbol": symbol,
@@ -1154,6 +1079,8 @@ async def get_symbol_metrics(symbol: str, session: AsyncSession = Depends(get_se
         "pnl_open": pnl_open,
         "nr_open": nr_open,
         "acc_profit": acc_profit,
+        "price_age_ms": quote["age_ms"],
+        "price_stale": quote["stale"],
     }
 
 
@@ -1161,15 +1088,7 @@ async def get_symbol_metrics(symbol: str, session: AsyncSession = Depends(get_se
 # SMART TRADING API
 # ====================================
 
-# Estado global
-app.state.smart = {
-    "manifest": None,
-    "chosen": None,
-    "booster": None,
-    "features": None,
-    "dsl": None,
-    "active_path": None
-}
+# Modelos activos por símbolo: app.core.model_registry
 
 
 async def smart_train(
@@ -1186,82 +1105,95 @@ async def smart_train(
     trailing_distance: float = 0.015,
     max_combinations: int = 200,
 ):
-    """Entrena y exporta un modelo SmartTrading"""
-    rules = GoldenRules(
-        min_accuracy=min_accuracy,
-        min_profit=min_profit,
-        profit_target=profit_target,
-        stop_loss=stop_loss,
-        delta_t=delta_t,
-        trailing_enabled=trailing_enabled,
-        trailing_distance=trailing_distance
-    )
+    """Entrena y exporta un modelo SmartTrading (en el servicio de jobs, fuera del event loop)"""
+    job_id = await training_service.submit({
+        "data_path": data_path,
+        "pair": pair,
+        "timeframe": timeframe,
+        "outdir": outdir,
+        "max_combinations": max_combinations,
+        "rules": {
+            "min_accuracy": min_accuracy,
+            "min_profit": min_profit,
+            "profit_target": profit_target,
+            "stop_loss": stop_loss,
+            "delta_t": delta_t,
+            "trailing_enabled": trailing_enabled,
+            "trailing_distance": trailing_distance,
+        },
+    })
+    ev = await training_service.wait(job_id)
+    if ev["status"] != "done":
+        return {"ok": False, "job_id": job_id, "error": ev.get("message")}
+    return {"ok": True, "job_id": job_id, "manifest_path": ev["result"]["manifest_path"]}
 
-    manifest_path = smart_train_and_export(
-        data_path=data_path,
-        pair=pair,
-        timeframe=timeframe,
-        outdir=outdir,
-        rules=rules,
-        max_combinations=max_combinations
-    )
-    return {"ok": True, "manifest_path": manifest_path}
 
+# ==============================
+# Jobs de entrenamiento
+# ==============================
+@app.post("/smart/jobs")
+async def smart_job_submit(payload: dict):
+    if not payload.get("pair") or not payload.get("dataPath"):
+        raise HTTPException(status_code=400, detail="Faltan 'pair' o 'dataPath'")
+    job_id = await training_service.submit(train_params(payload))
+    return {"job_id": job_id}
 
-@app.get("/smart/signal/{symbol}")
-async def smart_signal(symbol: str, session: AsyncSession = Depends(get_session)):
-    """Calcula señal en vivo con el modelo activo"""
-    sm = app.state.smart
-    if not sm.get("booster"):
-        raise HTTPException(status_code=400, detail="No active smart strategy")
 
-    symbol = symbol.upper()
+@app.get("/smart/jobs")
+async def smart_jobs(limit: int = Query(50, ge=1, le=500)):
+    return {"jobs": await training_service.list(limit), **training_service.stats()}
 
-    # Obtener últimas velas del backend (protegido)
-    try:
-        c = get_spot()
-        kl = c.klines(symbol, "1h", limit=120)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching candles from Binance: {str(e)}")
 
-    if not kl:
-        raise HTTPException(status_code=404, detail=f"No OHLCV data for {symbol}")
+@app.get("/smart/jobs/{job_id}")
+async def smart_job(job_id: str):
+    job = await training_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-    # Construir DataFrame
-    df = pd.DataFrame(kl, columns=[
-        "time", "open", "high", "low", "close", "volume",
-        "c1","c2","c3","c4","c5","c6"
-    ])
-    df = df[["time","open","high","low","close","volume"]].astype(float)
 
-    # Agregar indicadores
-    df = add_indicators(df)
-    row = df.iloc[-1]
+@app.delete("/smart/jobs/{job_id}")
+async def smart_job_cancel(job_id: str):
+    if not await training_service.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Job not found or already finished")
+    return {"ok": True, "job_id": job_id}
 
-    if not ensure_features(row, sm["features"]):
-        raise HTTPException(status_code=400, detail="Missing features in OHLCV")
 
-    # Predicción por modelo
-    try:
-        pred_class, conf = predict_signal_from_model(sm["booster"], row[sm["features"]])
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error running model prediction: {str(e)}")
+@app.get("/smart/signal/{symbol}")
+async def smart_signal(symbol: str):
+    """Calcula señal en vivo con el modelo activo del símbolo (features del feature store)"""
+    symbol = symbol.upper()
+    if model_registry.get(symbol) is None:
+        raise HTTPException(status_code=400, detail=f"No active smart strategy for {symbol}")
 
-    # Señal DSL
-    pred_dsl = apply_dsl_rules(row, sm["dsl"])
+    res = (await score_symbols([symbol]))[symbol]
+    if "error" in res:
+        status = 404 if res["error"].startswith("No OHLCV") else 500 if res["error"].startswith("Error running") else 400
+        raise HTTPException(status_code=status, detail=res["error"])
+    res["model"].pop("batch", None)
+    return res
 
-    # Señal final
-    signal = pred_class
-    if pred_dsl != pred_class and conf < 0.55:
-        signal = pred_dsl
 
-    return {
-        "symbol": symbol,
-        "signal": signal,   # 0=HOLD, 1=BUY, 2=SELL
-        "confidence": conf,
-        "dsl_signal": pred_dsl,
-        "risk": sm["dsl"].get("risk", {})
-    }
+@app.get("/smart/signals")
+async def smart_signals(
+    symbols: Optional[str] = Query(None, description="Lista separada por comas (por defecto: todos los activos)"),
+):
+    """
+    Señales de varios símbolos con un solo predict por modelo.
+    Las features salen del estado incremental de indicadores sobre la caché
+    de velas; los errores por símbolo vienen en el campo `error`.
+    """
+    syms = [s.strip().upper() for s in symbols.split(",") if s.strip()] if symbols else model_registry.symbols()
+    t0 = time.perf_counter()
+    data = await score_symbols(syms)
+    logger.info(f"⏱️ Timer [Smart signals {len(syms)} syms]: {(time.perf_counter() - t0) * 1000:.2f} ms")
+    return data
+
+
+@app.get("/smart/models")
+def smart_models():
+    # Modelos activos por símbolo/estrategia: versión, carga y latencia de predicción
+    return model_registry.stats()
 
 
 @app.post("/smart/retrain-stream")
@@ -1270,38 +1202,16 @@ async def smart_retrain_stream(payload: dict):
     Lanza el entrenamiento SmartTrading y transmite logs parciales en tiempo real.
     El frontend puede mostrar progreso con un EventSource (SSE).
     """
-    pair = payload.get("pair")
-    timeframe = payload.get("timeframe", "1h")
-    data_path = payload.get("dataPath")
-    outdir = payload.get("outdir", "artifacts")
-
-    rules = GoldenRules(
-        min_accuracy=float(payload.get("minAccuracy", 0.7)),
-        min_profit=float(payload.get("minProfit", 0.05)),
-        profit_target=float(payload.get("profitTarget", 0.1)),
-        stop_loss=float(payload.get("stopLoss", 0.05)),
-        delta_t=int(payload.get("deltaT", 60)),
-        trailing_enabled=payload.get("trailingEnabled", True),
-        trailing_distance=float(payload.get("trailingDistance", 0.01)),
-    )
-
-    max_combinations = int(payload.get("maxCombinations", 200))
+    job_id = await training_service.submit(train_params(payload))
 
     async def event_generator():
-        yield f"data: {json.dumps({'status':'started','ts':str(datetime.datetime.utcnow())})}\n\n"
-        await asyncio.sleep(0.2)
-
-        # aquí llamamos a smart_train_and_export
-        manifest_path = smart_train_and_export(
-            data_path=data_path,
-            pair=pair,
-            timeframe=timeframe,
-            outdir=outdir,
-            rules=rules,
-            max_combinations=max_combinations,
-        )
+        yield f"data: {json.dumps({'status':'started','job_id':job_id,'ts':str(datetime.utcnow())})}\n\n"
 
-        yield f"data: {json.dumps({'status':'completed','manifest':manifest_path,'ts':str(datetime.datetime.utcnow())})}\n\n"
+        # el entrenamiento corre en otro proceso: sólo se retransmite su progreso
+        async for ev in training_service.subscribe(job_id):
+            if ev["status"] == "done":
+                ev = {"status": "completed", "job_id": job_id, "manifest": ev["result"]["manifest_path"]}
+            yield f"data: {json.dumps({**ev, 'ts': str(datetime.utcnow())})}\n\n"
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
@@ -1350,27 +1260,38 @@ async def ping_task(ws: WebSocket):
         pass
 
 
+async def wait_disconnect(ws: WebSocket):
+    """Termina cuando el cliente cierra el socket (para cancelar trabajos largos)."""
+    while True:
+        msg = await ws.receive()
+        if msg["type"] == "websocket.disconnect":
+            return
+
+
 # ==============================
 # Entrenamiento asincrónico
 # ==============================
-async def run_training(ws: WebSocket, cfg: dict, prep: dict):
-    smart_res = await smart_train_and_export(
-        data_path=cfg["dataPath"],
-        pair=cfg["pair"],
-        timeframe=cfg.get("timeframe", "1h"),
-        outdir=cfg.get("outdir", "artifacts"),
-        rules=GoldenRules(
-            min_accuracy=float(cfg.get("minAccuracy", 0.7)),
-            min_profit=float(cfg.get("minProfit", 0.05)),
-            profit_target=float(cfg.get("profitTarget", 0.1)),
-            stop_loss=float(cfg.get("stopLoss", 0.05)),
-            delta_t=int(cfg.get("deltaT", 60)),
-            trailing_enabled=bool(cfg.get("trailingEnabled", True)),
-            trailing_distance=float(cfg.get("trailingDistance", 0.01)),
-        ),
-        max_combinations=int(cfg.get("maxCombinations", 200)),
-        progress_callback=lambda c, t, m: progress_callback(ws, c, t, m)
-    )
+async def run_training(ws: WebSocket, job_id: str, prep: dict):
+    """Retransmite al WS el progreso del job (el entrenamiento corre en otro proceso)."""
+    smart_res, improved, strategies = None, True, None
+    async for ev in training_service.subscribe(job_id):
+        if ev["status"] in ("queued", "running", "progress"):
+            await safe_send(ws, {
+                "status": "progress",
+                "job_id": job_id,
+                "progress": ev.get("progress") or 0,
+                "message": ev.get("message") or ev["status"],
+            })
+        elif ev["status"] == "done":
+            smart_res = ev["result"]["manifest_path"]
+            improved = ev["result"].get("improved", True)
+            strategies = ev["result"].get("strategies")
+        elif ev["status"] == "cancelled":
+            await safe_send(ws, {"status": "warning", "job_id": job_id, "message": "⚠️ Entrenamiento cancelado"})
+            return
+        else:
+            await safe_send(ws, {"status": "error", "job_id": job_id, "message": ev.get("message")})
+            return
 
     if smart_res is None:
         await safe_send(ws, {
@@ -1382,6 +1303,9 @@ async def run_training(ws: WebSocket, cfg: dict, prep: dict):
         await safe_send(ws, {
             "status": "done",
             "manifest": smart_res,
+            "improved": improved,
+            "version": manifest_data.get("version"),
+            "comparison": strategies,
             "formulas": {
                 "best_by_accuracy": manifest_data.get("best_by_accuracy"),
                 "best_by_profit": manifest_data.get("best_by_profit"),
@@ -1415,10 +1339,8 @@ async def websocket_smart_retrain(ws: WebSocket):
         # ⏳ Mensaje antes de preparar dataset
         await safe_send(ws, {"status": "info", "message": "📅 Generando archivo de datos..."})
 
-        # Dataset
-        ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        outfile = os.path.join(outdir, f"{pair}_{timeframe}_{ts}.csv")
-        prep = prepare_ohlcv_csv(pair, timeframe, outfile)
+        # Dataset: lago local + features ya calculadas (CSV reutilizado si no hubo cierres)
+        prep = await feature_store.export_csv(pair, timeframe, outdir)
 
         if not prep["success"]:
             await safe_send(ws, {"status": "error", "message": prep["error"]})
@@ -1427,15 +1349,41 @@ async def websocket_smart_retrain(ws: WebSocket):
         cfg = payload.copy()
         cfg["dataPath"] = prep["outfile"]
 
-        await safe_send(ws, {"status": "info", "message": "📅 Dataset preparado"})
+        # Incremental: warm start sobre el modelo activo (o el último retrain del par)
+        if cfg.get("mode") == "incremental" and not cfg.get("baseManifest"):
+            mv = model_registry.get(pair)
+            cfg["baseManifest"] = mv.manifest_path if mv else await training_service.latest_manifest(pair)
+            if not cfg["baseManifest"]:
+                cfg["mode"] = "full"
+                await safe_send(ws, {"status": "info", "message": "ℹ️ Sin modelo previo: retrain completo"})
+
+        # 🚀 Job en el pool de entrenamiento (fuera del event loop)
+        job_id = await training_service.submit(train_params(cfg))
+        await safe_send(ws, {"status": "info", "job_id": job_id, "message": "📅 Dataset preparado"})
 
-        # 🚀 Lanza entrenamiento en background
-        training_task = asyncio.create_task(run_training(ws, cfg, prep))
+        training_task = asyncio.create_task(run_training(ws, job_id, prep))
 
         # 🚀 Lanza keepalive
         ping = asyncio.create_task(ping_task(ws))
 
-        await training_task
+        # {"action": "cancel"} desde el cliente cancela el job
+        async def listen_cancel():
+            while True:
+                msg = await ws.receive_json()
+                if msg.get("action") == "cancel":
+                    await training_service.cancel(job_id)
+
+        listener = asyncio.create_task(listen_cancel())
+        try:
+            await asyncio.wait({training_task, listener}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+        if training_task.done():
+            training_task.result()
+        else:
+            # cliente desconectado: el job sigue y se consulta en /smart/jobs/{job_id}
+            training_task.cancel()
 
     except WebSocketDisconnect:
         logger.info("⚠️ Cliente desconectado de /ws/smart/retrain")
@@ -1452,6 +1400,88 @@ async def websocket_smart_retrain(ws: WebSocket):
 
 
 
+# ==============================
+# Optimizador de parámetros (WS)
+# ==============================
+@app.websocket("/ws/optimize")
+async def websocket_optimize(ws: WebSocket):
+    """
+    Barrido de parámetros RSI/EMA/MACD con progreso en vivo.
+    Payload: {symbol, method, params, mode, nIter, interval, start, end, apply}
+    """
+    await ws.accept()
+    ping = None
+
+    try:
+        payload = await ws.receive_json()
+        symbol = (payload.get("symbol") or "").upper()
+        method = (payload.get("method") or "RSI").upper()
+        if not symbol or not payload.get("params"):
+            await safe_send(ws, {"status": "error", "message": "❌ Faltan 'symbol' o 'params'"})
+            return
+
+        ping = asyncio.create_task(ping_task(ws))
+
+        start = datetime.fromisoformat(payload["start"]) if payload.get("start") else datetime.utcnow() - timedelta(days=30)
+        end = datetime.fromisoformat(payload["end"]) if payload.get("end") else datetime.utcnow()
+        interval = payload.get("interval", "1m")
+
+        await safe_send(ws, {"status": "info", "message": f"📅 Descargando {symbol} {interval}..."})
+        ohlcv = await candle_store.load(symbol, interval, start, end)
+
+        job = SweepJob(
+            symbol=symbol,
+            method=method,
+            ohlcv=ohlcv,
+            space=SearchSpace(
+                params=payload["params"],
+                mode=payload.get("mode", "grid"),
+                n_iter=int(payload.get("nIter", 50)),
+            ),
+        )
+
+        async def progress(done: int, total: int, best: dict):
+            await safe_send(ws, {
+                "status": "progress",
+                "progress": int(done / max(total, 1) * 100),
+                "message": f"{done}/{total}",
+                "best": best,
+            })
+
+        # El barrido se cancela si el cliente se desconecta (safe_send no lo detecta)
+        sweep = asyncio.create_task(job.run_async(progress))
+        watch = asyncio.create_task(wait_disconnect(ws))
+        await asyncio.wait({sweep, watch}, return_when=asyncio.FIRST_COMPLETED)
+        watch.cancel()
+        if not sweep.done():
+            sweep.cancel()
+            try:
+                await sweep
+            except asyncio.CancelledError:
+                pass
+            logger.info("⚠️ Cliente desconectado de /ws/optimize: barrido cancelado")
+            return
+        results = sweep.result()
+
+        applied = None
+        if payload.get("apply") and results:
+            async with SessionLocal() as session:
+                applied = await apply_best(session, symbol, method, results[0]["params"])
+
+        await safe_send(ws, {"status": "done", "results": results[:20], "applied": applied})
+
+    except WebSocketDisconnect:
+        logger.info("⚠️ Cliente desconectado de /ws/optimize")
+    except Exception as e:
+        traceback.print_exc()
+        await safe_send(ws, {"status": "error", "message": str(e)})
+    finally:
+        if ping:
+            ping.cancel()
+        if ws.application_state == WebSocketState.CONNECTED and ws.client_state == WebSocketState.CONNECTED:
+            await ws.close()
+
+
 @app.post("/smart/activate")
 async def activate_formula(payload: dict):
     """
@@ -1499,6 +1529,16 @@ async def activate_formula(payload: dict):
         except Exception as db_err:
             logger.error(f"⚠️ No se pudo persistir en DB: {db_err}")
 
+        # 🔹 Modelo en caliente: manifest indicado o el del último retrain del símbolo
+        model = None
+        manifest = payload.get("manifest") or await training_service.latest_manifest(symbol)
+        if manifest:
+            strategy = strategy_name if strategy_name in STRATEGIES else None
+            try:
+                model = (await model_registry.activate(symbol, manifest, strategy)).as_dict()
+            except Exception as load_err:
+                logger.error(f"⚠️ No se pudo cargar el modelo de {symbol}: {load_err}")
+
         logger.info(f"⚡ Estrategia activada para {symbol}: {strategy_name} → {formula}")
 
         return {
@@ -1506,6 +1546,7 @@ async def activate_formula(payload: dict):
             "symbol": symbol,
             "formula": formula,
             "strategy": strategy_name,
+            "model": model,
         }
 
     except Exception as e:
@@ -1528,8 +1569,30 @@ async def get_balance():
             "total": snap.total_usdt,
         }
 
+async def warm_smart_models():
+    """Activa en segundo plano el último modelo entrenado de cada símbolo SMART."""
+    async with SessionLocal() as session:
+        rows = (await session.execute(
+            select(TradingConfig).where(TradingConfig.method == "SMART")
+        )).scalars().all()
+        configs = [(r.symbol, getattr(r, "active_strategy", None)) for r in rows]
+    for symbol, strategy in configs:
+        manifest = await training_service.latest_manifest(symbol)
+        if not manifest:
+            continue
+        try:
+            await model_registry.activate(symbol, manifest, strategy if strategy in STRATEGIES else None)
+        except Exception as e:
+            logger.error(f"[ModelRegistry] ⚠️ Precarga de {symbol} falló: {e}")
+
+
 async def scheduled_sync():
     """Tarea automática para sincronizar posiciones con Binance."""
+    if reconciler.stats()["stream_connected"]:
+        # El user-data stream ya aplica los deltas: sólo snapshot de seguridad
+        logger.info("[scheduler] ⏰ Snapshot de reconciliación (user-data stream activo)...")
+        await reconciler.snapshot()
+        return
     async with get_session_ws() as session:
         from app.backend.main import sync_positions_with_binance  # o ajustá ruta si la pusiste en otro archivo
         logger.info("[scheduler] ⏰ Ejecutando sincronización automática...")
@@ -1539,6 +1602,31 @@ async def scheduled_sync():
 # 🔁 Ejecutar cada 1 hora
 scheduler.add_job(scheduled_sync, "interval", hours=1)
 
+
+async def scheduled_incremental_retrain():
+    """Warm start de todos los modelos activos con las velas nuevas (jobs en cola)."""
+    for symbol in model_registry.symbols():
+        mv = model_registry.get(symbol)
+        try:
+            manifest = load_manifest(mv.manifest_path)
+            if manifest.get("data_until") is None:
+                continue   # manifest sin historial de velas: sólo retrain completo
+            timeframe = manifest.get("timeframe") or "1h"
+            prep = await feature_store.export_csv(symbol, timeframe, "artifacts")
+            if not prep["success"]:
+                logger.error(f"[scheduler] ⚠️ Dataset de {symbol} no disponible: {prep['error']}")
+                continue
+            await training_service.submit(train_params({
+                "dataPath": prep["outfile"], "pair": symbol, "timeframe": timeframe,
+                "mode": "incremental", "baseManifest": mv.manifest_path,
+            }))
+        except Exception as e:
+            logger.error(f"[scheduler] ⚠️ Retrain incremental de {symbol} falló: {e}")
+
+# 🔁 Retrain incremental periódico (SMART_RETRAIN_HOURS=0 lo desactiva)
+if SMART_RETRAIN_HOURS > 0:
+    scheduler.add_job(scheduled_incremental_retrain, "interval", hours=SMART_RETRAIN_HOURS)
+
 # 🟢 Iniciar el scheduler cuando arranque la app
 @app.on_event("startup")
 async def startup_event():
@@ -1548,9 +1636,57 @@ async def startup_event():
     # Inicializar DB
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    run_sqlite_migrations()
+        if engine.dialect.name == "postgresql":
+            # hypertables / BRIN de equity_snapshots y decision_logs
+            await conn.run_sync(tune_postgres)
+    if engine.dialect.name == "sqlite":
+        run_sqlite_migrations()
     app.state.symbols = None
 
+    # Agregados materializados: backfill en el primer arranque tras migrar
+    async with SessionLocal() as session:
+        try:
+            await pnl_stats.backfill_if_empty(session)
+        except Exception as e:
+            await session.rollback()
+            logger.error(f"[PnLStats] ❌ Error en backfill inicial: {e}")
+        try:
+            await equity_rollups.backfill_if_empty(session)
+        except Exception as e:
+            logger.error(f"[EquityRollups] ❌ Error en backfill inicial: {e}")
+
+    # Caché de precios compartida (único refresco de ticker_price)
+    price_cache.start()
+
+    # Índice de filtros de símbolos (disco + refresco por TTL)
+    symbol_index.start()
+
+    # Escritor único de la DB (+ socket local para el proceso del bot)
+    db_writer = get_writer()
+    if DB_WRITER_LISTEN:
+        await db_writer.serve(DB_WRITER_LISTEN)
+    else:
+        db_writer.start()
+
+    # Persistencia write-behind (DecisionLog / Trade / EquitySnapshot)
+    write_queue.start()
+
+    # Entrenamientos en procesos aparte (jobs persistidos en train_jobs)
+    await training_service.start()
+
+    # Modelos Smart en caliente: hot-swap al terminar un retrain + precarga de los activos
+    async def hot_swap(params: dict, ev: dict):
+        # un retrain incremental sin mejora deja el modelo activo como está
+        if ev["result"].get("improved", True):
+            await model_registry.on_retrained(params["pair"], ev["result"]["manifest_path"])
+
+    training_service.on_done(hot_swap)
+    asyncio.create_task(warm_smart_models())
+
+    # Reconciliación de posiciones por user-data stream
+    if os.getenv("ACCOUNT_STREAM_ENABLED", "1") == "1":
+        reconciler.start()
+
     # Iniciar scheduler
     scheduler.start()
     logger.info("[Scheduler] ✅ Limpieza automática activada (cada 1h).")
@@ -1565,3 +1701,15 @@ async def startup_event():
             logger.error(f"❌ Error al lanzar streams Binance: {e}")
 
     asyncio.create_task(delayed_launch())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Reconciliador primero: sus tareas (user-data stream, flush, snapshot) usan el escritor
+    await reconciler.stop()
+    # Vaciar la cola write-behind antes de salir
+    await training_service.stop()
+    await write_queue.stop()
+    await get_writer().stop()
+    await price_cache.stop()
+    await symbol_index.stop()
@@ -1,30 +1,43 @@
 # app/backend/routes/equity.py
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.db import get_session
-from app.core.equity import calculate_equity
-from sqlalchemy import select
-from app.core.models import EquitySnapshot
+from app.core import equity_rollups
 
 router = APIRouter()
 
 @router.get("/equity/history")
-async def equity_history(range: str = "30d", session: AsyncSession = Depends(get_session)):
+async def equity_history(
+    range: str = "30d",
+    resolution: Optional[str] = Query(None, description="1m | 5m | 1h | 1d (por defecto automática)"),
+    points: int = Query(equity_rollups.DEFAULT_POINTS, ge=10, le=5000),
+    session: AsyncSession = Depends(get_session),
+):
     """
-    Devuelve el histórico de equity desde la DB.
+    Devuelve el histórico de equity desde los rollups, acotado a `range`
+    y bajado a `points` puntos como máximo (más antiguo primero).
     """
-    rows = (
-        await session.execute(
-            select(EquitySnapshot).order_by(EquitySnapshot.ts.desc()).limit(500)
-        )
-    ).scalars().all()
+    try:
+        span = equity_rollups.parse_span(range)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = await equity_rollups.history(session, span, resolution=resolution, points=points)
 
     return [
         {
-            "ts": r.ts.isoformat(),
-            "free": r.free_usdt,
-            "invested": r.invested_usdt,
-            "total": r.total_usdt,
+            "ts": r["ts"],
+            "free": r["free"],
+            "invested": r["invested"],
+            "total": r["close"],
+            "free_usdt": r["free"],
+            "invested_usdt": r["invested"],
+            "avg_total_usdt": r["avg"],
+            "min_total_usdt": r["low"],
+            "max_total_usdt": r["high"],
+            "res": r["res"],
         }
-        for r in rows[::-1]  # más antiguo primero
-    ]
\ No newline at end of file
+        for r in rows
+    ]
@@ -2,11 +2,12 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 from app.core.db import get_session
-from app.core.models import Position, Trade
-from app.core.equity import get_stats, get_token_stats
+from app.core.models import Position
+from app.core.trade_queries import closed_positions_query, after_cursor
+from app.core import pnl_stats
 
 router = APIRouter()
 
@@ -15,42 +16,14 @@ async def profitability_by_symbol(symbol: str, days: int = 30, session: AsyncSes
     """
     Devuelve la rentabilidad realizada (PnL) de un token en los últimos X días.
     """
-    cutoff = datetime.utcnow() - timedelta(days=days)
-
-    # Buscar posiciones cerradas del símbolo en el rango de fechas
-    rows = (await session.execute(
-        select(Position).where(
-            Position.symbol == symbol,
-            Position.status == "CLOSED",
-            Position.closed_at >= cutoff
-        )
-    )).scalars().all()
-
-    total_pnl = 0.0
-    trade_count = 0
-
-    for p in rows:
-        # Buscar trades de entrada y salida
-        t_first = (await session.execute(
-            select(Trade).where(Trade.position_id == p.id).order_by(Trade.created_at.asc())
-        )).scalars().first()
-        t_last = (await session.execute(
-            select(Trade).where(Trade.position_id == p.id).order_by(Trade.created_at.desc())
-        )).scalars().first()
-
-        entry = t_first.price if t_first else p.entry_price
-        exitp = t_last.price if t_last else p.entry_price
-        qty = p.qty or 0.0
-        pnl = (exitp - entry) * qty
-
-        total_pnl += pnl
-        trade_count += 1
+    # PnL realizado desde los buckets horarios materializados
+    agg = await pnl_stats.get_since(session, symbol, timedelta(days=days))
 
     return {
         "symbol": symbol,
         "days": days,
-        "pnl_usdt": total_pnl,
-        "trades_count": trade_count
+        "pnl_usdt": float(agg["realized_pnl"]),
+        "trades_count": int(agg["closed"])
     }
 
 # 🚀 Nuevo: Indicadores globales
@@ -61,7 +34,26 @@ async def stats(session: AsyncSession = Depends(get_session)):
     - WinRate últimos 30 días, 24h, 1h
     - Últimas 5 operaciones cerradas
     """
-    return await get_stats(session)
+    w30d = await pnl_stats.get_window(session, window="30d")
+    w24h = await pnl_stats.get_window(session, window="24h")
+    w1h = await pnl_stats.get_window(session, window="1h")
+
+    last5 = (await session.execute(after_cursor(closed_positions_query(), None).limit(5))).all()
+    last_5_ops = [
+        pnl_stats.position_result(
+            entry if entry is not None else p.entry_price,
+            exitp if exitp is not None else (p.last_price or p.entry_price),
+            p.side, float(p.qty or 0.0),
+        )[0]
+        for p, entry, _, exitp, _ in last5
+    ]
+
+    return {
+        "winrate_30d": w30d["winrate"],
+        "winrate_24h": w24h["winrate"],
+        "winrate_1h": w1h["winrate"],
+        "last_5_ops": last_5_ops,
+    }
 
 # 🚀 Nuevo: Indicadores por token
 @router.get("/stats/{symbol}")
@@ -73,7 +65,25 @@ async def token_stats(symbol: str, session: AsyncSession = Depends(get_session))
     - Nr Open (cantidad de operaciones abiertas)
     - $$ Inv (inversión actual en USDT)
     """
-    return await get_token_stats(session, symbol)
+    symbol = symbol.upper()
+    w30d = await pnl_stats.get_window(session, symbol, "30d")
+
+    open_positions = (await session.execute(
+        select(Position).where(Position.symbol == symbol, Position.status == "OPEN")
+    )).scalars().all()
+    n_real_pl = sum(
+        ((p.last_price or p.entry_price) - p.entry_price) * (p.qty if p.side == "BUY" else -p.qty)
+        for p in open_positions
+    )
+
+    return {
+        "symbol": symbol,
+        "acc_profit": w30d["realized_pnl"] - w30d["fees"],
+        "winrate_30d": w30d["winrate"],
+        "n_real_pl": n_real_pl,
+        "nr_open": len(open_positions),
+        "invested": sum(p.qty * p.entry_price for p in open_positions),
+    }
 
 # 🚀 Nuevo: Closed Positions
 @router.get("/closed_positions")
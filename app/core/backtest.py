@@ -0,0 +1,252 @@
+# app/core/backtest.py
+"""
+Backtest vectorizado de las estrategias del bot (RSI / EMA / MACD / AI / SMART).
+
+Los indicadores y las señales se calculan como operaciones sobre arrays para
+todo el histórico de una vez; la simulación de posiciones sólo recorre las
+operaciones (no las velas), buscando la salida con búsquedas por ventanas
+sobre arrays. Las reglas son las mismas que `bot.decide_signal` y los límites
+de riesgo salen de config.yaml (sl_percent / tp_percent / max_order_value,
+con override por par).
+
+Supuestos: spot long-only, una posición a la vez por símbolo, entrada al
+cierre de la vela con señal BUY, salida por SELL al cierre o por SL/TP dentro
+de la vela (si ambos se tocan en la misma vela se asume SL).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Mapping, Optional
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from app.core.rule_compiler import compile_formula
+
+CONFIG_PATH = Path(__file__).resolve().parents[2] / "config.yaml"
+
+BUY, HOLD, SELL = 1, 0, -1
+
+
+# =============================
+# Límites de riesgo
+# =============================
+@dataclass
+class RiskLimits:
+    sl_percent: float = 1.5
+    tp_percent: float = 3.0
+    max_order_value: float = 50.0
+    fee_rate: float = 0.001  # comisión spot por lado
+
+    @classmethod
+    def from_config(cls, symbol: Optional[str] = None, cfg: Optional[dict] = None) -> "RiskLimits":
+        """Límites globales de config.yaml con el override de `pairs.<symbol>` si existe."""
+        if cfg is None:
+            try:
+                with open(CONFIG_PATH, encoding="utf-8") as f:
+                    cfg = yaml.safe_load(f) or {}
+            except FileNotFoundError:
+                cfg = {}
+        pair = (cfg.get("pairs") or {}).get(symbol or "", {}) or {}
+        return cls(
+            sl_percent=float(pair.get("sl_percent", cfg.get("sl_percent", cls.sl_percent))),
+            tp_percent=float(pair.get("tp_percent", cfg.get("tp_percent", cls.tp_percent))),
+            max_order_value=float(pair.get("max_order_usdt", cfg.get("max_order_value", cls.max_order_value))),
+        )
+
+
+# =============================
+# Indicadores sobre columnas
+# =============================
+def _ema(x: pd.Series, period: int) -> np.ndarray:
+    return x.ewm(span=period, adjust=False, min_periods=period).mean().to_numpy()
+
+
+def _rsi(x: pd.Series, period: int) -> np.ndarray:
+    diff = x.diff()
+    gain = diff.clip(lower=0).ewm(alpha=1.0 / period, adjust=False, min_periods=period).mean()
+    loss = (-diff).clip(lower=0).ewm(alpha=1.0 / period, adjust=False, min_periods=period).mean()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = 100.0 - 100.0 / (1.0 + gain.to_numpy() / loss.to_numpy())
+    return out
+
+
+def indicator_columns(close: np.ndarray, params: Mapping) -> dict[str, np.ndarray]:
+    """RSI, EMA corta/larga y MACD/señal con la misma convención que IndicatorState."""
+    s = pd.Series(np.asarray(close, dtype=float))
+    fast, slow = int(params.get("macdFast", 12)), int(params.get("macdSlow", 26))
+    macd_line = _ema(s, fast) - _ema(s, slow)
+    signal_line = pd.Series(macd_line).ewm(
+        span=int(params.get("macdSignal", 9)), adjust=False, min_periods=int(params.get("macdSignal", 9))
+    ).mean().to_numpy()
+    return {
+        "close": s.to_numpy(),
+        "rsi": _rsi(s, int(params.get("rsiPeriod", 14))),
+        "ema_short": _ema(s, int(params.get("emaShort", 12))),
+        "ema_long": _ema(s, int(params.get("emaLong", 26))),
+        "macd": macd_line,
+        "signal": signal_line,
+    }
+
+
+# =============================
+# Señales
+# =============================
+def strategy_signals(
+    method: str,
+    cols: Mapping[str, np.ndarray],
+    params: Mapping,
+    ai_signal: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Array int8 (+1 BUY, -1 SELL, 0 HOLD) con las reglas de `decide_signal`."""
+    n = len(cols["close"])
+    sig = np.zeros(n, dtype=np.int8)
+    method = (method or "").upper()
+
+    with np.errstate(invalid="ignore"):
+        if method == "RSI":
+            r = cols["rsi"]
+            sig[r < float(params.get("rsiOversold", 30))] = BUY
+            sig[r > float(params.get("rsiOverbought", 70))] = SELL
+        elif method == "EMA":
+            sig[cols["ema_short"] > cols["ema_long"]] = BUY
+            sig[cols["ema_short"] < cols["ema_long"]] = SELL
+        elif method == "MACD":
+            sig[cols["macd"] > cols["signal"]] = BUY
+            sig[cols["macd"] < cols["signal"]] = SELL
+        elif method == "AI":
+            if ai_signal is not None:
+                # Convención del modelo: 0=HOLD, 1=BUY, 2=SELL
+                a = np.asarray(ai_signal)
+                sig[a == 1] = BUY
+                sig[a == 2] = SELL
+        elif method == "SMART":
+            formula = params.get("formula_human")
+            if formula:
+                actions = compile_formula(formula).evaluate_columns(cols, n)
+                sig[actions == "BUY"] = BUY
+                sig[actions == "SELL"] = SELL
+    return sig
+
+
+# =============================
+# Resultado
+# =============================
+@dataclass
+class BacktestResult:
+    trades: pd.DataFrame
+    equity: np.ndarray
+    stats: dict = field(default_factory=dict)
+
+
+def _first_hit(low: np.ndarray, high: np.ndarray, start: int, stop: int, sl: float, tp: float) -> int:
+    """Primer índice en [start, stop) donde se toca SL o TP; `stop` si no hay. Ventanas crecientes."""
+    size = 64
+    i = start
+    while i < stop:
+        j = min(i + size, stop)
+        hit = np.flatnonzero((low[i:j] <= sl) | (high[i:j] >= tp))
+        if hit.size:
+            return i + int(hit[0])
+        i = j
+        size *= 4
+    return stop
+
+
+def run_backtest(
+    ohlcv,
+    method: str,
+    params: Optional[Mapping] = None,
+    risk: Optional[RiskLimits] = None,
+    initial_balance: float = 1000.0,
+    ai_signal: Optional[np.ndarray] = None,
+) -> BacktestResult:
+    """
+    Ejecuta la estrategia sobre un frame OHLCV (DataFrame o dict de arrays con
+    open/high/low/close y opcionalmente time en ms).
+    """
+    params = params or {}
+    risk = risk or RiskLimits.from_config()
+    high = np.asarray(ohlcv["high"], dtype=float)
+    low = np.asarray(ohlcv["low"], dtype=float)
+    close = np.asarray(ohlcv["close"], dtype=float)
+    n = len(close)
+    times = np.asarray(ohlcv["time"]) if "time" in ohlcv else np.arange(n)
+
+    cols = indicator_columns(close, params)
+    sig = strategy_signals(method, cols, params, ai_signal)
+
+    buy_idx = np.flatnonzero(sig == BUY)
+    sell_idx = np.flatnonzero(sig == SELL)
+    sl_k, tp_k = 1 - risk.sl_percent / 100.0, 1 + risk.tp_percent / 100.0
+
+    rows = []
+    pos_qty = np.zeros(n)
+    pos_entry = np.zeros(n)
+    realized = np.zeros(n)
+
+    k = 0
+    while k < buy_idx.size:
+        i = int(buy_idx[k])
+        entry = close[i]
+        if not entry > 0:
+            k += 1
+            continue
+        sl, tp = entry * sl_k, entry * tp_k
+        qty = risk.max_order_value / entry
+
+        s = np.searchsorted(sell_idx, i, side="right")
+        sell_at = int(sell_idx[s]) if s < sell_idx.size else n
+        stop = min(sell_at + 1, n)  # la vela del SELL también puede tocar SL/TP
+        hit = _first_hit(low, high, i + 1, stop, sl, tp)
+
+        if hit < stop:
+            j = hit
+            if low[j] <= sl:
+                exit_price, reason = sl, "SL"
+            else:
+                exit_price, reason = tp, "TP"
+        elif sell_at < n:
+            j, exit_price, reason = sell_at, close[sell_at], "SIGNAL"
+        else:
+            j, exit_price, reason = n - 1, close[n - 1], "END"
+
+        fees = (entry + exit_price) * qty * risk.fee_rate
+        pnl = (exit_price - entry) * qty - fees
+        rows.append((times[i], times[j], entry, exit_price, qty, pnl, fees, reason))
+
+        pos_qty[i:j] = qty
+        pos_entry[i:j] = entry
+        realized[j] += pnl
+
+        # siguiente BUY estrictamente después de la salida
+        k = int(np.searchsorted(buy_idx, j, side="right"))
+
+    equity = initial_balance + np.cumsum(realized) + pos_qty * (close - pos_entry)
+    trades = pd.DataFrame(
+        rows, columns=["entry_time", "exit_time", "entry_price", "exit_price", "qty", "pnl_usdt", "fees", "reason"]
+    )
+    return BacktestResult(trades=trades, equity=equity, stats=backtest_stats(trades, equity, initial_balance))
+
+
+def backtest_stats(trades: pd.DataFrame, equity: np.ndarray, initial_balance: float) -> dict:
+    """Métricas al estilo de /trades/stats más profit y drawdown."""
+    pnl = trades["pnl_usdt"].to_numpy() if len(trades) else np.zeros(0)
+    wins = int((pnl > 0).sum())
+    peak = np.maximum.accumulate(equity) if equity.size else equity
+    dd = ((peak - equity) / peak).max() * 100.0 if equity.size else 0.0
+    gross_win, gross_loss = pnl[pnl > 0].sum(), -pnl[pnl < 0].sum()
+    return {
+        "total": int(pnl.size),
+        "wins": wins,
+        "winrate": round(wins / pnl.size * 100.0, 2) if pnl.size else 0.0,
+        "pnl_usdt": float(pnl.sum()),
+        "fees_total": float(trades["fees"].sum()) if len(trades) else 0.0,
+        "profit_pct": float((equity[-1] - initial_balance) / initial_balance * 100.0) if equity.size else 0.0,
+        "max_drawdown_pct": float(dd),
+        "profit_factor": float(gross_win / gross_loss) if gross_loss > 0 else None,
+        "last5": [1 if p > 0 else 0 for p in pnl[-5:][::-1]],
+    }
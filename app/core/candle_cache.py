@@ -0,0 +1,173 @@
+# app/core/candle_cache.py
+"""
+Caché de velas + indicadores por (symbol, interval).
+
+Cada serie guarda un ring buffer de velas cerradas y la vela en formación.
+La primera lectura descarga el histórico; las siguientes sólo piden las velas
+posteriores al último cierre. Los indicadores (EMA20, RSI14, MACD 12/26/9) se
+mantienen con un `IndicatorState`: cada vela cerrada nueva suma un punto en
+O(1), sin recalcular el buffer. Si el lago local (`candle_store`) ya tiene la
+serie, el arranque en frío se siembra desde ahí (lectura en un thread).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from app.core.candle_store import OHLCV_FIELDS, candle_store
+from app.core.exchange import get_exchange
+from app.core.indicator_state import IndicatorState
+
+logger = logging.getLogger(__name__)
+
+CANDLES_BUFFER_SIZE = 1000            # máximo de Binance por request
+CANDLES_MAX_CONCURRENCY = int(os.getenv("CANDLES_MAX_CONCURRENCY", "8"))
+CANDLES_MIN_REFRESH_SEC = float(os.getenv("CANDLES_MIN_REFRESH_SEC", "2"))
+INDICATOR_KEYS = (("ema20", "ema_short"), ("rsi14", "rsi"), ("macd", "macd"), ("signal", "signal"))
+
+
+def empty_candles_payload(symbol: str) -> dict:
+    return {"symbol": symbol.upper(), "last": None, "ema20": [], "rsi14": [], "macd": [], "signal": [], "candles": []}
+
+
+class CandleSeries:
+    """Ring buffer de velas cerradas + vela en formación + indicadores incrementales."""
+
+    def __init__(self, symbol: str, interval: str, maxlen: int = CANDLES_BUFFER_SIZE):
+        self.symbol = symbol
+        self.interval = interval
+        self.closed: deque = deque(maxlen=maxlen)   # (open_time, o, h, l, c, v)
+        self.forming: Optional[tuple] = None
+        self.fetched_at: Optional[float] = None
+        self.lock = asyncio.Lock()
+        self.values: deque = deque(maxlen=maxlen)   # indicadores de cada vela cerrada (alineado con `closed`)
+        self.state = self._new_state()
+
+    @staticmethod
+    def _new_state() -> IndicatorState:
+        return IndicatorState(rsi_period=14, ema_short=20, macd_fast=12, macd_slow=26, macd_signal=9)
+
+    def _append(self, bar: tuple):
+        self.closed.append(bar)
+        self.values.append(self.state.update(bar[4], bar[0]))
+
+    @property
+    def last_closed_time(self) -> Optional[int]:
+        return self.closed[-1][0] if self.closed else None
+
+    def ingest(self, klines: list, now_ms: Optional[int] = None) -> int:
+        """Agrega velas nuevas (formato klines de Binance). Devuelve cuántas cerradas entraron."""
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        last = self.last_closed_time
+        added = 0
+        self.forming = None
+        for k in klines:
+            bar = (int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+            if int(k[6]) >= now_ms:
+                self.forming = bar
+                continue
+            if last is not None and bar[0] <= last:
+                continue
+            self._append(bar)
+            last = bar[0]
+            added += 1
+        return added
+
+    def seed(self, cols: dict) -> int:
+        """Siembra velas cerradas desde columnas del store (time, open, high, low, close, volume)."""
+        self.reset()
+        for bar in zip(*(cols[f] for f in OHLCV_FIELDS)):
+            self._append((int(bar[0]), *map(float, bar[1:])))
+        return len(self.closed)
+
+    def reset(self):
+        self.closed.clear()
+        self.values.clear()
+        self.forming = None
+        self.state = self._new_state()
+
+    def payload(self, limit: int) -> dict:
+        """Misma forma que /candles/{symbol}: `x` en ms, indicadores sobre velas cerradas."""
+        n = len(self.closed)
+        # ventana de las últimas `limit` velas (incluida la que está en formación)
+        n_closed = min(n, limit - 1 if self.forming else limit)
+        start = n - n_closed
+        bars = list(itertools.islice(self.closed, start, n))
+        values = list(itertools.islice(self.values, start, n))
+
+        def points(key: str) -> List[dict]:
+            # sin valor hasta completar el período (igual que las series más cortas)
+            return [{"x": b[0], "y": v[key]} for b, v in zip(bars, values) if v[key] is not None]
+
+        window = bars + ([self.forming] if self.forming else [])
+        out = {"symbol": self.symbol, "last": window[-1][4] if window else None}
+        out.update({name: points(key) for name, key in INDICATOR_KEYS})
+        out["candles"] = [{"x": b[0], "o": b[1], "h": b[2], "l": b[3], "c": b[4]} for b in window]
+        return out
+
+
+class CandleCache:
+    """Series por (symbol, interval) con descarga concurrente acotada."""
+
+    def __init__(self, max_concurrency: int = CANDLES_MAX_CONCURRENCY, min_refresh: float = CANDLES_MIN_REFRESH_SEC):
+        self._series: Dict[tuple[str, str], CandleSeries] = {}
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.min_refresh = min_refresh
+
+    def series(self, symbol: str, interval: str) -> CandleSeries:
+        key = (symbol.upper(), interval)
+        s = self._series.get(key)
+        if s is None:
+            s = self._series[key] = CandleSeries(key[0], interval)
+        return s
+
+    async def _fetch(self, symbol: str, interval: str, **kwargs) -> list:
+        async with self._sem:
+            return await get_exchange().klines(symbol, interval, **kwargs)
+
+    async def get(self, symbol: str, interval: str = "1m", limit: int = 120) -> dict:
+        s = self.series(symbol, interval)
+        async with s.lock:
+            now = time.monotonic()
+            short = len(s.closed) < limit - 1
+            if short or s.fetched_at is None or now - s.fetched_at >= self.min_refresh:
+                if short:
+                    # lectura del lago (memmap/disco) fuera del event loop
+                    cols = await asyncio.to_thread(candle_store.tail, s.symbol, interval, limit)
+                    short = s.seed(cols) < limit - 1
+                if short:
+                    # histórico insuficiente: descarga completa de la ventana
+                    kl = await self._fetch(s.symbol, interval, limit=limit)
+                    s.reset()
+                else:
+                    # incremental: sólo velas posteriores al último cierre
+                    kl = await self._fetch(s.symbol, interval, startTime=s.last_closed_time + 1, limit=CANDLES_BUFFER_SIZE)
+                    if len(kl) >= CANDLES_BUFFER_SIZE:
+                        # hueco mayor que el buffer: se descarta y se vuelve a bajar la ventana
+                        kl = await self._fetch(s.symbol, interval, limit=limit)
+                        s.reset()
+                s.ingest(kl)
+                s.fetched_at = now
+            return s.payload(limit)
+
+    async def get_many(self, symbols: List[str], interval: str = "1m", limit: int = 120) -> Dict[str, dict]:
+        """Descarga en paralelo (acotado por el semáforo). Un error por símbolo no tumba el lote."""
+        async def one(sym: str):
+            try:
+                return await self.get(sym, interval, limit)
+            except Exception as e:
+                logger.error(f"[CandleCache] ⚠️ Error obteniendo velas {sym} {interval}: {e}")
+                return empty_candles_payload(sym)
+
+        results = await asyncio.gather(*(one(s) for s in symbols))
+        return {r["symbol"]: r for r in results}
+
+
+# Instancia compartida
+candle_cache = CandleCache()
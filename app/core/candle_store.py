@@ -0,0 +1,325 @@
+# app/core/candle_store.py
+"""
+Lago local de velas OHLCV (NumPy, particionado por símbolo/intervalo/mes).
+
+    data/candles/BTCUSDT/1m/2025-09.npy    # array (6, n) float64: time, o, h, l, c, v
+
+- Sólo se guardan velas cerradas, ordenadas y sin duplicados por open time.
+- `update()` descarga únicamente lo posterior al último cierre guardado (y lo
+  anterior al primero si se pide más historia); los huecos internos se
+  re-piden una vez y los que Binance no tiene quedan anotados en `gaps.json`.
+- `read()` devuelve columnas como vistas de memmaps (meses cerrados,
+  inmutables) sin copiar; sólo al cruzar particiones se concatena.
+- Lo comparten el optimizador/backtest (`load`), el retrain (`export_csv`)
+  y `/candles` (`tail` para sembrar el caché).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+from app.core.exchange import get_exchange
+
+logger = logging.getLogger(__name__)
+
+OHLCV_FIELDS = ("time", "open", "high", "low", "close", "volume")
+KLINES_PAGE = 1000
+CANDLE_STORE_DIR = Path(os.getenv("CANDLE_STORE_DIR", "data/candles"))
+CANDLE_STORE_DEFAULT_DAYS = int(os.getenv("CANDLE_STORE_DEFAULT_DAYS", "180"))
+
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000, "3d": 259_200_000,
+    "1w": 604_800_000,
+}
+
+
+def interval_ms(interval: str) -> int:
+    try:
+        return INTERVAL_MS[interval]
+    except KeyError:
+        raise ValueError(f"Intervalo no soportado por el store: {interval}")
+
+
+def _month(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m")
+
+
+def _to_ms(dt: Optional[datetime]) -> Optional[int]:
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _columns(arr: np.ndarray) -> Dict[str, np.ndarray]:
+    return {name: arr[i] for i, name in enumerate(OHLCV_FIELDS)}
+
+
+def _empty() -> np.ndarray:
+    return np.empty((len(OHLCV_FIELDS), 0), dtype=np.float64)
+
+
+class CandleStore:
+    def __init__(self, root: Path = CANDLE_STORE_DIR):
+        self.root = Path(root)
+        self._mmaps: Dict[Path, tuple[int, np.ndarray]] = {}   # path -> (mtime_ns, memmap)
+        self._locks: Dict[tuple[str, str], asyncio.Lock] = {}
+        self.fetched_bars = 0
+        self.requests = 0
+
+    # -----------------------------
+    # Particiones
+    # -----------------------------
+    def _dir(self, symbol: str, interval: str) -> Path:
+        return self.root / symbol.upper() / interval
+
+    def partitions(self, symbol: str, interval: str) -> list[Path]:
+        d = self._dir(symbol, interval)
+        return sorted(d.glob("*.npy")) if d.exists() else []
+
+    def _load(self, path: Path) -> np.ndarray:
+        # El mes en curso se reescribe en cada update: lectura normal.
+        # Los meses cerrados son inmutables: memmap cacheado (cero copia).
+        if path.stem >= datetime.now(timezone.utc).strftime("%Y-%m"):
+            return np.load(path)
+        mtime = path.stat().st_mtime_ns
+        cached = self._mmaps.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        arr = np.load(path, mmap_mode="r")
+        self._mmaps[path] = (mtime, arr)
+        return arr
+
+    def _save(self, path: Path, arr: np.ndarray):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._mmaps.pop(path, None)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(arr))
+        os.replace(tmp, path)
+
+    def write(self, symbol: str, interval: str, rows: np.ndarray) -> int:
+        """Mezcla velas (6, n) en sus particiones mensuales. Devuelve velas nuevas."""
+        if rows.size == 0:
+            return 0
+        added = 0
+        months = np.array([_month(int(t)) for t in rows[0]])
+        for month in np.unique(months):
+            path = self._dir(symbol, interval) / f"{month}.npy"
+            new = rows[:, months == month]
+            old = np.load(path) if path.exists() else _empty()
+            merged = np.concatenate([old, new], axis=1)
+            _, idx = np.unique(merged[0], return_index=True)   # ordena y deduplica por open time
+            merged = merged[:, idx]
+            added += merged.shape[1] - old.shape[1]
+            self._save(path, merged)
+        return added
+
+    # -----------------------------
+    # Lectura
+    # -----------------------------
+    def iter_partitions(self, symbol: str, interval: str, start_ms: Optional[int] = None,
+                        end_ms: Optional[int] = None) -> Iterator[np.ndarray]:
+        """Vistas (6, n) por mes recortadas a [start_ms, end_ms)."""
+        lo_month = _month(start_ms) if start_ms is not None else None
+        hi_month = _month(end_ms - 1) if end_ms is not None else None
+        for path in self.partitions(symbol, interval):
+            if (lo_month and path.stem < lo_month) or (hi_month and path.stem > hi_month):
+                continue
+            arr = self._load(path)
+            t = arr[0]
+            i = int(np.searchsorted(t, start_ms)) if start_ms is not None else 0
+            j = int(np.searchsorted(t, end_ms)) if end_ms is not None else t.shape[0]
+            if j > i:
+                yield arr[:, i:j]
+
+    def read(self, symbol: str, interval: str, start_ms: Optional[int] = None,
+             end_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+        parts = list(self.iter_partitions(symbol, interval, start_ms, end_ms))
+        if not parts:
+            return _columns(_empty())
+        return _columns(parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1))
+
+    def tail(self, symbol: str, interval: str, n: int) -> Dict[str, np.ndarray]:
+        """Últimas `n` velas cerradas (recorre particiones desde la más nueva)."""
+        parts, have = [], 0
+        for path in reversed(self.partitions(symbol, interval)):
+            arr = self._load(path)
+            parts.insert(0, arr[:, -(n - have):])
+            have += parts[0].shape[1]
+            if have >= n:
+                break
+        if not parts:
+            return _columns(_empty())
+        return _columns(parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1))
+
+    def bounds(self, symbol: str, interval: str) -> tuple[Optional[int], Optional[int]]:
+        parts = self.partitions(symbol, interval)
+        if not parts:
+            return None, None
+        first, last = self._load(parts[0]), self._load(parts[-1])
+        return (int(first[0, 0]) if first.shape[1] else None, int(last[0, -1]) if last.shape[1] else None)
+
+    # -----------------------------
+    # Huecos
+    # -----------------------------
+    def _known_gaps_path(self, symbol: str, interval: str) -> Path:
+        return self._dir(symbol, interval) / "gaps.json"
+
+    def known_gaps(self, symbol: str, interval: str) -> set[tuple[int, int]]:
+        path = self._known_gaps_path(symbol, interval)
+        if not path.exists():
+            return set()
+        return {tuple(g) for g in json.loads(path.read_text(encoding="utf-8"))}
+
+    def _remember_gaps(self, symbol: str, interval: str, gaps: set):
+        path = self._known_gaps_path(symbol, interval)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(sorted(gaps)), encoding="utf-8")
+
+    def gaps(self, symbol: str, interval: str, start_ms: Optional[int] = None,
+             end_ms: Optional[int] = None) -> list[tuple[int, int]]:
+        """Rangos [desde, hasta) de open times faltantes entre velas guardadas."""
+        step = interval_ms(interval)
+        out, prev = [], None
+        for part in self.iter_partitions(symbol, interval, start_ms, end_ms):
+            t = part[0]
+            if prev is not None and t.shape[0] and t[0] - prev > step:
+                out.append((int(prev + step), int(t[0])))
+            d = np.diff(t)
+            for k in np.nonzero(d > step)[0]:
+                out.append((int(t[k] + step), int(t[k + 1])))
+            if t.shape[0]:
+                prev = t[-1]
+        return out
+
+    # -----------------------------
+    # Descarga incremental
+    # -----------------------------
+    async def _fetch(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> np.ndarray:
+        """Klines paginadas [start_ms, end_ms) como (6, n); descarta la vela en formación."""
+        c = get_exchange()
+        now_ms = int(time.time() * 1000)
+        rows: list = []
+        cursor = start_ms
+        while cursor < end_ms:
+            kl = await c.klines(symbol.upper(), interval, startTime=cursor, endTime=end_ms - 1, limit=KLINES_PAGE)
+            self.requests += 1
+            if not kl:
+                break
+            rows.extend(k for k in kl if int(k[6]) < now_ms)
+            cursor = int(kl[-1][0]) + 1
+            if len(kl) < KLINES_PAGE:
+                break
+        self.fetched_bars += len(rows)
+        if not rows:
+            return _empty()
+        return np.array([[float(v) for v in k[:6]] for k in rows], dtype=np.float64).T
+
+    async def update(self, symbol: str, interval: str, start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, fill_gaps: bool = True) -> dict:
+        """Trae sólo lo que falta para cubrir [start, end) y devuelve un resumen."""
+        symbol = symbol.upper()
+        step = interval_ms(interval)
+        lock = self._locks.setdefault((symbol, interval), asyncio.Lock())
+        async with lock:
+            end_ms = _to_ms(end) or int(time.time() * 1000)
+            start_ms = _to_ms(start) or end_ms - CANDLE_STORE_DEFAULT_DAYS * 86_400_000
+            first, last = self.bounds(symbol, interval)
+            added = 0
+
+            if last is None:
+                added += self.write(symbol, interval, await self._fetch(symbol, interval, start_ms, end_ms))
+            else:
+                if start_ms < first:
+                    added += self.write(symbol, interval, await self._fetch(symbol, interval, start_ms, first))
+                if last + step < end_ms:
+                    added += self.write(symbol, interval, await self._fetch(symbol, interval, last + step, end_ms))
+
+            filled, known = 0, self.known_gaps(symbol, interval)
+            pending = [g for g in self.gaps(symbol, interval, start_ms, end_ms) if g not in known]
+            if fill_gaps and pending:
+                for g in pending:
+                    got = self.write(symbol, interval, await self._fetch(symbol, interval, *g))
+                    filled += got
+                    if not got:
+                        known.add(g)   # Binance tampoco la tiene (mantenimiento, delisting)
+                self._remember_gaps(symbol, interval, known)
+            added += filled
+
+            gaps = self.gaps(symbol, interval, start_ms, end_ms)
+            if added:
+                logger.info(f"[CandleStore] ✅ {symbol} {interval}: +{added} velas ({len(gaps)} huecos)")
+            return {"symbol": symbol, "interval": interval, "added": added, "gaps_filled": filled, "gaps": gaps}
+
+    async def load(self, symbol: str, interval: str, start: datetime, end: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """Actualiza lo que falte y devuelve las columnas de [start, end)."""
+        await self.update(symbol, interval, start, end)
+        return self.read(symbol, interval, _to_ms(start), _to_ms(end))
+
+    async def export_csv(self, symbol: str, interval: str, outdir: str, start: Optional[datetime] = None) -> dict:
+        """
+        CSV para el pipeline de entrenamiento (mismo dict que `prepare_ohlcv_csv`).
+        El nombre lleva el último cierre: si no entraron velas nuevas se reutiliza.
+        """
+        import pandas as pd
+
+        try:
+            await self.update(symbol, interval, start)
+            cols = self.read(symbol, interval, _to_ms(start))
+            if not cols["time"].shape[0]:
+                return {"success": False, "error": f"Sin velas para {symbol} {interval}"}
+            last = int(cols["time"][-1])
+            outfile = os.path.join(outdir, f"{symbol.upper()}_{interval}_{last}.csv")
+            if not os.path.exists(outfile):
+                os.makedirs(outdir, exist_ok=True)
+                df = pd.DataFrame({k: np.asarray(v) for k, v in cols.items() if k != "time"})
+                df.insert(0, "timestamp", pd.to_datetime(cols["time"], unit="ms"))
+                df.to_csv(outfile + ".tmp", index=False)
+                os.replace(outfile + ".tmp", outfile)
+            return {
+                "success": True,
+                "outfile": outfile,
+                "rows": int(cols["time"].shape[0]),
+                "filesize": os.path.getsize(outfile),
+                "generated_at": datetime.utcfromtimestamp(os.path.getmtime(outfile)).isoformat(),
+            }
+        except Exception as e:
+            logger.error(f"[CandleStore] ❌ Error exportando {symbol} {interval}: {e}")
+            return {"success": False, "error": str(e)}
+
+    def stats(self) -> dict:
+        series = {}
+        if self.root.exists():
+            for d in self.root.glob("*/*"):
+                parts = sorted(d.glob("*.npy"))
+                if parts:
+                    first, last = self.bounds(d.parent.name, d.name)
+                    series[f"{d.parent.name}:{d.name}"] = {
+                        "partitions": len(parts),
+                        "bytes": sum(p.stat().st_size for p in parts),
+                        "first": first,
+                        "last": last,
+                    }
+        return {
+            "root": str(self.root),
+            "series": series,
+            "mmaps_open": len(self._mmaps),
+            "requests": self.requests,
+            "fetched_bars": self.fetched_bars,
+        }
+
+
+candle_store = CandleStore()
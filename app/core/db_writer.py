@@ -0,0 +1,540 @@
+# app/core/db_writer.py
+"""
+Escritor único de la base de datos (actor).
+
+Una sola tarea es dueña de todas las mutaciones de posiciones y trades: los
+demás componentes le mandan comandos por una cola en proceso o, desde otro
+proceso (bot), por un socket local con JSON por línea: Unix
+(`unix:/ruta.sock`, permisos 0600) o TCP en loopback. La primera línea de
+cada conexión es `{"auth": DB_WRITER_TOKEN}`; en TCP el token es
+obligatorio y escuchar fuera de loopback requiere `DB_WRITER_ALLOW_REMOTE=1`.
+El actor agrupa los comandos que encuentra en cola en una transacción corta;
+si el lote falla, los reintenta de a uno para aislar el comando culpable.
+
+- `get_writer()`: escritor del proceso (local por defecto); el bot instala un
+  `RemoteDbWriter` con `connect_remote()` si el backend está escuchando.
+- `read_session()`: sesiones de lectura de vida corta (en SQLite, conexión
+  `mode=ro` que nunca toma el lock de escritura ni retiene checkpoints).
+- `benchmark()`: escritores concurrentes directos vs. a través del actor.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.db import SessionLocal, engine
+from app.core.models import DecisionLog, EquitySnapshot, Position, Trade
+
+logger = logging.getLogger(__name__)
+
+DB_WRITER_LISTEN = os.getenv("DB_WRITER_LISTEN", "")      # backend (dueño): escucha comandos
+DB_WRITER_ADDR = os.getenv("DB_WRITER_ADDR", "")          # bot: dirección del dueño
+DB_WRITER_MAX_BATCH = int(os.getenv("DB_WRITER_MAX_BATCH", "200"))
+DB_WRITER_TOKEN = os.getenv("DB_WRITER_TOKEN", "")        # secreto compartido backend ↔ bot
+DB_WRITER_ALLOW_REMOTE = os.getenv("DB_WRITER_ALLOW_REMOTE", "0") == "1"
+UNIX_PREFIX = "unix:"
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+
+async def _open(addr: str):
+    if addr.startswith(UNIX_PREFIX):
+        return await asyncio.open_unix_connection(addr[len(UNIX_PREFIX):])
+    host, port = addr.rsplit(":", 1)
+    return await asyncio.open_connection(host, int(port))
+
+
+# =============================
+# Comandos
+# =============================
+COMMANDS: Dict[str, Callable[..., Awaitable]] = {}
+MODELS = {"DecisionLog": DecisionLog, "Trade": Trade, "EquitySnapshot": EquitySnapshot}
+POSITION_FIELDS = {"qty", "sl", "tp", "last_price", "status", "fees_total", "close_method", "closed_at"}
+
+
+def command(name: str):
+    def register(fn):
+        COMMANDS[name] = fn
+        return fn
+    return register
+
+
+def _parse_dt(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+@command("close_positions")
+async def _close_positions(session, ids: list, closed_at=None, prices: Optional[dict] = None, close_method: Optional[str] = None):
+    """Marca CLOSED las posiciones OPEN indicadas; `prices` = {symbol: último precio}."""
+    rows = (await session.execute(
+        select(Position).where(Position.id.in_(ids), Position.status == "OPEN")
+    )).scalars().all()
+    when = _parse_dt(closed_at) or datetime.utcnow()
+    for pos in rows:
+        if prices and pos.symbol in prices:
+            pos.last_price = prices[pos.symbol]
+        pos.status = "CLOSED"
+        pos.qty = 0.0
+        pos.closed_at = when
+        if close_method:
+            pos.close_method = pos.close_method or close_method
+    return [p.id for p in rows]
+
+
+@command("record_exits")
+async def _record_exits(session, exits: list, close_method: str, closed_at=None):
+    """
+    Cierra posiciones registrando su trade de salida.
+    `exits` = [{position_id, side, qty, price, fees, pnl}].
+    """
+    when = _parse_dt(closed_at) or datetime.utcnow()
+    closed = []
+    for ex in exits:
+        pos = await session.get(Position, ex["position_id"])
+        if pos is None or pos.status != "OPEN":
+            continue
+        session.add(Trade(
+            position_id=pos.id,
+            symbol=pos.symbol,
+            side=ex["side"],
+            qty=ex["qty"],
+            price=ex["price"],
+            fees=ex["fees"],
+            pnl=ex["pnl"],
+            created_at=when,
+        ))
+        pos.last_price = ex["price"]
+        pos.fees_total = float(pos.fees_total or 0.0) + ex["fees"]
+        pos.close_method = close_method
+        pos.status = "CLOSED"
+        pos.closed_at = when
+        pos.qty = 0.0
+        closed.append(pos.id)
+    return closed
+
+
+@command("update_position")
+async def _update_position(session, id: int, **fields):
+    pos = await session.get(Position, id)
+    if pos is None:
+        return None
+    for k, v in fields.items():
+        if k not in POSITION_FIELDS:
+            raise ValueError(f"campo no permitido: {k}")
+        setattr(pos, k, _parse_dt(v) if k == "closed_at" else v)
+    return pos.id
+
+
+@command("insert_rows")
+async def _insert_rows(session, model: str, rows: list):
+    cls = MODELS[model]
+    dt_cols = {c.name for c in cls.__table__.columns if isinstance(c.type, DateTime)}
+    session.add_all(cls(**{k: (_parse_dt(v) if k in dt_cols else v) for k, v in r.items()}) for r in rows)
+    return len(rows)
+
+
+def orm_row(obj) -> dict:
+    """Columnas de un objeto ORM serializables a JSON (para `insert_rows` remoto)."""
+    out = {}
+    for col in obj.__table__.columns:
+        v = getattr(obj, col.key, None)
+        if v is None:
+            continue
+        out[col.key] = v.isoformat() if isinstance(v, datetime) else v
+    return out
+
+
+# =============================
+# Actor local
+# =============================
+class DbWriter:
+    remote = False
+
+    def __init__(self, session_factory=SessionLocal, max_batch: int = DB_WRITER_MAX_BATCH):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._token = DB_WRITER_TOKEN
+        self.commands = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies: deque = deque(maxlen=500)
+
+    def _ensure_queue(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+
+    async def execute(self, fn: Callable[..., Awaitable], *args, **kwargs):
+        """Ejecuta `fn(session, *args, **kwargs)` dentro del actor y devuelve su resultado."""
+        self._ensure_queue()
+        if self._task is None:
+            self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((fn, args, kwargs, fut, time.perf_counter()))
+        return await fut
+
+    async def call(self, name: str, **payload):
+        return await self.execute(COMMANDS[name], **payload)
+
+    async def _apply(self, items: list):
+        async with self.session_factory() as session:
+            results = [await fn(session, *a, **kw) for fn, a, kw, _, _ in items]
+            await session.commit()
+        return results
+
+    async def _run_batch(self, items: list):
+        try:
+            results = await self._apply(items)
+            for (_, _, _, fut, _), r in zip(items, results):
+                if not fut.done():
+                    fut.set_result(r)
+        except Exception:
+            if len(items) == 1:
+                raise
+            # Aislar al culpable: de a uno, cada uno en su transacción
+            for item in items:
+                try:
+                    (r,) = await self._apply([item])
+                    if not item[3].done():
+                        item[3].set_result(r)
+                except Exception as e:
+                    self.errors += 1
+                    if not item[3].done():
+                        item[3].set_exception(e)
+
+    async def _run(self):
+        while True:
+            items = [await self._queue.get()]
+            while len(items) < self.max_batch and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            try:
+                await self._run_batch(items)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"[DbWriter] ❌ Comando fallido: {e}")
+                for *_, fut, _ in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+            now = time.perf_counter()
+            self.latencies.extend((now - t0) * 1000 for *_, t0 in items)
+            self.commands += len(items)
+            self.batches += 1
+
+    def start(self):
+        self._ensure_queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._task:
+            # Drenar lo encolado antes de cortar
+            while self._queue and not self._queue.empty():
+                await asyncio.sleep(0.01)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # -----------------------------
+    # Socket local (comandos de otros procesos)
+    # -----------------------------
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Handshake: sin el token correcto no se acepta ningún comando
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), timeout=5))
+            token = str(hello.get("auth", "")) if isinstance(hello, dict) else ""
+        except (asyncio.TimeoutError, ValueError):
+            token = None
+        if token is None or not hmac.compare_digest(token.encode(), self._token.encode()):
+            logger.warning("[DbWriter] ⛔ Conexión rechazada: autenticación inválida")
+            writer.close()
+            return
+
+        async def answer(req: dict):
+            try:
+                result = await self.call(req["cmd"], **req.get("payload", {}))
+                resp = {"id": req["id"], "ok": True, "result": result}
+            except Exception as e:
+                resp = {"id": req["id"], "ok": False, "error": str(e)}
+            writer.write((json.dumps(resp, default=str) + "\n").encode())
+            await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                asyncio.create_task(answer(json.loads(line)))
+        finally:
+            writer.close()
+
+    async def serve(self, addr: str = DB_WRITER_LISTEN, token: str = DB_WRITER_TOKEN):
+        self._token = token
+        if addr.startswith(UNIX_PREFIX):
+            path = addr[len(UNIX_PREFIX):]
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if os.path.exists(path):
+                os.unlink(path)
+            self.start()
+            old_umask = os.umask(0o177)   # socket 0600: sólo el mismo usuario
+            try:
+                self._server = await asyncio.start_unix_server(self._handle_client, path)
+            finally:
+                os.umask(old_umask)
+        else:
+            host, port = addr.rsplit(":", 1)
+            if not token:
+                raise RuntimeError("DB_WRITER_TOKEN es obligatorio para escuchar por TCP (o usar unix:/ruta.sock)")
+            if not _is_loopback(host) and not DB_WRITER_ALLOW_REMOTE:
+                raise RuntimeError(f"{host} no es loopback: definir DB_WRITER_ALLOW_REMOTE=1 para permitirlo")
+            self.start()
+            self._server = await asyncio.start_server(self._handle_client, host, int(port))
+        logger.info(f"[DbWriter] 🔌 Escuchando comandos en {addr}")
+
+    def stats(self) -> dict:
+        lat = sorted(self.latencies)
+        return {
+            "remote": False,
+            "depth": self._queue.qsize() if self._queue else 0,
+            "commands": self.commands,
+            "batches": self.batches,
+            "errors": self.errors,
+            "p50_ms": round(lat[len(lat) // 2], 2) if lat else None,
+            "p95_ms": round(lat[min(int(len(lat) * 0.95), len(lat) - 1)], 2) if lat else None,
+            "listening": self._server is not None,
+            "running": bool(self._task and not self._task.done()),
+        }
+
+
+# =============================
+# Cliente remoto (otro proceso)
+# =============================
+class RemoteDbWriter:
+    remote = True
+
+    def __init__(self, addr: str = DB_WRITER_ADDR, token: str = DB_WRITER_TOKEN):
+        self.addr = addr
+        self.token = token
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._lock: Optional[asyncio.Lock] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def _connect(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._writer and not self._writer.is_closing():
+                return
+            self._reader, self._writer = await _open(self.addr)
+            self._writer.write((json.dumps({"auth": self.token}) + "\n").encode())
+            await self._writer.drain()
+            self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self):
+        try:
+            while line := await self._reader.readline():
+                resp = json.loads(line)
+                fut = self._pending.pop(resp["id"], None)
+                if fut and not fut.done():
+                    if resp["ok"]:
+                        fut.set_result(resp.get("result"))
+                    else:
+                        fut.set_exception(RuntimeError(resp.get("error")))
+        finally:
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("DbWriter remoto desconectado"))
+            self._pending.clear()
+            if self._writer:
+                self._writer.close()
+
+    async def call(self, name: str, **payload):
+        await self._connect()
+        req_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[req_id] = fut
+        self._writer.write((json.dumps({"id": req_id, "cmd": name, "payload": payload}, default=str) + "\n").encode())
+        await self._writer.drain()
+        return await fut
+
+    async def execute(self, fn, *args, **kwargs):
+        raise TypeError("El escritor remoto sólo acepta comandos registrados (call)")
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    def stats(self) -> dict:
+        return {"remote": True, "addr": self.addr, "pending": len(self._pending)}
+
+
+_writer = None
+
+
+def get_writer():
+    """Escritor del proceso (por defecto, actor local)."""
+    global _writer
+    if _writer is None:
+        _writer = DbWriter()
+    return _writer
+
+
+def set_writer(writer):
+    global _writer
+    _writer = writer
+
+
+async def connect_remote(addr: str = DB_WRITER_ADDR) -> bool:
+    """
+    Usa el escritor de otro proceso si responde en `addr`; si no, queda el
+    actor local (el bot puede correr sin backend).
+    """
+    if not addr:
+        return False
+    remote = RemoteDbWriter(addr)
+    try:
+        await remote._connect()
+    except OSError as e:
+        logger.warning(f"[DbWriter] ⚠️ Sin escritor remoto en {addr} ({e}); uso escritor local")
+        return False
+    set_writer(remote)
+    logger.info(f"[DbWriter] 🔗 Mutaciones delegadas al escritor en {addr}")
+    return True
+
+
+# =============================
+# Lecturas de vida corta
+# =============================
+_read_sessionmaker = None
+
+
+def _read_only_factory():
+    global _read_sessionmaker
+    if _read_sessionmaker is None:
+        url = engine.url
+        if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+            path = Path(url.database).resolve().as_posix()
+            ro = create_async_engine(f"sqlite+{url.get_driver_name()}:///file:{path}?mode=ro&uri=true")
+            _read_sessionmaker = async_sessionmaker(ro, expire_on_commit=False)
+        else:
+            _read_sessionmaker = SessionLocal
+    return _read_sessionmaker
+
+
+@asynccontextmanager
+async def read_session():
+    """Sesión de sólo lectura, cerrada al salir del bloque (no retiene snapshots)."""
+    async with _read_only_factory()() as session:
+        yield session
+
+
+# =============================
+# Benchmark: escritores concurrentes
+# =============================
+_bench_meta = MetaData()
+_bench_table = Table(
+    "bench_writes", _bench_meta,
+    Column("id", Integer, primary_key=True),
+    Column("writer", String(16)),
+    Column("n", Integer),
+    Column("ts", DateTime),
+)
+
+
+async def _bench_insert(session, writer: str, n: int):
+    await session.execute(insert(_bench_table).values(writer=writer, n=n, ts=datetime.utcnow()))
+
+
+async def benchmark(writers: int = 8, rows_per_writer: int = 200) -> dict:
+    """
+    Mismo volumen de inserts (una fila por transacción) con `writers` tareas
+    concurrentes: cada una con su conexión vs. todas a través de un DbWriter.
+    Corre sobre una base SQLite temporal con los mismos pragmas.
+    """
+    from app.core.write_queue import SQLITE_BUSY_TIMEOUT_MS
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("direct", "actor"):
+            bench_engine = create_async_engine(
+                f"sqlite+aiosqlite:///{Path(tmp) / f'{mode}.db'}",
+                connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            )
+            async with bench_engine.begin() as conn:
+                await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+                await conn.run_sync(_bench_meta.create_all)
+            factory = async_sessionmaker(bench_engine, expire_on_commit=False)
+            actor = DbWriter(session_factory=factory)
+            latencies: list[float] = []
+            locked = 0
+
+            async def one_writer(w: int):
+                nonlocal locked
+                for n in range(rows_per_writer):
+                    t0 = time.perf_counter()
+                    try:
+                        if mode == "direct":
+                            async with factory() as s:
+                                await _bench_insert(s, f"w{w}", n)
+                                await s.commit()
+                        else:
+                            await actor.execute(_bench_insert, f"w{w}", n)
+                    except OperationalError:
+                        locked += 1
+                    latencies.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one_writer(w) for w in range(writers)))
+            elapsed = time.perf_counter() - t0
+            await actor.stop()
+            await bench_engine.dispose()
+
+            lat = sorted(latencies)
+            total = writers * rows_per_writer
+            results[mode] = {
+                "rows": total - locked,
+                "locked_errors": locked,
+                "elapsed_s": round(elapsed, 3),
+                "rows_per_s": round((total - locked) / elapsed, 1) if elapsed else None,
+                "p50_ms": round(lat[len(lat) // 2], 2),
+                "p95_ms": round(lat[min(int(len(lat) * 0.95), len(lat) - 1)], 2),
+                "max_ms": round(lat[-1], 2),
+            }
+    return results
@@ -0,0 +1,299 @@
+# app/core/equity_rollups.py
+"""
+Rollups OHLC del histórico de equity (`equity_snapshots.total_usdt`).
+
+- `equity_rollups`: un bucket por (resolución, inicio) con open/high/low/close
+  del total, suma y cantidad de snapshots (para el promedio) y el último
+  free/invested. Resoluciones 1m / 5m / 1h / 1d; 1m y 5m con retención corta.
+- Se mantienen en la misma transacción en la que se inserta un
+  `EquitySnapshot` (hook `before_flush`, UPSERT atómico por bucket).
+- `history()` elige la resolución más fina que entra en el presupuesto de
+  puntos y la baja con LTTB: un gráfico de 12 meses lee ~cientos de filas,
+  igual que uno de 1 hora.
+- `backfill_if_empty()` (arranque del backend) llena los rollups desde
+  `equity_snapshots` la primera vez, sin pasar por `manage.py stats rebuild-equity`.
+- `nearest_total()` resuelve las ventanas de % (1h…12m) con dos lecturas
+  sobre el índice de `equity_snapshots.ts`.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Float, Integer, String, delete, event, func, select
+from sqlalchemy.orm import Session
+
+from app.core.db import Base
+from app.core.models import EquitySnapshot
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+RESOLUTIONS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+RETENTION = {"1m": timedelta(days=2), "5m": timedelta(days=35), "1h": None, "1d": None}
+OVERSAMPLE = 4  # filas leídas como máximo por punto devuelto antes de LTTB
+DEFAULT_POINTS = 500
+
+
+class EquityRollup(Base):
+    __tablename__ = "equity_rollups"
+
+    res = Column(String(3), primary_key=True)           # "1m" | "5m" | "1h" | "1d"
+    bucket_start = Column(DateTime, primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    sum_total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+    free_usdt = Column(Float, nullable=False, default=0.0)
+    invested_usdt = Column(Float, nullable=False, default=0.0)
+
+
+def bucket_start(ts: datetime, res: str) -> datetime:
+    sec = RESOLUTIONS[res]
+    return EPOCH + timedelta(seconds=int((ts - EPOCH).total_seconds()) // sec * sec)
+
+
+def parse_span(value: str) -> Optional[timedelta]:
+    """'1h', '24h', '7d', '2w', '6m' (meses), '1y' → timedelta; 'all' → None."""
+    value = (value or "").strip().lower()
+    if value in ("", "all"):
+        return None
+    m = re.fullmatch(r"(\d+)\s*(h|d|w|m|y)", value)
+    if not m:
+        raise ValueError(f"rango inválido: '{value}'")
+    n, unit = int(m.group(1)), m.group(2)
+    days = {"h": 1 / 24, "d": 1, "w": 7, "m": 30, "y": 365}[unit]
+    return timedelta(days=n * days)
+
+
+# =============================
+# Escritura (hook)
+# =============================
+def _insert(session: Session):
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(EquityRollup.__table__), func.greatest, func.least
+    from sqlalchemy.dialects.sqlite import insert
+    # En SQLite max()/min() con dos argumentos son escalares
+    return insert(EquityRollup.__table__), func.max, func.min
+
+
+def apply_snapshot(session: Session, ts: datetime, free: float, invested: float, total: float):
+    """Suma un snapshot a los buckets de todas las resoluciones."""
+    insert, greatest, least = _insert(session)
+    t = EquityRollup.__table__.c
+    for res in RESOLUTIONS:
+        stmt = insert.values(
+            res=res, bucket_start=bucket_start(ts, res),
+            open=total, high=total, low=total, close=total,
+            sum_total=total, count=1, free_usdt=free, invested_usdt=invested,
+        )
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=["res", "bucket_start"],
+            set_={
+                "high": greatest(t.high, stmt.excluded.high),
+                "low": least(t.low, stmt.excluded.low),
+                "close": stmt.excluded.close,
+                "sum_total": t.sum_total + stmt.excluded.sum_total,
+                "count": t.count + stmt.excluded.count,
+                "free_usdt": stmt.excluded.free_usdt,
+                "invested_usdt": stmt.excluded.invested_usdt,
+            },
+        ))
+    for res, keep in RETENTION.items():
+        if keep is not None:
+            session.execute(
+                delete(EquityRollup).where(EquityRollup.res == res, EquityRollup.bucket_start < ts - keep)
+            )
+
+
+@event.listens_for(Session, "before_flush")
+def _record_snapshots(session: Session, flush_context, instances):
+    snaps = [o for o in session.new if isinstance(o, EquitySnapshot)]
+    if not snaps:
+        return
+    with session.no_autoflush:
+        for s in sorted(snaps, key=lambda s: s.ts or datetime.utcnow()):
+            try:
+                apply_snapshot(
+                    session, s.ts or datetime.utcnow(),
+                    float(s.free_usdt or 0.0), float(s.invested_usdt or 0.0), float(s.total_usdt or 0.0),
+                )
+            except Exception as e:
+                logger.error(f"[EquityRollups] ⚠️ No se pudo registrar snapshot: {e}")
+
+
+# =============================
+# LTTB
+# =============================
+def lttb(xs: list[float], ys: list[float], threshold: int) -> list[int]:
+    """Largest-Triangle-Three-Buckets: índices de los puntos a conservar (incluye extremos)."""
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1]
+    every = (n - 2) / (threshold - 2)
+    out = [0]
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nxt_lo, nxt_hi = hi, min(int((i + 2) * every) + 1, n)
+        if nxt_lo >= nxt_hi:
+            nxt_lo, nxt_hi = n - 1, n
+        avg_x = sum(xs[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+        avg_y = sum(ys[nxt_lo:nxt_hi]) / (nxt_hi - nxt_lo)
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        a = best
+    out.append(n - 1)
+    return out
+
+
+# =============================
+# Lecturas
+# =============================
+def pick_resolution(start: datetime, end: datetime, points: int, now: Optional[datetime] = None) -> str:
+    """Resolución más fina disponible cuyo número de buckets no supera points*OVERSAMPLE."""
+    now = now or datetime.utcnow()
+    span = max((end - start).total_seconds(), 1.0)
+    for res, sec in RESOLUTIONS.items():
+        keep = RETENTION[res]
+        if keep is not None and start < now - keep:
+            continue
+        if span / sec <= points * OVERSAMPLE:
+            return res
+    return "1d"
+
+
+async def first_bucket(session) -> Optional[datetime]:
+    return (await session.execute(
+        select(func.min(EquityRollup.bucket_start)).where(EquityRollup.res == "1d")
+    )).scalar()
+
+
+async def history(
+    session,
+    span: Optional[timedelta] = None,
+    end: Optional[datetime] = None,
+    resolution: Optional[str] = None,
+    points: int = DEFAULT_POINTS,
+) -> list[dict]:
+    """Buckets de [end - span, end] (span=None: todo el histórico) bajados a `points` con LTTB."""
+    end = end or datetime.utcnow()
+    if span is None:
+        start = await first_bucket(session) or end
+    else:
+        start = end - span
+    if resolution not in RESOLUTIONS:
+        resolution = pick_resolution(start, end, points)
+
+    rows = (await session.execute(
+        select(EquityRollup)
+        .where(
+            EquityRollup.res == resolution,
+            EquityRollup.bucket_start >= bucket_start(start, resolution),
+            EquityRollup.bucket_start <= end,
+        )
+        .order_by(EquityRollup.bucket_start.asc())
+    )).scalars().all()
+
+    if len(rows) > points:
+        xs = [(r.bucket_start - EPOCH).total_seconds() for r in rows]
+        rows = [rows[i] for i in lttb(xs, [r.close for r in rows], points)]
+
+    return [
+        {
+            "ts": r.bucket_start.isoformat(),
+            "res": resolution,
+            "open": r.open,
+            "high": r.high,
+            "low": r.low,
+            "close": r.close,
+            "avg": r.sum_total / r.count if r.count else r.close,
+            "free": r.free_usdt,
+            "invested": r.invested_usdt,
+        }
+        for r in rows
+    ]
+
+
+async def latest_snapshot(session) -> Optional[EquitySnapshot]:
+    return (await session.execute(
+        select(EquitySnapshot).order_by(EquitySnapshot.ts.desc()).limit(1)
+    )).scalars().first()
+
+
+async def nearest_total(session, ts: datetime) -> Optional[float]:
+    """total_usdt del snapshot más cercano a `ts` (una lectura a cada lado sobre ix_equity_snapshots_ts)."""
+    before = (await session.execute(
+        select(EquitySnapshot.ts, EquitySnapshot.total_usdt)
+        .where(EquitySnapshot.ts <= ts).order_by(EquitySnapshot.ts.desc()).limit(1)
+    )).first()
+    after = (await session.execute(
+        select(EquitySnapshot.ts, EquitySnapshot.total_usdt)
+        .where(EquitySnapshot.ts >= ts).order_by(EquitySnapshot.ts.asc()).limit(1)
+    )).first()
+    if before is None and after is None:
+        return None
+    if before is None or (after is not None and after.ts - ts < ts - before.ts):
+        return float(after.total_usdt)
+    return float(before.total_usdt)
+
+
+# =============================
+# Reconstrucción (backfill)
+# =============================
+async def rebuild_rollups(session) -> dict:
+    """Recalcula todos los buckets desde equity_snapshots."""
+    await session.execute(delete(EquityRollup))
+    buckets: dict = {}
+    now = datetime.utcnow()
+    count = 0
+    result = await session.stream(
+        select(EquitySnapshot).where(EquitySnapshot.ts.is_not(None)).order_by(EquitySnapshot.ts.asc())
+    )
+    async for s in result.scalars():
+        total = float(s.total_usdt or 0.0)
+        for res in RESOLUTIONS:
+            keep = RETENTION[res]
+            if keep is not None and s.ts < now - keep:
+                continue
+            key = (res, bucket_start(s.ts, res))
+            b = buckets.get(key)
+            if b is None:
+                buckets[key] = b = {"open": total, "high": total, "low": total, "sum_total": 0.0, "count": 0}
+            b["high"] = max(b["high"], total)
+            b["low"] = min(b["low"], total)
+            b["close"] = total
+            b["sum_total"] += total
+            b["count"] += 1
+            b["free_usdt"] = float(s.free_usdt or 0.0)
+            b["invested_usdt"] = float(s.invested_usdt or 0.0)
+        count += 1
+
+    session.add_all(EquityRollup(res=k[0], bucket_start=k[1], **v) for k, v in buckets.items())
+    await session.commit()
+    logger.info(f"[EquityRollups] ✅ Reconstruido: {count} snapshots, {len(buckets)} buckets")
+    return {"snapshots": count, "buckets": len(buckets)}
+
+
+async def backfill_if_empty(session) -> Optional[dict]:
+    """Primer arranque tras la migración: rollups vacíos pero con snapshots → `rebuild_rollups`."""
+    if await session.scalar(select(EquityRollup.res).limit(1)) is not None:
+        return None
+    if await session.scalar(select(EquitySnapshot.ts).limit(1)) is None:
+        return None
+    logger.info("[EquityRollups] 🔄 Rollups vacíos con snapshots existentes: reconstruyendo...")
+    return await rebuild_rollups(session)
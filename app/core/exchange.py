@@ -0,0 +1,261 @@
+# app/core/exchange.py
+"""
+Cliente de exchange compartido y asíncrono para el backend.
+
+- Un único `Spot` (una `requests.Session` con pool keep-alive) para todo el
+  proceso, en lugar de construir un cliente por llamada.
+- Las llamadas REST corren fuera del event loop (`asyncio.to_thread`) con un
+  límite de concurrencia.
+- Un token bucket con el peso de cada endpoint (REQUEST_WEIGHT por minuto de
+  Binance) frena antes de llegar al límite; se resincroniza con el header
+  `X-MBX-USED-WEIGHT-1M` y respeta `Retry-After` ante 429/418.
+- Métricas por endpoint (llamadas, errores, peso, latencias).
+
+Uso: `c = get_exchange(); info = await c.account()`. En endpoints se puede
+inyectar con `Depends(get_exchange)`; en tests, `set_exchange(FakeExchange())`
+(ver `app.core.fake_exchange`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from binance.error import ClientError
+from binance.spot import Spot
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BINANCE_WEIGHT_LIMIT_1M = int(os.getenv("BINANCE_WEIGHT_LIMIT_1M", "6000"))
+BINANCE_WEIGHT_SAFETY = float(os.getenv("BINANCE_WEIGHT_SAFETY", "0.8"))
+BINANCE_MAX_CONCURRENCY = int(os.getenv("BINANCE_MAX_CONCURRENCY", "8"))
+
+# Pesos de REQUEST_WEIGHT (spot). (con símbolo, sin símbolo)
+ENDPOINT_WEIGHTS: dict[str, tuple[int, int]] = {
+    "account": (20, 20),
+    "exchange_info": (20, 20),
+    "ticker_price": (2, 4),
+    "book_ticker": (2, 4),
+    "ticker_24hr": (2, 80),
+    "klines": (2, 2),
+    "depth": (5, 5),
+    "new_order": (1, 1),
+    "get_order": (4, 4),
+    "cancel_order": (1, 1),
+    "cancel_open_orders": (1, 1),
+    "get_open_orders": (6, 80),
+    "my_trades": (20, 20),
+    "time": (1, 1),
+    "ping": (1, 1),
+    "new_listen_key": (2, 2),
+    "renew_listen_key": (2, 2),
+    "close_listen_key": (2, 2),
+}
+DEFAULT_WEIGHT = 1
+
+
+def request_weight(method: str, args: tuple, kwargs: dict) -> int:
+    with_symbol, without_symbol = ENDPOINT_WEIGHTS.get(method, (DEFAULT_WEIGHT, DEFAULT_WEIGHT))
+    has_symbol = bool(args) or bool(kwargs.get("symbol")) or bool(kwargs.get("symbols"))
+    return with_symbol if has_symbol else without_symbol
+
+
+# =============================
+# Token bucket por peso
+# =============================
+class WeightBucket:
+    """Capacidad `capacity` de peso que se repone linealmente cada `period` segundos."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.server_used_1m: Optional[int] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight: int):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+
+    def sync(self, used_1m: int, limit_1m: int):
+        """Ajusta los tokens al peso usado que informa el servidor (nunca los aumenta)."""
+        self.server_used_1m = used_1m
+        self._refill()
+        remaining = self.capacity - used_1m * self.capacity / limit_1m
+        self.tokens = min(self.tokens, max(remaining, 0.0))
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    def snapshot(self) -> dict:
+        self._refill()
+        return {
+            "capacity": self.capacity,
+            "available": round(self.tokens, 1),
+            "server_used_1m": self.server_used_1m,
+            "blocked_for_sec": round(max(self.blocked_until - time.monotonic(), 0.0), 1),
+        }
+
+
+# =============================
+# Métricas
+# =============================
+class EndpointStats:
+    def __init__(self, window: int = 500):
+        self.calls = 0
+        self.errors = 0
+        self.weight = 0
+        self.latencies: deque = deque(maxlen=window)
+
+    def record(self, ms: float, weight: int, ok: bool):
+        self.calls += 1
+        self.weight += weight
+        self.errors += 0 if ok else 1
+        self.latencies.append(ms)
+
+    def summary(self) -> dict:
+        lat = sorted(self.latencies)
+        pct = lambda q: round(lat[min(int(q * len(lat)), len(lat) - 1)], 1) if lat else None
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "weight": self.weight,
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+            "max_ms": round(lat[-1], 1) if lat else None,
+        }
+
+
+# =============================
+# Cliente
+# =============================
+def _default_spot(pool_size: int) -> Spot:
+    spot = Spot(
+        api_key=settings.BINANCE_API_KEY,
+        api_secret=settings.BINANCE_API_SECRET,
+        base_url=settings.BINANCE_BASE_URL if settings.BINANCE_TESTNET else None,
+        show_limit_usage=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    spot.session.mount("https://", adapter)
+    spot.session.mount("http://", adapter)
+    return spot
+
+
+class AsyncExchange:
+    """Proxy asíncrono sobre un `Spot` compartido: `await ex.klines("BTCUSDT", "1m", limit=100)`."""
+
+    def __init__(
+        self,
+        spot_factory: Optional[Callable[[int], Spot]] = None,
+        max_concurrency: int = BINANCE_MAX_CONCURRENCY,
+        weight_limit_1m: int = BINANCE_WEIGHT_LIMIT_1M,
+        safety: float = BINANCE_WEIGHT_SAFETY,
+    ):
+        self._spot_factory = spot_factory or _default_spot
+        self._spot: Optional[Spot] = None
+        self.max_concurrency = max_concurrency
+        self.weight_limit_1m = weight_limit_1m
+        self.bucket = WeightBucket(weight_limit_1m * safety)
+        self.stats: dict[str, EndpointStats] = {}
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    @property
+    def spot(self) -> Spot:
+        if self._spot is None:
+            self._spot = self._spot_factory(self.max_concurrency)
+        return self._spot
+
+    async def call(self, method: str, *args, **kwargs):
+        weight = request_weight(method, args, kwargs)
+        fn = getattr(self.spot, method)
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+
+        await self.bucket.acquire(weight)
+        ok = False
+        t0 = time.perf_counter()
+        try:
+            async with self._sem:
+                res = await asyncio.to_thread(fn, *args, **kwargs)
+            ok = True
+        except ClientError as e:
+            if e.status_code in (418, 429):
+                retry = float((e.header or {}).get("Retry-After", 60))
+                self.bucket.block(retry)
+                logger.error(f"[Exchange] 🚫 {e.status_code} en {method}: pausa de {retry:.0f}s")
+            raise
+        finally:
+            st = self.stats.setdefault(method, EndpointStats())
+            st.record((time.perf_counter() - t0) * 1000, weight, ok)
+
+        if isinstance(res, dict) and "limit_usage" in res and "data" in res:
+            used = res["limit_usage"].get("x-mbx-used-weight-1m")
+            if used is not None:
+                self.bucket.sync(int(used), self.weight_limit_1m)
+            res = res["data"]
+        return res
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def method(*args, **kwargs):
+            return await self.call(name, *args, **kwargs)
+        method.__name__ = name
+        return method
+
+    def metrics(self) -> dict:
+        return {
+            "limiter": self.bucket.snapshot(),
+            "max_concurrency": self.max_concurrency,
+            "endpoints": {k: v.summary() for k, v in sorted(self.stats.items())},
+        }
+
+    def close(self):
+        if self._spot is not None:
+            self._spot.session.close()
+            self._spot = None
+
+
+# =============================
+# Instancia compartida / dependencia FastAPI
+# =============================
+_exchange: AsyncExchange = AsyncExchange()
+
+
+def get_exchange() -> AsyncExchange:
+    """Cliente compartido (también usable como `Depends(get_exchange)`)."""
+    return _exchange
+
+
+def set_exchange(client) -> None:
+    """Reemplaza el cliente compartido (tests / FakeExchange)."""
+    global _exchange
+    _exchange = client
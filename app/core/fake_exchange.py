@@ -0,0 +1,125 @@
+# app/core/fake_exchange.py
+"""
+Exchange falso en memoria con la misma interfaz asíncrona que `AsyncExchange`.
+
+    from app.core.exchange import set_exchange, get_exchange
+    from app.core.fake_exchange import FakeExchange
+
+    fake = FakeExchange(prices={"BTCUSDT": 60000.0}, balances={"USDT": 1000.0})
+    set_exchange(fake)                                   # helpers del backend
+    app.dependency_overrides[get_exchange] = lambda: fake  # endpoints
+
+Las órdenes MARKET se llenan al precio configurado y mueven los balances.
+"""
+
+from __future__ import annotations
+
+import itertools
+import time
+from typing import Optional
+
+
+class FakeExchange:
+    def __init__(
+        self,
+        prices: Optional[dict[str, float]] = None,
+        balances: Optional[dict[str, float]] = None,
+        klines: Optional[dict[str, list]] = None,
+        step_size: str = "0.00001000",
+    ):
+        self.prices = dict(prices or {})
+        self.balances = dict(balances or {})
+        self.klines_data = dict(klines or {})
+        self.step_size = step_size
+        self.orders: list[dict] = []
+        self.open_orders: list[dict] = []
+        self.calls: list[tuple[str, tuple, dict]] = []
+        self._ids = itertools.count(1)
+
+    def _log(self, name: str, args: tuple, kwargs: dict):
+        self.calls.append((name, args, kwargs))
+
+    async def account(self, **kwargs) -> dict:
+        self._log("account", (), kwargs)
+        return {"balances": [{"asset": a, "free": str(v), "locked": "0"} for a, v in self.balances.items()]}
+
+    async def exchange_info(self, symbol: Optional[str] = None, **kwargs) -> dict:
+        self._log("exchange_info", (), {"symbol": symbol, **kwargs})
+        symbols = [symbol] if symbol else list(self.prices)
+        return {
+            "symbols": [
+                {
+                    "symbol": s,
+                    "status": "TRADING",
+                    "baseAsset": s[:-4],
+                    "quoteAsset": "USDT",
+                    "filters": [
+                        {"filterType": "PRICE_FILTER", "minPrice": "0.01", "maxPrice": "1000000", "tickSize": "0.01"},
+                        {"filterType": "LOT_SIZE", "minQty": self.step_size, "maxQty": "9000", "stepSize": self.step_size},
+                        {"filterType": "NOTIONAL", "minNotional": "5", "maxNotional": "9000000"},
+                    ],
+                }
+                for s in symbols
+            ]
+        }
+
+    async def ticker_price(self, symbol: Optional[str] = None, **kwargs):
+        self._log("ticker_price", (), {"symbol": symbol, **kwargs})
+        if symbol:
+            return {"symbol": symbol, "price": str(self.prices[symbol])}
+        return [{"symbol": s, "price": str(p)} for s, p in self.prices.items()]
+
+    async def klines(self, symbol: str, interval: str, **kwargs) -> list:
+        self._log("klines", (symbol, interval), kwargs)
+        rows = self.klines_data.get(symbol, [])
+        start, end = kwargs.get("startTime"), kwargs.get("endTime")
+        if start is not None:
+            rows = [k for k in rows if k[0] >= start]
+        if end is not None:
+            rows = [k for k in rows if k[0] <= end]
+        return rows[-int(kwargs.get("limit", 500)):]
+
+    async def new_order(self, symbol: str, side: str, type: str, **kwargs) -> dict:
+        self._log("new_order", (symbol, side, type), kwargs)
+        price = self.prices[symbol]
+        base = symbol[:-4]
+        qty = float(kwargs.get("quantity") or float(kwargs["quoteOrderQty"]) / price)
+        sign = 1 if side == "BUY" else -1
+        self.balances[base] = self.balances.get(base, 0.0) + sign * qty
+        self.balances["USDT"] = self.balances.get("USDT", 0.0) - sign * qty * price
+        order = {
+            "symbol": symbol,
+            "orderId": next(self._ids),
+            "side": side,
+            "type": type,
+            "status": "FILLED",
+            "executedQty": str(qty),
+            "cummulativeQuoteQty": str(qty * price),
+            "transactTime": int(time.time() * 1000),
+            "fills": [{"price": str(price), "qty": str(qty), "commission": "0", "commissionAsset": "USDT"}],
+        }
+        self.orders.append(order)
+        return order
+
+    async def get_order(self, symbol: str, orderId: int, **kwargs) -> dict:
+        self._log("get_order", (symbol,), {"orderId": orderId, **kwargs})
+        return next(o for o in self.orders if o["orderId"] == orderId)
+
+    async def get_open_orders(self, symbol: Optional[str] = None, **kwargs) -> list:
+        self._log("get_open_orders", (), {"symbol": symbol, **kwargs})
+        return [o for o in self.open_orders if symbol is None or o["symbol"] == symbol]
+
+    async def cancel_open_orders(self, symbol: str, **kwargs) -> list:
+        self._log("cancel_open_orders", (symbol,), kwargs)
+        cancelled = [o for o in self.open_orders if o["symbol"] == symbol]
+        self.open_orders = [o for o in self.open_orders if o["symbol"] != symbol]
+        return cancelled
+
+    def metrics(self) -> dict:
+        counts: dict[str, int] = {}
+        for name, _, _ in self.calls:
+            counts[name] = counts.get(name, 0) + 1
+        return {"limiter": None, "max_concurrency": None, "endpoints": {k: {"calls": v} for k, v in counts.items()}}
+
+    def close(self):
+        pass
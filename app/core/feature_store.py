@@ -0,0 +1,290 @@
+# app/core/feature_store.py
+"""
+Feature store de SmartTrading, junto al lago OHLCV (`candle_store`).
+
+    data/candles/BTCUSDT/1h/features/v1/2025-09.npy   # (1 + n_features, n): time, rsi, ...
+    data/candles/BTCUSDT/1h/features/v1/state.pkl     # IndicatorState tras la última vela
+
+- Una sola definición versionada (`FEATURE_VERSION` + `FEATURES`), calculada
+  con `IndicatorState`: el entrenamiento y la inferencia en vivo leen los
+  mismos valores, no dos implementaciones que pueden divergir.
+- Cada feature se calcula una vez por (símbolo, intervalo, vela). `update()`
+  retoma desde el estado guardado y sólo procesa velas nuevas del lago; si el
+  lago ganó historia hacia atrás o cambia la versión, se reconstruye.
+- `export_csv()` arma el dataset de entrenamiento (OHLCV + features);
+  `latest()` aplica las velas cerradas del caché y devuelve la última fila
+  ya calculada (búsqueda por clave para la señal en vivo); el IO de disco
+  corre en un thread, fuera del event loop.
+- Los modelos del entrenador legacy con columnas fuera de `FEATURES` se
+  sirven con `add_indicators` (ver `smart_signals.legacy_row`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import pickle
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from app.core.candle_store import OHLCV_FIELDS, _month, _to_ms, candle_store, interval_ms
+from app.core.indicator_state import IndicatorState
+
+logger = logging.getLogger(__name__)
+
+FEATURE_VERSION = 1
+FEATURES = ("rsi", "ema_short", "ema_long", "macd", "signal")
+
+
+def _empty() -> np.ndarray:
+    return np.empty((1 + len(FEATURES), 0), dtype=np.float64)
+
+
+def _row(state: IndicatorState, t: int) -> list:
+    vals = state.values()
+    return [t] + [np.nan if vals[f] is None else vals[f] for f in FEATURES]
+
+
+def compute(closes: Iterable[float], times: Iterable[int], state: Optional[IndicatorState] = None) -> tuple[np.ndarray, IndicatorState]:
+    """Features (1 + F, n) para las velas dadas, continuando `state` si viene."""
+    state = state or IndicatorState()
+    rows = []
+    for c, t in zip(closes, times):
+        state.update(float(c), open_time=int(t))
+        rows.append(_row(state, int(t)))
+    arr = np.array(rows, dtype=np.float64).T if rows else _empty()
+    return arr, state
+
+
+class FeatureStore:
+    def __init__(self, store=candle_store, version: int = FEATURE_VERSION):
+        self.store = store
+        self.version = version
+        self._states: Dict[tuple[str, str], IndicatorState] = {}
+        self._last: Dict[tuple[str, str], dict] = {}
+        self._locks: Dict[tuple[str, str], asyncio.Lock] = {}
+        self.computed_bars = 0
+        self.rebuilds = 0
+
+    # -----------------------------
+    # Particiones
+    # -----------------------------
+    def _dir(self, symbol: str, interval: str) -> Path:
+        return self.store.root / symbol.upper() / interval / "features" / f"v{self.version}"
+
+    def partitions(self, symbol: str, interval: str) -> list[Path]:
+        d = self._dir(symbol, interval)
+        return sorted(d.glob("*.npy")) if d.exists() else []
+
+    def _write(self, symbol: str, interval: str, rows: np.ndarray):
+        """Agrega filas (ya ordenadas y posteriores a lo guardado) a sus meses."""
+        months = np.array([_month(int(t)) for t in rows[0]])
+        for month in np.unique(months):
+            path = self._dir(symbol, interval) / f"{month}.npy"
+            new = rows[:, months == month]
+            old = np.load(path) if path.exists() else _empty()
+            self.store._save(path, np.concatenate([old[:, old[0] < new[0, 0]], new], axis=1))
+
+    def _state_path(self, symbol: str, interval: str) -> Path:
+        return self._dir(symbol, interval) / "state.pkl"
+
+    def _save_state(self, symbol: str, interval: str, state: IndicatorState):
+        path = self._state_path(symbol, interval)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(tmp, path)
+
+    def _load_state(self, symbol: str, interval: str) -> Optional[IndicatorState]:
+        key = (symbol, interval)
+        if key not in self._states:
+            path = self._state_path(symbol, interval)
+            if not path.exists():
+                return None
+            with open(path, "rb") as f:
+                self._states[key] = pickle.load(f)
+        return self._states[key]
+
+    def _reset(self, symbol: str, interval: str):
+        self._states.pop((symbol, interval), None)
+        self._last.pop((symbol, interval), None)
+        for p in self.partitions(symbol, interval):
+            p.unlink()
+        self._state_path(symbol, interval).unlink(missing_ok=True)
+
+    # -----------------------------
+    # Cálculo incremental
+    # -----------------------------
+    def _sync(self, symbol: str, interval: str) -> int:
+        """Calcula features de las velas del lago que todavía no tienen (bloqueante)."""
+        state = self._load_state(symbol, interval)
+        first, last = self.store.bounds(symbol, interval)
+        if first is None:
+            return 0
+        parts = self.partitions(symbol, interval)
+        stored_first = int(self.store._load(parts[0])[0, 0]) if parts else None
+        if state is not None and (state.last_time is None or stored_first is None or first < stored_first):
+            # el lago ganó historia hacia atrás: los indicadores cambian desde el inicio
+            self._reset(symbol, interval)
+            self.rebuilds += 1
+            state = None
+        start_ms = state.last_time + 1 if state is not None else None
+        if state is not None and state.last_time >= last:
+            return 0
+
+        done = 0
+        for part in self.store.iter_partitions(symbol, interval, start_ms):
+            rows, state = compute(part[4], part[0], state)
+            self._write(symbol, interval, rows)
+            done += rows.shape[1]
+        self._states[(symbol, interval)] = state
+        self._save_state(symbol, interval, state)
+        self._last.pop((symbol, interval), None)
+        self.computed_bars += done
+        return done
+
+    async def update(self, symbol: str, interval: str, start: Optional[datetime] = None) -> dict:
+        """Pone al día el lago OHLCV y las features de las velas nuevas."""
+        symbol = symbol.upper()
+        await self.store.update(symbol, interval, start)
+        async with self._locks.setdefault((symbol, interval), asyncio.Lock()):
+            added = await asyncio.to_thread(self._sync, symbol, interval)
+        if added:
+            logger.info(f"[FeatureStore] ✅ {symbol} {interval} v{self.version}: +{added} filas")
+        return {"symbol": symbol, "interval": interval, "version": self.version, "computed": added}
+
+    async def latest(self, symbol: str, interval: str, bars: list) -> Optional[dict]:
+        """
+        Aplica velas cerradas (t, o, h, l, c, v) del caché y devuelve la última fila.
+        Las velas ya vistas no se recalculan; si hay un hueco contra lo guardado
+        se completa desde Binance vía `update()`.
+        """
+        symbol = symbol.upper()
+        key = (symbol, interval)
+        if not bars:
+            return self._last.get(key)
+        state = await asyncio.to_thread(self._load_state, symbol, interval)
+        new = [b for b in bars if state is None or b[0] > state.last_time]
+        if state is None or (new and new[0][0] - state.last_time > interval_ms(interval)):
+            await self.update(symbol, interval)
+
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            # lecturas/escrituras de particiones y del estado fuera del event loop
+            return await asyncio.to_thread(self._apply, symbol, interval, bars)
+
+    def _apply(self, symbol: str, interval: str, bars: list) -> Optional[dict]:
+        """Guarda las velas nuevas y sus features; devuelve la última fila (bloqueante)."""
+        key = (symbol, interval)
+        state = self._load_state(symbol, interval)
+        new = [b for b in bars if state is None or b[0] > state.last_time]
+        if new:
+            ohlcv = np.array(new, dtype=np.float64).T
+            self.store.write(symbol, interval, ohlcv)
+            rows, state = compute(ohlcv[4], ohlcv[0], state)
+            self._write(symbol, interval, rows)
+            self._states[key] = state
+            self._save_state(symbol, interval, state)
+            self.computed_bars += rows.shape[1]
+            self._last.pop(key, None)
+        if key not in self._last:
+            self._last[key] = self._tail_row(symbol, interval)
+        return self._last[key]
+
+    def _tail_row(self, symbol: str, interval: str) -> Optional[dict]:
+        parts = self.partitions(symbol, interval)
+        if not parts:
+            return None
+        feats = np.load(parts[-1])
+        if not feats.shape[1]:
+            return None
+        t = int(feats[0, -1])
+        ohlcv = self.store.read(symbol, interval, t, t + 1)
+        if not ohlcv["time"].shape[0]:
+            return None
+        row = {name: float(ohlcv[name][0]) for name in OHLCV_FIELDS}
+        row["time"] = t
+        row.update({f: (None if np.isnan(v) else float(v)) for f, v in zip(FEATURES, feats[1:, -1])})
+        return row
+
+    # -----------------------------
+    # Lectura (entrenamiento)
+    # -----------------------------
+    def read(self, symbol: str, interval: str, start_ms: Optional[int] = None,
+             end_ms: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Columnas OHLCV + features alineadas por open time en [start_ms, end_ms)."""
+        ohlcv = self.store.read(symbol, interval, start_ms, end_ms)
+        parts = []
+        for path in self.partitions(symbol, interval):
+            if start_ms is not None and path.stem < _month(start_ms):
+                continue
+            parts.append(self.store._load(path))
+        feats = np.concatenate(parts, axis=1) if parts else _empty()
+        t = ohlcv["time"]
+        if feats.shape[1]:
+            idx = np.minimum(np.searchsorted(feats[0], t), feats.shape[1] - 1)
+            ok = feats[0][idx] == t
+        else:
+            idx, ok = np.zeros(t.shape[0], dtype=int), np.zeros(t.shape[0], dtype=bool)
+        cols = {k: v[ok] for k, v in ohlcv.items()}
+        cols.update({f: feats[i + 1][idx[ok]] for i, f in enumerate(FEATURES)})
+        return cols
+
+    async def export_csv(self, symbol: str, interval: str, outdir: str, start: Optional[datetime] = None) -> dict:
+        """
+        Dataset de entrenamiento con OHLCV + features ya calculadas (mismo dict
+        que `prepare_ohlcv_csv`). El nombre lleva versión y último cierre: si no
+        entraron velas nuevas se reutiliza el archivo.
+        """
+        import pandas as pd
+
+        try:
+            await self.update(symbol, interval, start)
+            cols = self.read(symbol, interval, _to_ms(start))
+            if not cols["time"].shape[0]:
+                return {"success": False, "error": f"Sin velas para {symbol} {interval}"}
+            last = int(cols["time"][-1])
+            outfile = os.path.join(outdir, f"{symbol.upper()}_{interval}_f{self.version}_{last}.csv")
+            if not os.path.exists(outfile):
+                os.makedirs(outdir, exist_ok=True)
+                df = pd.DataFrame({k: np.asarray(v) for k, v in cols.items() if k != "time"})
+                df.insert(0, "timestamp", pd.to_datetime(cols["time"], unit="ms"))
+                df.to_csv(outfile + ".tmp", index=False)
+                os.replace(outfile + ".tmp", outfile)
+            return {
+                "success": True,
+                "outfile": outfile,
+                "rows": int(cols["time"].shape[0]),
+                "features": list(FEATURES),
+                "feature_version": self.version,
+                "filesize": os.path.getsize(outfile),
+                "generated_at": datetime.utcfromtimestamp(os.path.getmtime(outfile)).isoformat(),
+            }
+        except Exception as e:
+            logger.error(f"[FeatureStore] ❌ Error exportando {symbol} {interval}: {e}")
+            return {"success": False, "error": str(e)}
+
+    def stats(self) -> dict:
+        series = {}
+        if self.store.root.exists():
+            for d in self.store.root.glob(f"*/*/features/v{self.version}"):
+                parts = sorted(d.glob("*.npy"))
+                state = self._load_state(d.parents[2].name, d.parents[1].name) if parts else None
+                series[f"{d.parents[2].name}:{d.parents[1].name}"] = {
+                    "partitions": len(parts),
+                    "bytes": sum(p.stat().st_size for p in parts),
+                    "last": state.last_time if state else None,
+                }
+        return {
+            "version": self.version,
+            "features": list(FEATURES),
+            "series": series,
+            "computed_bars": self.computed_bars,
+            "rebuilds": self.rebuilds,
+        }
+
+
+feature_store = FeatureStore()
@@ -0,0 +1,218 @@
+# app/core/indicator_state.py
+"""
+Indicadores incrementales (O(1) por vela) para el loop del bot y la caché de velas.
+
+Cada `IndicatorState` guarda los promedios de Wilder del RSI, las EMAs corta y
+larga y las EMAs del MACD. Se siembra una sola vez con histórico y luego se
+actualiza con cada vela cerrada. Convención igual a la librería `ta`
+(ewm adjust=False): la EMA arranca en el primer valor y el RSI usa alpha=1/n.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional
+
+
+class _Ema:
+    __slots__ = ("alpha", "period", "value", "count")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.value: Optional[float] = None
+        self.count = 0
+
+    def next(self, x: float) -> float:
+        return x if self.value is None else self.value + self.alpha * (x - self.value)
+
+    def push(self, x: float) -> float:
+        self.value = self.next(x)
+        self.count += 1
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.period
+
+
+class _WilderRsi:
+    __slots__ = ("period", "avg_gain", "avg_loss", "prev", "count")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.avg_gain: Optional[float] = None
+        self.avg_loss: Optional[float] = None
+        self.prev: Optional[float] = None
+        self.count = 0
+
+    def _step(self, x: float):
+        if self.prev is None:
+            return None, None
+        diff = x - self.prev
+        gain, loss = max(diff, 0.0), max(-diff, 0.0)
+        if self.avg_gain is None:
+            return gain, loss
+        a = 1.0 / self.period
+        return self.avg_gain + a * (gain - self.avg_gain), self.avg_loss + a * (loss - self.avg_loss)
+
+    @staticmethod
+    def _value(avg_gain: Optional[float], avg_loss: Optional[float]) -> Optional[float]:
+        if avg_gain is None:
+            return None
+        if avg_loss == 0:
+            return 100.0 if avg_gain > 0 else 50.0
+        return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+    def next(self, x: float) -> Optional[float]:
+        if self.count + 1 <= self.period:
+            return None
+        return self._value(*self._step(x))
+
+    def push(self, x: float) -> Optional[float]:
+        g, l = self._step(x)
+        if g is not None:
+            self.avg_gain, self.avg_loss = g, l
+        self.prev = x
+        self.count += 1
+        return self._value(self.avg_gain, self.avg_loss) if self.count > self.period else None
+
+
+class IndicatorState:
+    """Estado incremental de RSI, EMA corta/larga y MACD para un (symbol, interval)."""
+
+    def __init__(
+        self,
+        rsi_period: int = 14,
+        ema_short: int = 12,
+        ema_long: int = 26,
+        macd_fast: int = 12,
+        macd_slow: int = 26,
+        macd_signal: int = 9,
+    ):
+        self.rsi = _WilderRsi(rsi_period)
+        self.ema_short = _Ema(ema_short)
+        self.ema_long = _Ema(ema_long)
+        self.macd_fast = _Ema(macd_fast)
+        self.macd_slow = _Ema(macd_slow)
+        self.macd_signal = _Ema(macd_signal)
+        self.periods = {
+            "rsi_period": rsi_period, "ema_short": ema_short, "ema_long": ema_long,
+            "macd_fast": macd_fast, "macd_slow": macd_slow, "macd_signal": macd_signal,
+        }
+        self.last_close: Optional[float] = None
+        self.last_time: Optional[int] = None   # open_time (ms) de la última vela cerrada aplicada
+        self.bars = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.bars > 0
+
+    def seed(self, closes: Iterable[float], last_time: Optional[int] = None) -> "IndicatorState":
+        for c in closes:
+            self.update(c)
+        self.last_time = last_time
+        return self
+
+    def update(self, close: float, open_time: Optional[int] = None) -> dict:
+        """Aplica una vela cerrada. Las velas ya vistas (por open_time) se ignoran."""
+        if open_time is not None and self.last_time is not None and open_time <= self.last_time:
+            return self.values()
+        close = float(close)
+        self.rsi.push(close)
+        self.ema_short.push(close)
+        self.ema_long.push(close)
+        fast, slow = self.macd_fast.push(close), self.macd_slow.push(close)
+        self.macd_signal.push(fast - slow)
+        self.last_close = close
+        if open_time is not None:
+            self.last_time = open_time
+        self.bars += 1
+        return self.values()
+
+    def values(self) -> dict:
+        """Últimos valores sobre velas cerradas (mismas claves que `add_indicators`)."""
+        return self._pack(
+            self.last_close,
+            self.rsi._value(self.rsi.avg_gain, self.rsi.avg_loss) if self.rsi.count > self.rsi.period else None,
+            self.ema_short.value if self.ema_short.ready else None,
+            self.ema_long.value if self.ema_long.ready else None,
+            self.macd_fast.value - self.macd_slow.value if self.macd_slow.ready else None,
+            self.macd_signal.value if self.macd_slow.ready and self.macd_signal.ready else None,
+        )
+
+    def peek(self, close: float) -> dict:
+        """Valores si la vela en formación cerrara en `close`, sin modificar el estado."""
+        close = float(close)
+        macd_val = self.macd_fast.next(close) - self.macd_slow.next(close)
+        n = self.bars + 1
+        return self._pack(
+            close,
+            self.rsi.next(close),
+            self.ema_short.next(close) if n >= self.ema_short.period else None,
+            self.ema_long.next(close) if n >= self.ema_long.period else None,
+            macd_val if n >= self.macd_slow.period else None,
+            self.macd_signal.next(macd_val) if n >= self.macd_slow.period and n >= self.macd_signal.period else None,
+        )
+
+    @staticmethod
+    def _pack(close, rsi, ema_short, ema_long, macd, signal) -> dict:
+        return {
+            "close": close,
+            "rsi": rsi,
+            "ema_short": ema_short,
+            "ema_long": ema_long,
+            "macd": macd,
+            "signal": signal,
+        }
+
+
+DEFAULT_PERIODS = IndicatorState().periods
+
+# Claves de `TradingConfig.params` (las mismas que barre el optimizador) → períodos
+PARAM_PERIODS = {
+    "rsiPeriod": "rsi_period",
+    "emaShort": "ema_short",
+    "emaLong": "ema_long",
+    "macdFast": "macd_fast",
+    "macdSlow": "macd_slow",
+    "macdSignal": "macd_signal",
+}
+
+
+def periods_from_params(params: Optional[dict]) -> dict:
+    """Períodos definidos en `TradingConfig.params` (se guardan como texto)."""
+    params = params or {}
+    return {arg: int(float(params[key])) for key, arg in PARAM_PERIODS.items() if params.get(key) not in (None, "")}
+
+
+class IndicatorRegistry:
+    """Estados por (symbol, interval) del loop del bot."""
+
+    def __init__(self, **periods):
+        self.periods = periods
+        self._states: Dict[tuple[str, str], IndicatorState] = {}
+
+    def get(self, symbol: str, interval: str, periods: Optional[dict] = None) -> IndicatorState:
+        """
+        Estado del par. Con `periods` (p. ej. de `periods_from_params`), si el
+        estado existente usa otros períodos se reemplaza por uno vacío que hay
+        que volver a sembrar.
+        """
+        key = (symbol.upper(), interval)
+        wanted = {**DEFAULT_PERIODS, **self.periods, **(periods or {})}
+        st = self._states.get(key)
+        if st is None or (periods is not None and st.periods != wanted):
+            st = self._states[key] = IndicatorState(**wanted)
+        return st
+
+    def find(self, symbol: str, interval: str) -> Optional[IndicatorState]:
+        st = self._states.get((symbol.upper(), interval))
+        return st if st and st.ready else None
+
+    def drop(self, symbol: str, interval: Optional[str] = None):
+        for key in [k for k in self._states if k[0] == symbol.upper() and (interval is None or k[1] == interval)]:
+            del self._states[key]
+
+
+# Registro compartido
+indicator_states = IndicatorRegistry()
@@ -0,0 +1,154 @@
+# app/core/kline_stream.py
+"""
+Fuentes de velas en tiempo real para el bot.
+
+- `BinanceKlineStream`: stream combinado `<symbol>@kline_<interval>` de Binance
+  con reconexión automática.
+- `ReplayKlineStream`: reproduce mensajes grabados (JSONL) para pruebas locales;
+  `client()` sirve por `klines()` las velas cerradas ya reproducidas, así la
+  siembra y las resincronizaciones salen de la grabación y no de Binance.
+
+Ambas producen `KlineEvent` con la misma forma, así el loop del bot no sabe
+de dónde vienen.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Optional
+
+import websockets
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+WS_URL_MAINNET = "wss://stream.binance.com:9443/stream"
+WS_URL_TESTNET = "wss://stream.testnet.binance.vision/stream"
+
+
+@dataclass
+class KlineEvent:
+    symbol: str
+    interval: str
+    open_time: int
+    close_time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    closed: bool
+    event_time: Optional[int] = None   # "E" del mensaje (ms)
+
+
+def parse_kline_message(msg: dict) -> Optional[KlineEvent]:
+    """Convierte un mensaje WS de Binance (combinado o directo) en KlineEvent."""
+    data = msg.get("data", msg)
+    if data.get("e") != "kline":
+        return None
+    k = data["k"]
+    return KlineEvent(
+        symbol=k["s"],
+        interval=k["i"],
+        open_time=int(k["t"]),
+        close_time=int(k["T"]),
+        open=float(k["o"]),
+        high=float(k["h"]),
+        low=float(k["l"]),
+        close=float(k["c"]),
+        volume=float(k["v"]),
+        closed=bool(k["x"]),
+        event_time=int(data["E"]) if "E" in data else None,
+    )
+
+
+class BinanceKlineStream:
+    """Suscripción a velas de varios pares en una sola conexión."""
+
+    def __init__(self, pairs: Iterable[str], interval: str = "1m", url: Optional[str] = None):
+        self.pairs = [p.lower() for p in pairs]
+        self.interval = interval
+        self.url = url or (WS_URL_TESTNET if settings.BINANCE_TESTNET else WS_URL_MAINNET)
+
+    @property
+    def stream_url(self) -> str:
+        streams = "/".join(f"{p}@kline_{self.interval}" for p in self.pairs)
+        return f"{self.url}?streams={streams}"
+
+    async def __aiter__(self) -> AsyncIterator[KlineEvent]:
+        backoff = 1
+        while True:
+            try:
+                async with websockets.connect(self.stream_url, ping_interval=20) as ws:
+                    logger.info(f"[KlineStream] 🔗 Conectado ({len(self.pairs)} pares, {self.interval})")
+                    backoff = 1
+                    async for raw in ws:
+                        ev = parse_kline_message(json.loads(raw))
+                        if ev:
+                            yield ev
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[KlineStream] ⚠️ Conexión perdida: {e}. Reintentando en {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+
+class ReplayKlineStream:
+    """
+    Reproduce mensajes kline grabados (una línea JSON por mensaje, mismo formato
+    que el stream de Binance). `speed=0` entrega todo sin pausas.
+    """
+
+    def __init__(self, source: str | Path | Iterable[dict], speed: float = 0.0):
+        self.source = source
+        self.speed = speed
+        self.history: dict[tuple[str, str], list] = {}   # velas cerradas ya entregadas
+
+    def client(self) -> "ReplayKlineClient":
+        return ReplayKlineClient(self)
+
+    def _messages(self) -> Iterable[dict]:
+        if isinstance(self.source, (str, Path)):
+            with open(self.source, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            yield from self.source
+
+    async def __aiter__(self) -> AsyncIterator[KlineEvent]:
+        for msg in self._messages():
+            ev = parse_kline_message(msg)
+            if ev is None:
+                continue
+            if self.speed:
+                await asyncio.sleep(self.speed)
+            else:
+                await asyncio.sleep(0)
+            if ev.closed:
+                self.history.setdefault((ev.symbol, ev.interval), []).append(
+                    [ev.open_time, ev.open, ev.high, ev.low, ev.close, ev.volume, ev.close_time]
+                )
+            yield ev
+
+
+class ReplayKlineClient:
+    """`klines()` al estilo REST sobre lo ya reproducido: nunca ve velas futuras ni a Binance."""
+
+    def __init__(self, stream: ReplayKlineStream):
+        self.stream = stream
+
+    def klines(self, symbol: str, interval: str, startTime: Optional[int] = None,
+               endTime: Optional[int] = None, limit: int = 500) -> list:
+        rows = self.stream.history.get((symbol.upper(), interval), [])
+        if startTime is not None:
+            rows = [k for k in rows if k[0] >= startTime]
+        if endTime is not None:
+            rows = [k for k in rows if k[0] <= endTime]
+        return rows[-int(limit):]
@@ -0,0 +1,180 @@
+# app/core/liquidation.py
+"""
+Liquidación concurrente (stop-all).
+
+Las posiciones se agrupan por símbolo (neto de BUY/SELL) y cada símbolo se
+liquida en su propia tarea: cancelar órdenes abiertas → MARKET inversa con
+respuesta FULL. Todas las tareas corren en paralelo; el límite lo pone el
+cliente compartido (concurrencia + peso). El fill se confirma con la
+respuesta de la orden o, si no llegó terminal, con el evento del user-data
+stream (`resolve_fill`) o una consulta `get_order` al vencer el timeout.
+Un símbolo cuyo neto es cero no manda orden: queda FILLED con cantidad 0 y
+sus posiciones se cierran igual.
+Nada de sleeps fijos ni un `account()` por posición.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, Optional
+
+from app.core.symbol_index import symbol_index
+
+logger = logging.getLogger(__name__)
+
+FILL_TIMEOUT_SEC = 5.0
+NET_ZERO_EPS = 1e-9
+TERMINAL = {"FILLED", "CANCELED", "REJECTED", "EXPIRED", "EXPIRED_IN_MATCH"}
+
+
+# =============================
+# Confirmaciones de fill (user-data stream)
+# =============================
+_pending_fills: Dict[int, asyncio.Future] = {}
+
+
+def expect_fill(order_id: int) -> asyncio.Future:
+    fut = _pending_fills.get(order_id)
+    if fut is None:
+        fut = _pending_fills[order_id] = asyncio.get_running_loop().create_future()
+    return fut
+
+
+def resolve_fill(order_id: int, order: dict) -> bool:
+    """Entrega un executionReport/orden terminal a quien espera ese orderId."""
+    fut = _pending_fills.get(order_id)
+    if fut is None or fut.done() or order.get("status") not in TERMINAL:
+        return False
+    fut.set_result(order)
+    return True
+
+
+# =============================
+# Resultado por símbolo
+# =============================
+@dataclass
+class SymbolLiquidation:
+    symbol: str
+    side: str
+    qty_requested: float
+    position_ids: list = field(default_factory=list)
+    qty_sent: float = 0.0
+    qty_filled: float = 0.0
+    avg_price: Optional[float] = None
+    fees: float = 0.0
+    order_id: Optional[int] = None
+    status: str = "PENDING"        # FILLED | PARTIAL | SKIPPED | ERROR
+    error: Optional[str] = None
+    time_to_flat_ms: Optional[float] = None
+
+    @property
+    def flat(self) -> bool:
+        return self.status == "FILLED"
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _fill_summary(order: dict) -> tuple[float, Optional[float], float]:
+    """(cantidad ejecutada, precio medio, fees en quote) desde la respuesta FULL o un executionReport."""
+    qty = float(order.get("executedQty") or order.get("z") or 0.0)
+    quote = float(order.get("cummulativeQuoteQty") or order.get("Z") or 0.0)
+    fees = 0.0
+    for f in order.get("fills") or []:
+        # Comisión en otro activo (base/BNB): aproximada al precio del fill
+        commission = float(f.get("commission", 0.0))
+        fees += commission if f.get("commissionAsset") == "USDT" else commission * float(f.get("price", 0.0))
+    return qty, (quote / qty if qty > 0 else None), fees
+
+
+async def _confirm(c, symbol: str, order: dict, timeout: float) -> dict:
+    if order.get("status") in TERMINAL:
+        return order
+    order_id = order.get("orderId")
+    fut = expect_fill(order_id)
+    try:
+        return await asyncio.wait_for(asyncio.shield(fut), timeout)
+    except asyncio.TimeoutError:
+        return await c.get_order(symbol=symbol, orderId=order_id)
+    finally:
+        _pending_fills.pop(order_id, None)
+
+
+async def _cancel_open_orders(c, symbol: str):
+    try:
+        await c.cancel_open_orders(symbol)
+    except Exception as e:
+        if "-2011" in str(e) or "Unknown order" in str(e):
+            return  # no había órdenes abiertas
+        logger.error(f"[Liquidation] ⚠️ Error cancelando órdenes en {symbol}: {e}")
+
+
+async def liquidate_symbol(c, job: SymbolLiquidation, t0: float, timeout: float = FILL_TIMEOUT_SEC) -> SymbolLiquidation:
+    try:
+        await _cancel_open_orders(c, job.symbol)
+        if job.status == "FILLED":
+            return job  # neto cero: nada que enviar
+
+        if job.symbol in symbol_index:
+            job.qty_sent = symbol_index.round_qty(job.symbol, job.qty_requested)
+        else:
+            job.qty_sent = round(job.qty_requested, 6)
+        if job.qty_sent <= 0:
+            job.status = "SKIPPED"
+            job.error = f"cantidad ajustada inválida ({job.qty_sent})"
+            return job
+
+        order = await c.new_order(
+            symbol=job.symbol, side=job.side, type="MARKET",
+            quantity=job.qty_sent, newOrderRespType="FULL",
+        )
+        job.order_id = order.get("orderId")
+        order = await _confirm(c, job.symbol, order, timeout)
+
+        job.qty_filled, job.avg_price, job.fees = _fill_summary(order)
+        job.status = "FILLED" if order.get("status") == "FILLED" else "PARTIAL"
+    except Exception as e:
+        job.status = "ERROR"
+        job.error = str(e)
+        logger.error(f"[Liquidation] ❌ Error liquidando {job.symbol}: {e}")
+    finally:
+        job.time_to_flat_ms = round((time.perf_counter() - t0) * 1000, 1)
+    return job
+
+
+def group_positions(positions: Iterable) -> list[SymbolLiquidation]:
+    """Una tarea por símbolo con la cantidad neta a cerrar (BUY suma, SELL resta)."""
+    net: Dict[str, float] = {}
+    ids: Dict[str, list] = {}
+    for p in positions:
+        qty = float(p.qty or 0.0)
+        if qty <= 0:
+            continue
+        symbol = p.symbol.upper()
+        net[symbol] = net.get(symbol, 0.0) + (qty if p.side == "BUY" else -qty)
+        ids.setdefault(symbol, []).append(p.id)
+    jobs = []
+    for s, q in net.items():
+        job = SymbolLiquidation(symbol=s, side="SELL" if q > 0 else "BUY", qty_requested=abs(q), position_ids=ids[s])
+        if abs(q) <= NET_ZERO_EPS:
+            # BUY y SELL se compensan: no hay orden, pero las posiciones se cierran
+            job.qty_requested = 0.0
+            job.status = "FILLED"
+        jobs.append(job)
+    return jobs
+
+
+async def liquidate(c, positions: Iterable, timeout: float = FILL_TIMEOUT_SEC) -> list[SymbolLiquidation]:
+    await symbol_index.ensure()
+    jobs = group_positions(positions)
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(liquidate_symbol(c, j, t0, timeout) for j in jobs))
+    for r in results:
+        logger.info(
+            f"[Liquidation] {'✅' if r.flat else '⚠️'} {r.symbol} {r.status} "
+            f"qty={r.qty_filled}/{r.qty_sent} flat en {r.time_to_flat_ms} ms"
+        )
+    return list(results)
@@ -0,0 +1,193 @@
+# app/core/model_registry.py
+"""
+Registro de modelos SmartTrading en caliente, por (símbolo, estrategia).
+
+- `activate(symbol, manifest, strategy)`: carga manifest + booster en un hilo
+  (`load_manifest` / `load_xgb_model`) y recién entonces reemplaza la versión
+  activa de un solo golpe; mientras tanto las señales siguen con la anterior.
+- Cargas concurrentes del mismo manifest se comparten; los boosters cargados
+  quedan en un LRU acotado (`MODEL_REGISTRY_SIZE`) para re-activar sin leer
+  disco. Las versiones activas nunca se desalojan.
+- `on_retrained(pair, manifest)`: al terminar un retrain, si el par tenía
+  modelo activo se hace hot-swap a la nueva versión; si no, se precarga.
+- `get(symbol)` no hace IO: es lo único que toca el camino de la señal.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_REGISTRY_SIZE = int(os.getenv("MODEL_REGISTRY_SIZE", "16"))
+DEFAULT_STRATEGY = "best_balanced"
+STRATEGIES = ("best_balanced", "best_by_accuracy", "best_by_profit")
+
+
+@dataclass
+class ModelVersion:
+    symbol: str
+    strategy: str
+    version: int
+    manifest_path: str
+    booster: object
+    features: list
+    dsl: dict
+    loaded_at: datetime
+    load_ms: float
+    latencies: deque = field(default_factory=lambda: deque(maxlen=500))
+    requests: int = 0
+
+    def record(self, ms: float):
+        self.requests += 1
+        self.latencies.append(ms)
+
+    def as_dict(self) -> dict:
+        lat = sorted(self.latencies)
+        return {
+            "symbol": self.symbol,
+            "strategy": self.strategy,
+            "version": self.version,
+            "manifest": self.manifest_path,
+            "features": len(self.features),
+            "loaded_at": self.loaded_at.isoformat(),
+            "load_ms": self.load_ms,
+            "requests": self.requests,
+            "p50_ms": round(lat[len(lat) // 2], 2) if lat else None,
+            "p95_ms": round(lat[min(int(len(lat) * 0.95), len(lat) - 1)], 2) if lat else None,
+        }
+
+
+def _load(manifest_path: str, strategy: str) -> tuple[object, list, dict]:
+    """Lee el manifest y el booster de la estrategia elegida (bloqueante)."""
+    from app.core.smart_trading_api import load_manifest, load_xgb_model
+
+    manifest = load_manifest(manifest_path)
+    entry = manifest.get(strategy) or {}
+    if not entry:
+        raise ValueError(f"El manifest {manifest_path} no tiene la estrategia {strategy}")
+    model_path = entry.get("model_path") or entry.get("model") or manifest.get("model_path")
+    if not model_path:
+        raise ValueError(f"Estrategia {strategy} sin modelo en {manifest_path}")
+    if not os.path.isabs(model_path):
+        model_path = str(Path(manifest_path).parent / model_path)
+    features = entry.get("features") or manifest.get("features") or []
+    dsl = entry.get("dsl") or entry
+    return load_xgb_model(model_path), list(features), dsl
+
+
+class ModelRegistry:
+    def __init__(self, size: int = MODEL_REGISTRY_SIZE):
+        self.size = size
+        self._active: Dict[tuple[str, str], ModelVersion] = {}
+        self._default: Dict[str, str] = {}                     # symbol -> estrategia por defecto
+        self._warm: "OrderedDict[tuple[str, str], tuple]" = OrderedDict()   # (manifest, strategy) -> (booster, features, dsl, load_ms)
+        self._loading: Dict[tuple[str, str], asyncio.Future] = {}
+        self._versions: Dict[tuple[str, str], int] = {}
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    # -----------------------------
+    # Carga
+    # -----------------------------
+    async def _warm_load(self, manifest_path: str, strategy: str) -> tuple:
+        key = (manifest_path, strategy)
+        if key in self._warm:
+            self._warm.move_to_end(key)
+            self.hits += 1
+            return self._warm[key]
+        if key in self._loading:
+            return await asyncio.shield(self._loading[key])
+
+        fut = asyncio.get_running_loop().create_future()
+        self._loading[key] = fut
+        try:
+            t0 = time.perf_counter()
+            booster, features, dsl = await asyncio.to_thread(_load, manifest_path, strategy)
+            entry = (booster, features, dsl, round((time.perf_counter() - t0) * 1000, 1))
+            self.loads += 1
+            self._warm[key] = entry
+            self._evict()
+            fut.set_result(entry)
+            return entry
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()   # recuperada: sólo la esperan los que comparten la carga
+            raise
+        finally:
+            self._loading.pop(key, None)
+
+    def _evict(self):
+        pinned = {(v.manifest_path, v.strategy) for v in self._active.values()}
+        for key in list(self._warm):
+            if len(self._warm) <= self.size:
+                break
+            if key not in pinned:
+                del self._warm[key]
+                self.evictions += 1
+
+    async def preload(self, manifest_path: str, strategy: str = DEFAULT_STRATEGY):
+        await self._warm_load(manifest_path, strategy)
+
+    async def activate(self, symbol: str, manifest_path: str, strategy: Optional[str] = None) -> ModelVersion:
+        """Carga (o reusa del LRU) y reemplaza atómicamente la versión activa."""
+        symbol = symbol.upper()
+        strategy = strategy or DEFAULT_STRATEGY
+        booster, features, dsl, load_ms = await self._warm_load(manifest_path, strategy)
+        key = (symbol, strategy)
+        self._versions[key] = self._versions.get(key, 0) + 1
+        mv = ModelVersion(
+            symbol=symbol, strategy=strategy, version=self._versions[key], manifest_path=manifest_path,
+            booster=booster, features=features, dsl=dsl, loaded_at=datetime.utcnow(), load_ms=load_ms,
+        )
+        self._active[key] = mv          # swap: la próxima señal ya usa esta versión
+        self._default[symbol] = strategy
+        self._evict()
+        logger.info(f"[ModelRegistry] 🔁 {symbol}/{strategy} v{mv.version} ← {manifest_path} ({load_ms} ms)")
+        return mv
+
+    async def on_retrained(self, pair: str, manifest_path: str):
+        pair = pair.upper()
+        strategies = [s for (sym, s) in self._active if sym == pair]
+        try:
+            if strategies:
+                for strategy in strategies:
+                    await self.activate(pair, manifest_path, strategy)
+            else:
+                await self.preload(manifest_path)
+        except Exception as e:
+            logger.error(f"[ModelRegistry] ⚠️ No se pudo cargar el retrain de {pair}: {e}")
+
+    # -----------------------------
+    # Lectura
+    # -----------------------------
+    def get(self, symbol: str, strategy: Optional[str] = None) -> Optional[ModelVersion]:
+        symbol = symbol.upper()
+        strategy = strategy or self._default.get(symbol)
+        return self._active.get((symbol, strategy)) if strategy else None
+
+    def symbols(self) -> list[str]:
+        return sorted(self._default)
+
+    def stats(self) -> dict:
+        return {
+            "active": [mv.as_dict() for mv in self._active.values()],
+            "warm": len(self._warm),
+            "size": self.size,
+            "loading": len(self._loading),
+            "loads": self.loads,
+            "hits": self.hits,
+            "evictions": self.evictions,
+        }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,234 @@
+# app/core/optimizer.py
+"""
+Barrido de parámetros (RSI / EMA / MACD) sobre el backtest vectorizado.
+
+- Espacios de búsqueda: grid, random o bayes (proceso gaussiano de sklearn
+  con expected improvement sobre candidatos aleatorios).
+- Las evaluaciones corren en un ProcessPoolExecutor; el OHLCV se publica una
+  sola vez en memoria compartida y cada worker lo mapea como sólo lectura.
+- El OHLCV sale del lago local (`candle_store.load`): sólo se descargan las
+  velas que falten.
+- Un solo criterio: `score` = profit − dd_penalty·drawdown. Es el objetivo
+  del modo bayes y el orden final de los resultados; el ganador se puede
+  escribir directo en `TradingConfig.params`. El bot arma los indicadores
+  de cada par con esos períodos (`periods_from_params`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from app.core.backtest import RiskLimits, run_backtest
+from app.core.candle_store import OHLCV_FIELDS
+from app.core.models import TradingConfig
+
+logger = logging.getLogger(__name__)
+
+
+# =============================
+# Espacio de búsqueda
+# =============================
+@dataclass
+class SearchSpace:
+    """
+    mode="grid":   params = {"rsiOversold": [25, 30], ...}
+    mode="random": params = {"rsiOversold": [20, 35], ...}  (rango; int si ambos extremos son int)
+    mode="bayes":  igual que random, con `n_iter` evaluaciones en lotes de `batch_size`
+    """
+    params: dict
+    mode: str = "grid"
+    n_iter: int = 50
+    batch_size: int = 8
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    @property
+    def total(self) -> int:
+        if self.mode == "grid":
+            return int(np.prod([len(v) for v in self.params.values()])) if self.params else 0
+        return self.n_iter
+
+    def _sample(self) -> dict:
+        out = {}
+        for k, (lo, hi) in self.params.items():
+            out[k] = self._rng.randint(lo, hi) if isinstance(lo, int) and isinstance(hi, int) else self._rng.uniform(lo, hi)
+        return out
+
+    def _vector(self, p: dict) -> list[float]:
+        return [(float(p[k]) - lo) / ((hi - lo) or 1) for k, (lo, hi) in self.params.items()]
+
+    def next_batch(self, done: list[dict]) -> list[dict]:
+        """Siguiente lote de candidatos dado lo ya evaluado ([] cuando se agotó)."""
+        remaining = self.total - len(done)
+        if remaining <= 0:
+            return []
+        if self.mode == "grid":
+            keys = list(self.params)
+            return [dict(zip(keys, values)) for values in itertools.product(*self.params.values())]
+        if self.mode == "random":
+            return [self._sample() for _ in range(remaining)]
+        # bayes
+        n = min(self.batch_size, remaining)
+        if len(done) < max(self.batch_size, 2):
+            return [self._sample() for _ in range(n)]
+        return self._suggest(done, n)
+
+    def _suggest(self, done: list[dict], n: int) -> list[dict]:
+        from scipy.stats import norm
+        from sklearn.gaussian_process import GaussianProcessRegressor
+        from sklearn.gaussian_process.kernels import Matern
+
+        X = np.array([self._vector(r["params"]) for r in done])
+        y = np.array([r["score"] for r in done])
+        gp = GaussianProcessRegressor(kernel=Matern(nu=2.5), normalize_y=True, alpha=1e-6)
+        gp.fit(X, y)
+
+        pool = [self._sample() for _ in range(max(256, n * 32))]
+        mu, sigma = gp.predict(np.array([self._vector(p) for p in pool]), return_std=True)
+        sigma = np.maximum(sigma, 1e-9)
+        z = (mu - y.max()) / sigma
+        ei = (mu - y.max()) * norm.cdf(z) + sigma * norm.pdf(z)
+        return [pool[i] for i in np.argsort(-ei)[:n]]
+
+
+# =============================
+# Workers (memoria compartida)
+# =============================
+_worker: dict = {}
+
+
+def _init_worker(shm_name: str, shape: tuple, method: str, risk: RiskLimits, base_params: dict, dd_penalty: float):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    data.flags.writeable = False
+    _worker.update(
+        shm=shm,
+        ohlcv={name: data[i] for i, name in enumerate(OHLCV_FIELDS)},
+        method=method,
+        risk=risk,
+        base_params=base_params,
+        dd_penalty=dd_penalty,
+    )
+
+
+def _evaluate(params: dict) -> dict:
+    merged = {**_worker["base_params"], **params}
+    res = run_backtest(_worker["ohlcv"], _worker["method"], merged, _worker["risk"])
+    st = res.stats
+    return {
+        "params": params,
+        "stats": st,
+        "score": st["profit_pct"] - _worker["dd_penalty"] * st["max_drawdown_pct"],
+    }
+
+
+def _rank_key(r: dict):
+    # mismo objetivo que optimiza el modo bayes; desempate por drawdown
+    return (-r["score"], r["stats"]["max_drawdown_pct"])
+
+
+def rank_results(results: list[dict]) -> list[dict]:
+    """Score desc (profit − dd_penalty·drawdown), drawdown asc."""
+    return sorted(results, key=_rank_key)
+
+
+@dataclass
+class SweepJob:
+    symbol: str
+    method: str
+    ohlcv: dict
+    space: SearchSpace
+    base_params: dict = field(default_factory=dict)
+    risk: Optional[RiskLimits] = None
+    workers: int = max(1, (os.cpu_count() or 2) - 1)
+    dd_penalty: float = 0.5
+
+    def _publish(self) -> tuple[shared_memory.SharedMemory, tuple]:
+        data = np.vstack([np.asarray(self.ohlcv[f], dtype=np.float64) for f in OHLCV_FIELDS])
+        if not data.size:
+            raise ValueError(f"Sin datos OHLCV para {self.symbol}")
+        shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+        np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)[:] = data
+        return shm, data.shape
+
+    def _pool(self, shm, shape) -> ProcessPoolExecutor:
+        risk = self.risk or RiskLimits.from_config(self.symbol)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(shm.name, shape, self.method, risk, self.base_params, self.dd_penalty),
+        )
+
+    def run(self, progress: Optional[Callable[[int, int, dict], None]] = None) -> list[dict]:
+        """Ejecución bloqueante (CLI)."""
+        shm, shape = self._publish()
+        results: list[dict] = []
+        best: Optional[dict] = None
+        try:
+            with self._pool(shm, shape) as pool:
+                while batch := self.space.next_batch(results):
+                    for fut in as_completed([pool.submit(_evaluate, p) for p in batch]):
+                        r = fut.result()
+                        results.append(r)
+                        best = r if best is None or _rank_key(r) < _rank_key(best) else best
+                        if progress:
+                            progress(len(results), self.space.total, best)
+        finally:
+            shm.close()
+            shm.unlink()
+        return rank_results(results)
+
+    async def run_async(self, progress: Optional[Callable[[int, int, dict], Awaitable[None]]] = None) -> list[dict]:
+        """
+        Misma ejecución sin bloquear el event loop (endpoint WS). Si la tarea se
+        cancela (cliente desconectado) las evaluaciones pendientes se descartan
+        y el cierre del pool espera sólo a las que están corriendo, en un thread.
+        """
+        shm, shape = self._publish()
+        results: list[dict] = []
+        best: Optional[dict] = None
+        pool = self._pool(shm, shape)
+        try:
+            while batch := self.space.next_batch(results):
+                futures = [asyncio.wrap_future(pool.submit(_evaluate, p)) for p in batch]
+                for fut in asyncio.as_completed(futures):
+                    r = await fut
+                    results.append(r)
+                    best = r if best is None or _rank_key(r) < _rank_key(best) else best
+                    if progress:
+                        await progress(len(results), self.space.total, best)
+        finally:
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+            shm.close()
+            shm.unlink()
+        return rank_results(results)
+
+
+# =============================
+# Persistencia del ganador
+# =============================
+async def apply_best(session, symbol: str, method: str, params: dict) -> dict:
+    """Escribe los parámetros ganadores en TradingConfig (crea la fila si no existe)."""
+    result = await session.execute(select(TradingConfig).where(TradingConfig.symbol == symbol))
+    cfg = result.scalars().first()
+    if not cfg:
+        cfg = TradingConfig(symbol=symbol, method=method, params={})
+        session.add(cfg)
+    cfg.method = method
+    cfg.params = {**(cfg.params or {}), **{k: str(v) for k, v in params.items()}}
+    await session.commit()
+    logger.info(f"[Optimizer] ✅ Parámetros aplicados a {symbol} ({method}): {params}")
+    return {"symbol": symbol, "method": method, "params": cfg.params}
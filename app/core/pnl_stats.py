@@ -0,0 +1,282 @@
+# app/core/pnl_stats.py
+"""
+Agregados materializados de PnL / winrate por símbolo (y global, símbolo "*").
+
+- `symbol_stats`: acumulados históricos (wins, losses, cerradas, PnL realizado, fees).
+- `symbol_stats_buckets`: los mismos contadores por ventana de tiempo
+  (buckets de 5m con retención corta para 1h/24h y de 1h para 30d o más).
+
+Se actualizan en la misma transacción en la que una `Position` pasa a CLOSED,
+desde un hook `before_flush` de SQLAlchemy: cubre `close_position_market`,
+`close_all_open_positions`, las sincronizaciones y cualquier otro camino que
+cierre posiciones. Los incrementos son UPSERT atómicos (`x = x + excluded.x`)
+para no perder updates entre el bot y la API. `rebuild_stats()` reconstruye
+todo desde el histórico; `backfill_if_empty()` lo hace solo en el primer
+arranque del backend tras la migración.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, delete, event, func, select
+from sqlalchemy.orm import Session, attributes
+
+from app.core.db import Base
+from app.core.models import Position, Trade
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = "*"
+BUCKET_5M_RETENTION = timedelta(days=2)
+WINDOWS = {
+    "1h": ("5m", timedelta(hours=1)),
+    "24h": ("5m", timedelta(hours=24)),
+    "30d": ("1h", timedelta(days=30)),
+}
+
+
+class SymbolStats(Base):
+    __tablename__ = "symbol_stats"
+
+    symbol = Column(String(20), primary_key=True)
+    wins = Column(Integer, nullable=False, default=0)
+    losses = Column(Integer, nullable=False, default=0)
+    closed = Column(Integer, nullable=False, default=0)
+    realized_pnl = Column(Float, nullable=False, default=0.0)
+    fees = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class SymbolStatsBucket(Base):
+    __tablename__ = "symbol_stats_buckets"
+    __table_args__ = (Index("ix_symbol_stats_buckets_res_start", "res", "bucket_start"),)
+
+    symbol = Column(String(20), primary_key=True)
+    res = Column(String(4), primary_key=True)          # "5m" | "1h"
+    bucket_start = Column(DateTime, primary_key=True)
+    wins = Column(Integer, nullable=False, default=0)
+    losses = Column(Integer, nullable=False, default=0)
+    closed = Column(Integer, nullable=False, default=0)
+    realized_pnl = Column(Float, nullable=False, default=0.0)
+    fees = Column(Float, nullable=False, default=0.0)
+
+
+_COUNTERS = ("wins", "losses", "closed", "realized_pnl", "fees")
+
+
+def bucket_start(ts: datetime, res: str) -> datetime:
+    if res == "5m":
+        return ts.replace(minute=ts.minute - ts.minute % 5, second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+# =============================
+# Upsert atómico
+# =============================
+def _insert(session: Session, table):
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def _increment(session: Session, table, keys: dict, delta: dict, extra: Optional[dict] = None):
+    stmt = _insert(session, table).values(**keys, **delta, **(extra or {}))
+    set_ = {k: getattr(table.c, k) + stmt.excluded[k] for k in delta}
+    set_.update({k: stmt.excluded[k] for k in (extra or {})})
+    session.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_))
+
+
+def apply_close(session: Session, symbol: str, closed_at: datetime, pnl: float, fees: float, win: bool):
+    """Suma una posición cerrada a los agregados del símbolo y globales."""
+    delta = {
+        "wins": 1 if win else 0,
+        "losses": 0 if win else 1,
+        "closed": 1,
+        "realized_pnl": pnl,
+        "fees": fees,
+    }
+    now = datetime.utcnow()
+    for sym in (symbol, GLOBAL):
+        _increment(session, SymbolStats.__table__, {"symbol": sym}, delta, {"updated_at": now})
+        for res in ("5m", "1h"):
+            _increment(
+                session,
+                SymbolStatsBucket.__table__,
+                {"symbol": sym, "res": res, "bucket_start": bucket_start(closed_at, res)},
+                delta,
+            )
+    session.execute(
+        delete(SymbolStatsBucket).where(
+            SymbolStatsBucket.res == "5m",
+            SymbolStatsBucket.bucket_start < now - BUCKET_5M_RETENTION,
+        )
+    )
+
+
+# =============================
+# Cálculo del resultado de una posición
+# =============================
+def position_result(entry: Optional[float], exitp: Optional[float], side: str, qty: float) -> tuple[float, bool]:
+    if entry is None or exitp is None:
+        return 0.0, False
+    pnl = (exitp - entry) * qty if side != "SELL" else (entry - exitp) * qty
+    return pnl, pnl > 0
+
+
+def _trade_edges(session: Session, pos: Position) -> tuple[Optional[float], Optional[float]]:
+    """Precio del primer y último trade, incluidos los trades pendientes en este flush."""
+    pending = sorted(
+        (t for t in session.new if isinstance(t, Trade) and t.position_id == pos.id),
+        key=lambda t: t.created_at or datetime.utcnow(),
+    )
+    first = last = None
+    if pos.id is not None:
+        first = session.execute(
+            select(Trade.price).where(Trade.position_id == pos.id)
+            .order_by(Trade.created_at.asc(), Trade.id.asc()).limit(1)
+        ).scalar()
+        last = session.execute(
+            select(Trade.price).where(Trade.position_id == pos.id)
+            .order_by(Trade.created_at.desc(), Trade.id.desc()).limit(1)
+        ).scalar()
+    if pending:
+        first = first if first is not None else pending[0].price
+        last = pending[-1].price
+    return first, last
+
+
+def _just_closed(pos: Position) -> bool:
+    hist = attributes.get_history(pos, "status")
+    if not hist.added or hist.added[-1] != "CLOSED":
+        return False
+    return not hist.deleted or hist.deleted[0] != "CLOSED"
+
+
+def _qty_before(pos: Position) -> float:
+    # Los cierres suelen poner qty=0: se usa la cantidad previa al cambio
+    hist = attributes.get_history(pos, "qty")
+    qty = hist.deleted[0] if hist.deleted else pos.qty
+    return float(qty or 0.0)
+
+
+@event.listens_for(Session, "before_flush")
+def _record_closed_positions(session: Session, flush_context, instances):
+    closing = [o for o in list(session.dirty) + list(session.new) if isinstance(o, Position) and _just_closed(o)]
+    if not closing:
+        return
+    with session.no_autoflush:
+        for pos in closing:
+            try:
+                entry, exitp = _trade_edges(session, pos)
+                entry = entry if entry is not None else pos.entry_price
+                exitp = exitp if exitp is not None else (pos.last_price or pos.entry_price)
+                pnl, win = position_result(entry, exitp, pos.side, _qty_before(pos))
+                apply_close(session, pos.symbol, pos.closed_at or datetime.utcnow(), pnl, float(pos.fees_total or 0.0), win)
+            except Exception as e:
+                logger.error(f"[PnLStats] ⚠️ No se pudo registrar cierre de {pos.symbol}#{pos.id}: {e}")
+
+
+# =============================
+# Lecturas
+# =============================
+def _as_dict(row, symbol: str) -> dict:
+    out = {k: (getattr(row, k) if row is not None else 0) or 0 for k in _COUNTERS}
+    out["symbol"] = symbol
+    out["winrate"] = round(out["wins"] / out["closed"] * 100.0, 2) if out["closed"] else 0.0
+    return out
+
+
+async def get_totals(session, symbol: str = GLOBAL) -> dict:
+    row = await session.get(SymbolStats, symbol)
+    return _as_dict(row, symbol)
+
+
+async def _sum_buckets(session, symbol: str, res: str, span: timedelta) -> dict:
+    start = bucket_start(datetime.utcnow() - span, res)
+    row = (await session.execute(
+        select(*[func.coalesce(func.sum(getattr(SymbolStatsBucket, k)), 0).label(k) for k in _COUNTERS])
+        .where(
+            SymbolStatsBucket.symbol == symbol,
+            SymbolStatsBucket.res == res,
+            SymbolStatsBucket.bucket_start >= start,
+        )
+    )).one()
+    return _as_dict(row, symbol)
+
+
+async def get_window(session, symbol: str = GLOBAL, window: str = "24h") -> dict:
+    """Agregado de una ventana fija (1h / 24h / 30d): suma de unos cientos de buckets como mucho."""
+    res, span = WINDOWS[window]
+    return await _sum_buckets(session, symbol, res, span)
+
+
+async def get_since(session, symbol: str, span: timedelta) -> dict:
+    """Agregado de una ventana arbitraria sobre buckets de 1h."""
+    return await _sum_buckets(session, symbol, "1h", span)
+
+
+# =============================
+# Reconstrucción (backfill)
+# =============================
+async def rebuild_stats(session) -> dict:
+    """Recalcula todos los agregados desde las posiciones cerradas."""
+    from app.core.trade_queries import _edge, closed_positions_query
+
+    await session.execute(delete(SymbolStatsBucket))
+    await session.execute(delete(SymbolStats))
+
+    totals: dict = {}
+    buckets: dict = {}
+    cutoff_5m = datetime.utcnow() - BUCKET_5M_RETENTION
+    # Los cierres ponen qty=0: la cantidad sale del trade de entrada (como `_qty_before`)
+    stmt = closed_positions_query().add_columns(_edge(Trade.qty, True).label("entry_trade_qty"))
+    result = await session.stream(stmt)
+    count = 0
+    async for pos, entry_t, _, exit_t, _, entry_qty in result:
+        entry = entry_t if entry_t is not None else pos.entry_price
+        exitp = exit_t if exit_t is not None else (pos.last_price or pos.entry_price)
+        qty = entry_qty if entry_qty is not None else pos.qty
+        pnl, win = position_result(entry, exitp, pos.side, float(qty or 0.0))
+        fees = float(pos.fees_total or 0.0)
+        closed_at = pos.closed_at or pos.opened_at
+        delta = (1 if win else 0, 0 if win else 1, 1, pnl, fees)
+        for sym in (pos.symbol, GLOBAL):
+            keys = [(sym,)]
+            if closed_at:
+                keys.append((sym, "1h", bucket_start(closed_at, "1h")))
+                if closed_at >= cutoff_5m:
+                    keys.append((sym, "5m", bucket_start(closed_at, "5m")))
+            for key in keys:
+                target = totals if len(key) == 1 else buckets
+                acc = target.setdefault(key, [0, 0, 0, 0.0, 0.0])
+                for i, v in enumerate(delta):
+                    acc[i] += v
+        count += 1
+
+    now = datetime.utcnow()
+    session.add_all(
+        SymbolStats(symbol=k[0], updated_at=now, **dict(zip(_COUNTERS, v))) for k, v in totals.items()
+    )
+    session.add_all(
+        SymbolStatsBucket(symbol=k[0], res=k[1], bucket_start=k[2], **dict(zip(_COUNTERS, v)))
+        for k, v in buckets.items()
+    )
+    await session.commit()
+    logger.info(f"[PnLStats] ✅ Reconstruido: {count} posiciones, {len(totals)} símbolos, {len(buckets)} buckets")
+    return {"positions": count, "symbols": len(totals), "buckets": len(buckets)}
+
+
+async def backfill_if_empty(session) -> Optional[dict]:
+    """Primer arranque tras la migración: agregados vacíos pero con posiciones cerradas → `rebuild_stats`."""
+    if await session.scalar(select(SymbolStats.symbol).limit(1)) is not None:
+        return None
+    if await session.scalar(select(Position.id).where(Position.status == "CLOSED").limit(1)) is None:
+        return None
+    logger.info("[PnLStats] 🔄 Agregados vacíos con posiciones cerradas: reconstruyendo...")
+    return await rebuild_stats(session)
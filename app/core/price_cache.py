@@ -0,0 +1,138 @@
+# app/core/price_cache.py
+"""
+Caché de precios en memoria compartida por todo el backend.
+
+Un único refresco en background trae `ticker_price()` de Binance cada
+`PRICE_CACHE_REFRESH_SEC` segundos; los streams WS pueden empujar precios
+con `update()`. Los endpoints leen de aquí y nunca llaman al exchange.
+
+Las lecturas respetan `max_age`: `prices()` sólo devuelve precios frescos y
+`read()` sella cada precio con `age_ms`/`stale` para que las valuaciones
+(equity, posiciones) digan cuándo usan un precio viejo o el de entrada.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+from app.core.exchange import get_exchange
+
+logger = logging.getLogger(__name__)
+
+PRICE_CACHE_REFRESH_SEC = float(os.getenv("PRICE_CACHE_REFRESH_SEC", "3"))
+PRICE_CACHE_MAX_AGE_SEC = float(os.getenv("PRICE_CACHE_MAX_AGE_SEC", "15"))
+
+
+class PriceCache:
+    """Último precio conocido por símbolo con marca de tiempo de actualización."""
+
+    def __init__(self, max_age: float = PRICE_CACHE_MAX_AGE_SEC, refresh_interval: float = PRICE_CACHE_REFRESH_SEC):
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self._prices: Dict[str, tuple[float, float]] = {}  # symbol -> (price, monotonic ts)
+        self._task: Optional[asyncio.Task] = None
+        self.last_refresh: Optional[float] = None
+
+    # -----------------------------
+    # Escritura
+    # -----------------------------
+    def update(self, symbol: str, price: float, ts: Optional[float] = None):
+        """Actualiza un precio (usado por el refresco REST y por los streams WS)."""
+        self._prices[symbol.upper()] = (float(price), ts if ts is not None else time.monotonic())
+
+    def update_many(self, tickers: Iterable[dict]):
+        """Carga la respuesta de `ticker_price()` ([{symbol, price}, ...])."""
+        now = time.monotonic()
+        for t in tickers:
+            try:
+                self._prices[t["symbol"]] = (float(t["price"]), now)
+            except (KeyError, TypeError, ValueError):
+                continue
+        self.last_refresh = now
+
+    # -----------------------------
+    # Lectura
+    # -----------------------------
+    def get(self, symbol: str) -> Optional[float]:
+        entry = self._prices.get(symbol.upper())
+        return entry[0] if entry else None
+
+    def age(self, symbol: str) -> Optional[float]:
+        """Segundos desde la última actualización del símbolo (None si no hay dato)."""
+        entry = self._prices.get(symbol.upper())
+        return time.monotonic() - entry[1] if entry else None
+
+    def is_fresh(self, symbol: str) -> bool:
+        a = self.age(symbol)
+        return a is not None and a <= self.max_age
+
+    def read(self, symbol: str, fallback: Optional[float] = None) -> dict:
+        """
+        Lectura con sello de antigüedad: {symbol, price, age_ms, stale}.
+        Sin precio en caché devuelve `fallback` (p. ej. entry_price) marcado stale.
+        """
+        a = self.age(symbol)
+        price = self.get(symbol)
+        return {
+            "symbol": symbol.upper(),
+            "price": price if price is not None else fallback,
+            "age_ms": round(a * 1000, 1) if a is not None else None,
+            "stale": a is None or a > self.max_age,
+        }
+
+    def prices(self, max_age: Optional[float] = None) -> Dict[str, float]:
+        """Precios no más viejos que `max_age` (por defecto el de la caché); los vencidos se excluyen."""
+        limit = self.max_age if max_age is None else max_age
+        now = time.monotonic()
+        return {s: p for s, (p, ts) in self._prices.items() if now - ts <= limit}
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self._prices),
+            "max_age_sec": self.max_age,
+            "refresh_interval_sec": self.refresh_interval,
+            "last_refresh_age_ms": round((time.monotonic() - self.last_refresh) * 1000, 1) if self.last_refresh else None,
+            "running": bool(self._task and not self._task.done()),
+        }
+
+    # -----------------------------
+    # Refresco en background
+    # -----------------------------
+    async def refresh(self):
+        """Un único `ticker_price()` para todo el exchange, fuera del event loop."""
+        tickers = await get_exchange().ticker_price()
+        self.update_many(tickers)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[PriceCache] ⚠️ Error refrescando precios: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._task and not self._task.done():
+            return self._task
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"[PriceCache] ✅ Refresco cada {self.refresh_interval}s (max_age={self.max_age}s)")
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Instancia compartida
+price_cache = PriceCache()
@@ -0,0 +1,161 @@
+# app/core/reconciler.py
+"""
+Reconciliación de posiciones guiada por el user-data stream.
+
+Consume los eventos de la cuenta, mantiene `account_state` y aplica a las
+filas `Position` sólo los cambios de los activos afectados: cuando el balance
+de un activo base queda en polvo, sus posiciones OPEN se cierran con el
+precio del último fill conocido. Los eventos se agrupan en ventanas cortas
+y cada ráfaga es un único comando al escritor de la DB. Un snapshot REST completo re-siembra
+el estado al conectar y cada `RECONCILE_SNAPSHOT_SEC` como red de seguridad.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import select
+
+from app.core.db_writer import get_writer, read_session
+from app.core.exchange import get_exchange
+from app.core.models import Position
+from app.core.user_stream import AccountState, BinanceUserDataStream, ReplayUserDataStream, account_state
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_SNAPSHOT_SEC = float(os.getenv("RECONCILE_SNAPSHOT_SEC", "900"))
+RECONCILE_BATCH_SEC = float(os.getenv("RECONCILE_BATCH_SEC", "0.5"))
+DUST_BALANCE = 0.0001
+QUOTE = "USDT"
+
+
+class PositionReconciler:
+    def __init__(self, stream=None, state: AccountState = account_state):
+        self.stream = stream
+        self.state = state
+        self.pending_assets: set = set()
+        self.last_fills: Dict[str, dict] = {}
+        self.closed = 0
+        self.snapshots = 0
+        self.last_snapshot: Optional[float] = None
+        self._tasks: list[asyncio.Task] = []
+        self._wake = asyncio.Event()
+
+    # -----------------------------
+    # Snapshot REST (siembra / red de seguridad)
+    # -----------------------------
+    async def snapshot(self):
+        c = get_exchange()
+        account, orders = await asyncio.gather(c.account(), c.get_open_orders())
+        self.state.seed(account, orders)
+        self.snapshots += 1
+        self.last_snapshot = time.time()
+        # Revisar todas las bases con posiciones abiertas contra el snapshot
+        async with read_session() as session:
+            symbols = (await session.execute(
+                select(Position.symbol).where(Position.status == "OPEN").distinct()
+            )).scalars().all()
+        self.pending_assets.update(s[: -len(QUOTE)] for s in symbols if s.endswith(QUOTE))
+        self._wake.set()
+
+    # -----------------------------
+    # Deltas → Position
+    # -----------------------------
+    async def apply_pending(self) -> list[str]:
+        assets, self.pending_assets = self.pending_assets, set()
+        dust = [a for a in assets if a != QUOTE and self.state.total(a) <= DUST_BALANCE]
+        if not dust:
+            return []
+        symbols = [a + QUOTE for a in dust]
+        async with read_session() as session:
+            rows = (await session.execute(
+                select(Position.id, Position.symbol).where(Position.status == "OPEN", Position.symbol.in_(symbols))
+            )).all()
+        if not rows:
+            return []
+        for pos_id, symbol in rows:
+            logger.info(
+                f"[Reconciler] 🔁 Cerrando {symbol}#{pos_id} "
+                f"(balance {self.state.total(symbol[:-len(QUOTE)])})"
+            )
+        prices = {s: f["price"] for s, f in self.last_fills.items() if s in symbols}
+        ids = await get_writer().call(
+            "close_positions", ids=[i for i, _ in rows], prices=prices, close_method="BINANCE_SYNC"
+        )
+        by_id = dict(rows)
+        closed = [by_id[i] for i in ids]
+        self.closed += len(closed)
+        return closed
+
+    async def _consume(self):
+        async for ev in self.stream:
+            if ev.get("e") == "streamConnected":
+                try:
+                    await self.snapshot()
+                except Exception as e:
+                    logger.error(f"[Reconciler] ⚠️ Snapshot al conectar falló: {e}")
+                continue
+            delta = self.state.apply(ev)
+            self.last_fills.update(delta.fills)
+            if delta.assets:
+                self.pending_assets |= delta.assets
+                self._wake.set()
+
+    async def _flush_loop(self):
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(RECONCILE_BATCH_SEC)  # agrupa la ráfaga de eventos
+            self._wake.clear()
+            try:
+                await self.apply_pending()
+            except Exception as e:
+                logger.error(f"[Reconciler] ⚠️ Error aplicando deltas: {e}")
+
+    async def _snapshot_loop(self):
+        while True:
+            try:
+                if self.last_snapshot is None or time.time() - self.last_snapshot >= RECONCILE_SNAPSHOT_SEC:
+                    await self.snapshot()
+            except Exception as e:
+                logger.error(f"[Reconciler] ⚠️ Snapshot periódico falló: {e}")
+            await asyncio.sleep(min(RECONCILE_SNAPSHOT_SEC, 60.0))
+
+    def start(self):
+        if self.stream is None:
+            replay = os.getenv("ACCOUNT_STREAM_REPLAY_FILE")
+            self.stream = ReplayUserDataStream(replay) if replay else BinanceUserDataStream()
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._consume()),
+                asyncio.create_task(self._flush_loop()),
+                asyncio.create_task(self._snapshot_loop()),
+            ]
+
+    async def stop(self):
+        """Cancela las tareas y aplica los deltas pendientes (llamar antes de parar el escritor)."""
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.pending_assets:
+            try:
+                await self.apply_pending()
+            except Exception as e:
+                logger.error(f"[Reconciler] ⚠️ Error aplicando deltas al detener: {e}")
+
+    def stats(self) -> dict:
+        return {
+            **self.state.snapshot(),
+            "stream_connected": bool(getattr(self.stream, "connected", False)),
+            "positions_closed": self.closed,
+            "snapshots": self.snapshots,
+            "last_snapshot_age_sec": round(time.time() - self.last_snapshot, 1) if self.last_snapshot else None,
+            "running": any(not t.done() for t in self._tasks),
+        }
+
+
+reconciler = PositionReconciler()
@@ -0,0 +1,221 @@
+# app/core/rule_compiler.py
+"""
+Compilador de fórmulas humanas (`formula_human`) a closures.
+
+Una fórmula es una lista de reglas `CONDICIÓN -> ACCIÓN` separadas por
+saltos de línea o `|`. La condición admite comparaciones `A op B`
+(>=, <=, >, <, ==, !=) unidas con AND / OR (también && / ||); AND tiene
+precedencia sobre OR. Los operandos son números o nombres de indicador
+(sin distinguir mayúsculas).
+
+La fórmula se parsea una sola vez; el resultado se cachea por hash del texto
+(LRU de `FORMULA_CACHE_SIZE` entradas) y sirve tanto para un dict de
+indicadores escalares como para columnas NumPy (backtests), sin `eval` en el
+camino caliente. La caché es del proceso que evalúa (el bot): una fórmula
+editada tiene otro hash y se recompila sola al recargar la config.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import operator
+import re
+from collections import OrderedDict
+from typing import Callable, Dict, List, Mapping, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_OPS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+_COMPARISON = re.compile(r"^\s*([A-Za-z0-9_\.]+)\s*(>=|<=|!=|==|>|<)\s*([A-Za-z0-9_\.]+)\s*$")
+_OR = re.compile(r"\s+OR\s+|\|\|", re.IGNORECASE)
+_AND = re.compile(r"\s+AND\s+|&&", re.IGNORECASE)
+
+Condition = Callable[[Mapping], object]
+
+
+def normalize_formula(formula: str) -> str:
+    return (
+        formula.replace("→", "->")
+               .replace("↗", ">")
+               .replace("↘", "<")
+               .replace("\n", "|")
+    )
+
+
+def split_rules(formula: str) -> list[tuple[str, str]]:
+    """`'A -> BUY | B -> SELL'` → `[('A', 'BUY'), ('B', 'SELL')]`."""
+    rules = []
+    # "||" es OR dentro de una condición, no separador de reglas
+    text = normalize_formula(formula).replace("||", "\x00")
+    for part in text.split("|"):
+        if "->" not in part:
+            continue
+        condition, action = part.split("->", 1)
+        rules.append((condition.replace("\x00", "||").strip(), action.strip().upper()))
+    return rules
+
+
+# =============================
+# Compilación de condiciones
+# =============================
+def _operand(token: str) -> Callable[[Mapping], object]:
+    try:
+        value = float(token)
+        return lambda env: value
+    except ValueError:
+        low, up = token.lower(), token.upper()
+
+        def lookup(env: Mapping):
+            v = env.get(low)
+            return env.get(up) if v is None else v
+        return lookup
+
+
+def _comparison(expr: str) -> Condition:
+    m = _COMPARISON.match(expr)
+    if not m:
+        raise ValueError(f"condición inválida: '{expr}'")
+    left, op, right = m.groups()
+    lf, rf, fn = _operand(left), _operand(right), _OPS[op]
+
+    def cond(env: Mapping):
+        a, b = lf(env), rf(env)
+        if a is None or b is None:
+            return False
+        return fn(a, b)
+    return cond
+
+
+def _all(conds: List[Condition]) -> Condition:
+    if len(conds) == 1:
+        return conds[0]
+
+    def cond(env: Mapping):
+        out = conds[0](env)
+        for c in conds[1:]:
+            out = operator.and_(out, c(env))
+        return out
+    return cond
+
+
+def _any(conds: List[Condition]) -> Condition:
+    if len(conds) == 1:
+        return conds[0]
+
+    def cond(env: Mapping):
+        out = conds[0](env)
+        for c in conds[1:]:
+            out = operator.or_(out, c(env))
+        return out
+    return cond
+
+
+def compile_condition(expr: str) -> Condition:
+    """Compila `A op B [AND|OR ...]` a un closure `env -> bool | ndarray[bool]`."""
+    return _any([_all([_comparison(c) for c in _AND.split(term)]) for term in _OR.split(expr)])
+
+
+def _never(env: Mapping):
+    return False
+
+
+# =============================
+# Fórmula compilada
+# =============================
+class CompiledFormula:
+    """Reglas compiladas en orden de prioridad (gana la primera que se cumple)."""
+
+    def __init__(self, formula: str):
+        self.source = formula
+        self.key = formula_key(formula)
+        self.rules: list[tuple[str, str]] = split_rules(formula)
+        self._compiled: list[tuple[Condition, str]] = []
+        for text, action in self.rules:
+            try:
+                self._compiled.append((compile_condition(text), action))
+            except ValueError as e:
+                logger.warning(f"[RuleCompiler] ⚠️ Regla ignorada en fórmula {self.key[:8]}: {e}")
+                self._compiled.append((_never, action))
+
+    def evaluate(self, indicators: Mapping) -> Optional[str]:
+        """Acción de la primera regla que se cumple con indicadores escalares."""
+        for cond, action in self._compiled:
+            if cond(indicators):
+                return action
+        return None
+
+    def evaluate_columns(self, columns: Mapping[str, np.ndarray], length: Optional[int] = None) -> np.ndarray:
+        """
+        Versión vectorizada: `columns` son arrays alineados (una fila por vela).
+        Devuelve un array de acciones ('' donde ninguna regla se cumple).
+        """
+        if length is None:
+            length = len(next(iter(columns.values()))) if columns else 0
+        out = np.full(length, "", dtype=object)
+        # De la última a la primera: las reglas anteriores sobrescriben (prioridad)
+        for cond, action in reversed(self._compiled):
+            with np.errstate(invalid="ignore"):
+                mask = np.broadcast_to(np.asarray(cond(columns), dtype=bool), (length,))
+            out[mask] = action
+        return out
+
+
+def formula_key(formula: str) -> str:
+    return hashlib.sha1(formula.encode("utf-8")).hexdigest()
+
+
+# =============================
+# Caché por hash + vínculo por símbolo
+# =============================
+FORMULA_CACHE_SIZE = 256
+
+_cache: "OrderedDict[str, CompiledFormula]" = OrderedDict()
+_by_symbol: Dict[str, str] = {}
+
+
+def compile_formula(formula: str) -> CompiledFormula:
+    key = formula_key(formula)
+    compiled = _cache.get(key)
+    if compiled is None:
+        compiled = _cache[key] = CompiledFormula(formula)
+        while len(_cache) > FORMULA_CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(key)
+    return compiled
+
+
+def formula_for_symbol(symbol: str, formula: str) -> CompiledFormula:
+    """Fórmula compilada activa para un símbolo (recompila si cambió el texto)."""
+    compiled = compile_formula(formula)
+    previous = _by_symbol.get(symbol)
+    _by_symbol[symbol] = compiled.key
+    if previous and previous != compiled.key:
+        _evict(previous)
+    return compiled
+
+
+def invalidate(symbol: Optional[str] = None):
+    """Descarta la fórmula de un símbolo (o todas) de la caché de este proceso."""
+    if symbol is None:
+        _cache.clear()
+        _by_symbol.clear()
+        return
+    key = _by_symbol.pop(symbol, None)
+    if key:
+        _evict(key)
+
+
+def _evict(key: str):
+    if key not in _by_symbol.values():
+        _cache.pop(key, None)
@@ -0,0 +1,444 @@
+# app/core/smart_search.py
+"""
+Búsqueda de combinaciones SmartTrading (features × hiperparámetros XGBoost)
+en paralelo y con poda por successive halving.
+
+- Las combinaciones se evalúan por rondas de boosting crecientes
+  (`SMART_SEARCH_MIN_ROUNDS` × ETA^k hasta `SMART_SEARCH_MAX_ROUNDS`); en cada
+  escalón sobrevive 1/ETA y se descartan antes las que, aun con margen, no
+  pueden alcanzar al mejor que ya cumple las GoldenRules.
+- Los sobrevivientes no se re-entrenan: continúan desde el booster guardado
+  del escalón anterior (`xgb_model=`). Combinaciones repetidas se evalúan una
+  sola vez.
+- Entre train y validación se purgan `delta_t` filas (embargo): ninguna
+  etiqueta de train se decide con velas de validación.
+- Matriz de features + etiquetas publicada una vez en memoria compartida;
+  cada worker arma el DMatrix de cada subconjunto de features una sola vez y
+  lo reutiliza en todos los fits que lo comparten.
+- El dataset es el CSV del `feature_store` (OHLCV + features ya calculadas).
+- Resultado: manifest con `best_balanced`, `best_by_accuracy` y
+  `best_by_profit` (modelo, features y DSL de riesgo), el formato que lee
+  `model_registry`, más `version` y `data_until` (última vela vista).
+- `warm_start()`: retrain incremental sobre un manifest existente. Sólo
+  entrena con las velas posteriores a `data_until`, continuando el booster, y
+  publica una versión nueva únicamente si mejora en la ventana móvil.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from app.core.feature_store import FEATURE_VERSION, FEATURES
+
+logger = logging.getLogger(__name__)
+
+SMART_SEARCH_MIN_ROUNDS = int(os.getenv("SMART_SEARCH_MIN_ROUNDS", "20"))
+SMART_SEARCH_MAX_ROUNDS = int(os.getenv("SMART_SEARCH_MAX_ROUNDS", "180"))
+SMART_RETRAIN_ROUNDS = int(os.getenv("SMART_RETRAIN_ROUNDS", "20"))
+SMART_RETRAIN_WINDOW = int(os.getenv("SMART_RETRAIN_WINDOW", "500"))
+SMART_RETRAIN_MIN_HOLDOUT = int(os.getenv("SMART_RETRAIN_MIN_HOLDOUT", "24"))
+SMART_RETRAIN_HOURS = float(os.getenv("SMART_RETRAIN_HOURS", "24"))   # 0 = sin retrain programado
+SEARCH_ETA = 3
+PRUNE_SLACK = 0.05
+VALID_FRACTION = 0.2
+
+CANDIDATE_FEATURES = (*FEATURES, "volume")
+PARAM_GRID = {
+    "max_depth": [3, 4, 6],
+    "eta": [0.05, 0.1, 0.3],
+    "min_child_weight": [1, 5],
+}
+STRATEGIES = ("best_balanced", "best_by_accuracy", "best_by_profit")
+
+
+# =============================
+# Dataset
+# =============================
+def make_labels(close: np.ndarray, high: np.ndarray, low: np.ndarray,
+                profit_target: float, stop_loss: float, horizon: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Etiqueta por vela mirando `horizon` velas hacia adelante: 1=BUY si toca el
+    objetivo antes que el stop, 2=SELL si toca el stop primero, 0=HOLD si no
+    toca ninguno. `rets` es el resultado de entrar en esa vela.
+    """
+    n = close.shape[0]
+    labels = np.zeros(n, dtype=np.float64)
+    rets = np.zeros(n, dtype=np.float64)
+    for i in range(n - 1):
+        j = min(n, i + 1 + horizon)
+        up = np.flatnonzero(high[i + 1:j] >= close[i] * (1 + profit_target))
+        dn = np.flatnonzero(low[i + 1:j] <= close[i] * (1 - stop_loss))
+        if up.size and (not dn.size or up[0] < dn[0]):
+            labels[i], rets[i] = 1, profit_target
+        elif dn.size:
+            labels[i], rets[i] = 2, -stop_loss
+        else:
+            rets[i] = close[j - 1] / close[i] - 1
+    return labels, rets
+
+
+def _horizon(rules: dict) -> int:
+    return max(1, int(rules.get("delta_t", 60)))
+
+
+def _frame(data_path: str, rules: dict, features=CANDIDATE_FEATURES):
+    """CSV del feature store con `label`, `ret` y `time` (ms); sin warm-up ni velas sin futuro."""
+    import pandas as pd
+
+    df = pd.read_csv(data_path)
+    missing = [f for f in features if f not in df.columns]
+    if missing:
+        raise ValueError(f"El dataset no tiene las features {missing} (exportar con feature_store)")
+    horizon = _horizon(rules)
+    labels, rets = make_labels(
+        df["close"].to_numpy(float), df["high"].to_numpy(float), df["low"].to_numpy(float),
+        float(rules.get("profit_target", 0.10)), float(rules.get("stop_loss", 0.05)), horizon,
+    )
+    df["label"], df["ret"] = labels, rets
+    df["time"] = pd.to_datetime(df["timestamp"]).astype("int64") // 1_000_000
+    return df.iloc[:-horizon].dropna(subset=list(features)).reset_index(drop=True)
+
+
+def load_dataset(data_path: str, rules: dict) -> tuple[np.ndarray, list[str], int, int]:
+    """Matriz (n, F + 2) [features..., label, ret], corte train/valid y open time de la última fila."""
+    df = _frame(data_path, rules)
+    horizon = _horizon(rules)
+    if len(df) < 100 + horizon:
+        raise ValueError(f"Dataset demasiado corto para entrenar ({len(df)} filas)")
+    split = int(len(df) * (1 - VALID_FRACTION))
+    # Embargo: las últimas `horizon` etiquetas de train miran velas de validación
+    df = df.drop(index=range(split - horizon, split))
+    columns = [*CANDIDATE_FEATURES, "label", "ret"]
+    return np.ascontiguousarray(df[columns].to_numpy(np.float64)), columns, split - horizon, int(df["time"].iloc[-1])
+
+
+# =============================
+# Combinaciones
+# =============================
+def combinations(max_combinations: int, seed: int = 42) -> list[tuple[tuple, dict]]:
+    """(features, params) únicos; muestreo determinista si el total excede el máximo."""
+    subsets = [c for k in range(2, len(CANDIDATE_FEATURES) + 1) for c in itertools.combinations(CANDIDATE_FEATURES, k)]
+    keys = list(PARAM_GRID)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*PARAM_GRID.values())]
+    combos = [(feats, params) for feats in subsets for params in grid]
+    if len(combos) > max_combinations:
+        combos = random.Random(seed).sample(combos, max_combinations)
+    return combos
+
+
+def _combo_key(features: tuple, params: dict) -> str:
+    return json.dumps([list(features), params], sort_keys=True)
+
+
+# =============================
+# Workers (memoria compartida)
+# =============================
+_worker: dict = {}
+
+
+def _init_worker(shm_name: str, shape: tuple, columns: list, split: int):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    data.flags.writeable = False
+    _worker.update(shm=shm, data=data, columns=columns, split=split, dmats={})
+
+
+def _dmatrices(features: tuple):
+    """DMatrix train/valid por subconjunto de features, armados una vez por worker."""
+    import xgboost as xgb
+
+    dm = _worker["dmats"].get(features)
+    if dm is None:
+        data, cols, split = _worker["data"], _worker["columns"], _worker["split"]
+        idx = [cols.index(f) for f in features]
+        y = data[:, cols.index("label")]
+        dm = _worker["dmats"][features] = (
+            xgb.DMatrix(data[:split, idx], label=y[:split], feature_names=list(features), nthread=1),
+            xgb.DMatrix(data[split:, idx], label=y[split:], feature_names=list(features), nthread=1),
+        )
+    return dm
+
+
+def _xgb_params(params: dict, nthread: int = 1) -> dict:
+    return {"objective": "multi:softprob", "num_class": 3, "nthread": nthread, "verbosity": 0, **params}
+
+
+def _metrics(booster, dvalid, y: np.ndarray, ret: np.ndarray) -> dict:
+    pred = booster.predict(dvalid).argmax(axis=1)
+    buys = pred == 1
+    return {
+        "accuracy": float((pred == y).mean()),
+        "profit": float(ret[buys].sum()),
+        "trades": int(buys.sum()),
+        "win_rate": float((y[buys] == 1).mean()) if buys.any() else 0.0,
+    }
+
+
+def _fit(key: str, features: tuple, params: dict, rounds: int, prev_rounds: int, raw: Optional[bytes]) -> dict:
+    import xgboost as xgb
+
+    dtrain, dvalid = _dmatrices(features)
+    booster = None
+    if raw is not None:
+        booster = xgb.Booster()
+        booster.load_model(bytearray(raw))
+    booster = xgb.train(_xgb_params(params), dtrain, num_boost_round=rounds - prev_rounds, xgb_model=booster)
+    cols, split = _worker["columns"], _worker["split"]
+    return {
+        "key": key,
+        "features": list(features),
+        "params": params,
+        "rounds": rounds,
+        **_metrics(booster, dvalid, _worker["data"][split:, cols.index("label")], _worker["data"][split:, cols.index("ret")]),
+        "raw": bytes(booster.save_raw()),
+    }
+
+
+# =============================
+# Búsqueda
+# =============================
+def _passes(r: dict, rules: dict) -> bool:
+    return r["accuracy"] >= rules.get("min_accuracy", 0.0) and r["profit"] >= rules.get("min_profit", 0.0)
+
+
+def _score(r: dict, rules: dict) -> tuple:
+    return (_passes(r, rules), r["accuracy"] + r["profit"])
+
+
+@dataclass
+class SmartSearch:
+    data_path: str
+    rules: dict
+    max_combinations: int = 200
+    workers: int = max(1, (os.cpu_count() or 2) - 1)
+    min_rounds: int = SMART_SEARCH_MIN_ROUNDS
+    max_rounds: int = SMART_SEARCH_MAX_ROUNDS
+    eta: int = SEARCH_ETA
+    data_until: Optional[int] = None
+
+    def rungs(self) -> list[int]:
+        out, r = [], self.min_rounds
+        while r < self.max_rounds:
+            out.append(r)
+            r *= self.eta
+        return out + [self.max_rounds]
+
+    def planned(self, n: int) -> int:
+        """Evaluaciones máximas (sin contar la poda extra contra el mejor)."""
+        total = 0
+        for _ in self.rungs():
+            total += n
+            n = max(1, math.ceil(n / self.eta))
+        return total
+
+    def _prune(self, results: list[dict], last: bool) -> list[dict]:
+        ranked = sorted(results, key=lambda r: _score(r, self.rules), reverse=True)
+        if last:
+            return ranked
+        best = next((r for r in ranked if _passes(r, self.rules)), None)
+        if best is not None:
+            # no puede alcanzar al mejor ni en accuracy ni en profit, aun con margen
+            ranked = [r for r in ranked if r is best or r["accuracy"] + PRUNE_SLACK >= best["accuracy"]
+                      or r["profit"] + PRUNE_SLACK >= best["profit"]]
+        return ranked[:max(1, math.ceil(len(ranked) / self.eta))]
+
+    def run(self, progress: Optional[Callable[[int, int, str], object]] = None) -> list[dict]:
+        """Ejecución bloqueante; devuelve los resultados del último escalón ordenados."""
+        data, columns, split, self.data_until = load_dataset(self.data_path, self.rules)
+        combos = {_combo_key(f, p): (f, p) for f, p in combinations(self.max_combinations)}
+        total = self.planned(len(combos))
+        done = 0
+        checkpoints: Dict[str, tuple[int, bytes]] = {}   # key -> (rondas, booster serializado)
+        survivors = list(combos)
+        final: list[dict] = []
+
+        shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+        np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)[:] = data
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(shm.name, data.shape, columns, split),
+            ) as pool:
+                rungs = self.rungs()
+                for k, rounds in enumerate(rungs):
+                    futures = []
+                    for key in survivors:
+                        prev, raw = checkpoints.get(key, (0, None))
+                        futures.append(pool.submit(_fit, key, *combos[key], rounds, prev, raw))
+                    results = []
+                    for fut in as_completed(futures):
+                        r = fut.result()
+                        checkpoints[r["key"]] = (rounds, r["raw"])
+                        results.append(r)
+                        done += 1
+                        if progress:
+                            progress(done, total, f"Escalón {k + 1}/{len(rungs)} ({rounds} rondas): "
+                                                  f"acc={r['accuracy']:.3f} profit={r['profit']:.3f}")
+                    kept = self._prune(results, last=k == len(rungs) - 1)
+                    survivors = [r["key"] for r in kept]
+                    for key in set(checkpoints) - set(survivors):
+                        del checkpoints[key]   # libera boosters descartados
+                    final = kept
+                    logger.info(f"[SmartSearch] 🔎 {rounds} rondas: {len(results)} evaluadas, {len(kept)} siguen")
+        finally:
+            shm.close()
+            shm.unlink()
+        return final
+
+    def export(self, results: list[dict], pair: str, timeframe: str, outdir: str) -> str:
+        """Guarda los modelos ganadores y el manifest; devuelve su ruta."""
+        import xgboost as xgb
+
+        if not results:
+            raise ValueError("La búsqueda no produjo resultados")
+        picks = {
+            "best_balanced": max(results, key=lambda r: _score(r, self.rules)),
+            "best_by_accuracy": max(results, key=lambda r: r["accuracy"]),
+            "best_by_profit": max(results, key=lambda r: r["profit"]),
+        }
+        run_dir = os.path.join(outdir, f"{pair.upper()}_{timeframe}_{datetime.utcnow():%Y%m%d%H%M%S}")
+        os.makedirs(run_dir, exist_ok=True)
+        risk = {k: self.rules[k] for k in ("profit_target", "stop_loss", "trailing_enabled", "trailing_distance") if k in self.rules}
+        manifest = {
+            "pair": pair.upper(),
+            "timeframe": timeframe,
+            "created_at": datetime.utcnow().isoformat(),
+            "feature_version": FEATURE_VERSION,
+            "rules": self.rules,
+            "version": 1,
+            "data_until": self.data_until,
+        }
+        for strategy, r in picks.items():
+            booster = xgb.Booster()
+            booster.load_model(bytearray(r["raw"]))
+            booster.save_model(os.path.join(run_dir, f"{strategy}.json"))
+            manifest[strategy] = {
+                "model_path": f"{strategy}.json",
+                "features": r["features"],
+                "params": r["params"],
+                "rounds": r["rounds"],
+                "metrics": {k: r[k] for k in ("accuracy", "profit", "trades", "win_rate")},
+                "passes_rules": _passes(r, self.rules),
+                "dsl": {"delta_t": self.rules.get("delta_t"), "risk": risk},
+            }
+        path = os.path.join(run_dir, "manifest.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return path
+
+
+# =============================
+# Retrain incremental
+# =============================
+def warm_start(
+    manifest_path: str,
+    data_path: str,
+    rules: dict,
+    outdir: str,
+    rounds: int = SMART_RETRAIN_ROUNDS,
+    window: int = SMART_RETRAIN_WINDOW,
+    nthread: int = 1,
+    progress: Optional[Callable[[int, int, str], object]] = None,
+) -> dict:
+    """
+    Continúa cada estrategia del manifest con las velas nuevas y compara base
+    vs candidato en la ventana móvil (últimas `window` velas, sin las usadas
+    para entrenar). Devuelve {"manifest_path", "improved", "strategies"}; si
+    ninguna mejora, `manifest_path` sigue siendo el de entrada.
+    """
+    import xgboost as xgb
+
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    rules = manifest.get("rules") or rules   # se re-valida contra las reglas con que se entrenó
+    data_until = manifest.get("data_until")
+    if data_until is None:
+        raise ValueError(f"{manifest_path} no tiene `data_until`: hace falta un retrain completo")
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    strategies = [s for s in STRATEGIES if manifest.get(s)]
+    features = sorted({f for s in strategies for f in manifest[s]["features"]})
+    df = _frame(data_path, rules, features)
+    times = df["time"].to_numpy()
+    new = np.flatnonzero(times > data_until)
+    summary = {"manifest_path": manifest_path, "improved": False, "new_bars": int(new.size), "strategies": {}}
+
+    # Las últimas velas nuevas quedan fuera del entrenamiento (holdout) y, antes
+    # de ellas, `horizon` velas de embargo: ninguna etiqueta de train mira el holdout
+    horizon = _horizon(rules)
+    holdout = max(SMART_RETRAIN_MIN_HOLDOUT, new.size // 5)
+    train_idx = new[:-(holdout + horizon)]
+    if not train_idx.size:
+        # pocas velas nuevas: `data_until` no avanza y se acumulan para el próximo retrain
+        summary["message"] = f"Hacen falta más de {holdout + horizon} velas nuevas (hay {new.size})"
+        return summary
+    valid_mask = np.zeros(len(df), dtype=bool)
+    valid_mask[-max(window, holdout):] = True
+    valid_mask[train_idx] = False
+    y, ret = df["label"].to_numpy(float), df["ret"].to_numpy(float)
+
+    updated = dict(manifest)
+    run_dir = None
+    for i, strategy in enumerate(strategies):
+        entry = manifest[strategy]
+        feats = list(entry["features"])
+        model_path = entry["model_path"]
+        if not os.path.isabs(model_path):
+            model_path = os.path.join(base_dir, model_path)
+        base = xgb.Booster()
+        base.load_model(model_path)
+
+        X = df[feats].to_numpy(np.float64)
+        dvalid = xgb.DMatrix(X[valid_mask], label=y[valid_mask], feature_names=feats, nthread=nthread)
+        cand = xgb.train(
+            _xgb_params(entry.get("params", {}), nthread),
+            xgb.DMatrix(X[train_idx], label=y[train_idx], feature_names=feats, nthread=nthread),
+            num_boost_round=rounds, xgb_model=base.copy(),
+        )
+        before = _metrics(base, dvalid, y[valid_mask], ret[valid_mask])
+        after = _metrics(cand, dvalid, y[valid_mask], ret[valid_mask])
+        improved = _score(after, rules) > _score(before, rules)
+        summary["strategies"][strategy] = {"before": before, "after": after, "improved": improved}
+        if progress:
+            progress(i + 1, len(strategies), f"{strategy}: acc {before['accuracy']:.3f}→{after['accuracy']:.3f} "
+                                             f"profit {before['profit']:.3f}→{after['profit']:.3f}"
+                                             f"{' ✅' if improved else ''}")
+        if not improved:
+            updated[strategy] = {**entry, "model_path": model_path}
+            continue
+        if run_dir is None:
+            run_dir = os.path.join(outdir, f"{manifest.get('pair', 'SMART')}_{manifest.get('timeframe', '')}_"
+                                           f"{datetime.utcnow():%Y%m%d%H%M%S}_v{manifest.get('version', 1) + 1}")
+            os.makedirs(run_dir, exist_ok=True)
+        cand.save_model(os.path.join(run_dir, f"{strategy}.json"))
+        updated[strategy] = {
+            **entry,
+            "model_path": f"{strategy}.json",
+            "rounds": entry.get("rounds", 0) + rounds,
+            "metrics": after,
+            "passes_rules": _passes(after, rules),
+        }
+
+    if run_dir is None:
+        return summary
+    updated.update(
+        version=manifest.get("version", 1) + 1,
+        parent=manifest_path,
+        created_at=datetime.utcnow().isoformat(),
+        data_until=int(times[train_idx[-1]]),   # holdout y embargo se entrenan en el próximo retrain
+    )
+    path = os.path.join(run_dir, "manifest.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(updated, f, indent=2)
+    logger.info(f"[SmartSearch] ✅ Warm start v{updated['version']} ({new.size} velas nuevas) → {path}")
+    return {**summary, "manifest_path": path, "improved": True}
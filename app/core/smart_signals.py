@@ -0,0 +1,157 @@
+# app/core/smart_signals.py
+"""
+Señales SmartTrading por lotes: un solo predict por modelo para N símbolos.
+
+Las filas de features salen del `feature_store` (misma definición que el
+entrenamiento, calculada una vez por vela cerrada del `candle_cache`); no se
+arma un DataFrame por request ni se recalculan indicadores sobre 120 velas.
+Sólo los modelos legacy, con columnas fuera de `FEATURES`, siguen usando
+`add_indicators` sobre las velas cacheadas (`legacy_row`).
+Los símbolos que comparten booster (misma versión en el registro) se apilan
+en una matriz y se puntúan juntos con `inplace_predict`.
+
+Lo usan `/smart/signals` (registro del backend) y el bot, que carga su
+propio registro con `bot.sync_smart_models` y puntúa todos sus pares SMART
+de una vez por ciclo (`score_symbols` desde `bot.score_smart`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.candle_cache import candle_cache
+from app.core.feature_store import FEATURES, feature_store
+from app.core.model_registry import ModelRegistry, model_registry
+
+logger = logging.getLogger(__name__)
+
+SMART_INTERVAL = "1h"
+SMART_HISTORY = 120
+DSL_OVERRIDE_CONF = 0.55
+
+
+def combine_signal(pred_class: int, conf: float, pred_dsl: int) -> int:
+    """Misma regla que `/smart/signal`: la DSL manda si el modelo duda."""
+    if pred_dsl != pred_class and conf < DSL_OVERRIDE_CONF:
+        return pred_dsl
+    return pred_class
+
+
+def predict_batch(booster, X: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """(clases, confianza) para todas las filas de X en un solo predict."""
+    probs = np.asarray(booster.inplace_predict(X))
+    if probs.ndim == 1:
+        classes = (probs >= 0.5).astype(int)
+        conf = np.where(classes == 1, probs, 1.0 - probs)
+    else:
+        classes = probs.argmax(axis=1)
+        conf = probs.max(axis=1)
+    return classes, conf
+
+
+async def feature_rows(symbols: Iterable[str], interval: str = SMART_INTERVAL) -> Dict[str, Optional[dict]]:
+    """Filas de features por símbolo: refresco incremental del caché + lookup en el feature store."""
+    symbols = [s.upper() for s in symbols]
+    await candle_cache.get_many(symbols, interval, SMART_HISTORY)
+
+    async def one(symbol: str) -> Optional[dict]:
+        try:
+            return await feature_store.latest(symbol, interval, list(candle_cache.series(symbol, interval).closed))
+        except Exception as e:
+            logger.error(f"[SmartSignals] ⚠️ Features de {symbol} {interval} no disponibles: {e}")
+            return None
+
+    rows = await asyncio.gather(*(one(s) for s in symbols))
+    return dict(zip(symbols, rows))
+
+
+def _legacy_row(bars: list) -> Optional[dict]:
+    """Última fila de `add_indicators` sobre las velas cerradas (modelos del entrenador legacy)."""
+    from app.core.smart_trading_api import add_indicators
+
+    if not bars:
+        return None
+    df = pd.DataFrame(bars, columns=["time", "open", "high", "low", "close", "volume"]).astype(float)
+    row = add_indicators(df).iloc[-1]
+    out = {k: (None if pd.isna(v) else float(v)) for k, v in row.items() if isinstance(v, (int, float, np.number))}
+    out["time"] = int(row["time"])
+    return out
+
+
+async def legacy_row(symbol: str, interval: str = SMART_INTERVAL) -> Optional[dict]:
+    """
+    Fila con las columnas de `add_indicators` para manifests que piden
+    features fuera del feature store (`engine=legacy` o manifests viejos).
+    Usa las velas ya cacheadas y corre en un thread.
+    """
+    try:
+        bars = list(candle_cache.series(symbol, interval).closed)[-SMART_HISTORY:]
+        return await asyncio.to_thread(_legacy_row, bars)
+    except Exception as e:
+        logger.error(f"[SmartSignals] ⚠️ Features legacy de {symbol} {interval} no disponibles: {e}")
+        return None
+
+
+async def score_symbols(
+    symbols: Iterable[str],
+    interval: str = SMART_INTERVAL,
+    registry: ModelRegistry = model_registry,
+) -> Dict[str, dict]:
+    """Señal por símbolo con la misma forma que `/smart/signal` (o `error` si no se pudo)."""
+    from app.core.smart_trading_api import apply_dsl_rules
+
+    rows = await feature_rows(symbols, interval)
+    out: Dict[str, dict] = {}
+
+    # Modelos con features fuera del store: fila de `add_indicators` como antes
+    legacy = [
+        s for s, row in rows.items()
+        if row is not None and registry.get(s) is not None and not set(registry.get(s).features) <= set(FEATURES)
+    ]
+    for s, row in zip(legacy, await asyncio.gather(*(legacy_row(s, interval) for s in legacy))):
+        rows[s] = row
+
+    # Agrupar por versión de modelo: una matriz y un predict por booster
+    groups: Dict[int, tuple] = {}
+    for symbol, row in rows.items():
+        mv = registry.get(symbol)
+        if mv is None:
+            out[symbol] = {"symbol": symbol, "error": "No active smart strategy"}
+        elif row is None:
+            out[symbol] = {"symbol": symbol, "error": "No OHLCV data"}
+        elif any(row.get(f) is None for f in mv.features):
+            missing = [f for f in mv.features if row.get(f) is None]
+            out[symbol] = {"symbol": symbol, "error": f"Missing features: {missing}"}
+        else:
+            groups.setdefault(id(mv.booster), (mv, []))[1].append((symbol, row, mv))
+
+    for mv, members in groups.values():
+        X = pd.DataFrame([[row[f] for f in mv.features] for _, row, _ in members], columns=mv.features)
+        t0 = time.perf_counter()
+        try:
+            classes, conf = predict_batch(mv.booster, X)
+        except Exception as e:
+            logger.error(f"[SmartSignals] ❌ Predict falló ({mv.strategy} v{mv.version}): {e}")
+            for symbol, _, _ in members:
+                out[symbol] = {"symbol": symbol, "error": f"Error running model prediction: {e}"}
+            continue
+        ms = (time.perf_counter() - t0) * 1000
+        for (symbol, row, model), pred, c in zip(members, classes, conf):
+            model.record(ms / len(members))
+            pred_dsl = apply_dsl_rules(pd.Series(row), model.dsl)
+            out[symbol] = {
+                "symbol": symbol,
+                "signal": combine_signal(int(pred), float(c), pred_dsl),   # 0=HOLD, 1=BUY, 2=SELL
+                "confidence": float(c),
+                "dsl_signal": pred_dsl,
+                "risk": model.dsl.get("risk", {}),
+                "time": row["time"],
+                "model": {"strategy": model.strategy, "version": model.version, "batch": len(members)},
+            }
+    return out
@@ -0,0 +1,281 @@
+# app/core/symbol_index.py
+"""
+Índice de metadatos de símbolos (exchangeInfo) para normalizar órdenes.
+
+- Se carga una vez (disco primero, para arranques rápidos) y se refresca en
+  background cada `SYMBOL_INDEX_TTL_SEC`; cada refresco se persiste en
+  `SYMBOL_INDEX_PATH`.
+- Acceso O(1) por símbolo a LOT_SIZE, PRICE_FILTER, MIN_NOTIONAL/NOTIONAL y
+  status, ya parseados a `Decimal`.
+- Redondeo de cantidades y precios con aritmética de pasos en `Decimal`
+  (sin `log10` ni errores de float), también por lotes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from decimal import ROUND_DOWN, ROUND_HALF_UP, Decimal
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from app.core.exchange import get_exchange
+
+logger = logging.getLogger(__name__)
+
+SYMBOL_INDEX_TTL_SEC = float(os.getenv("SYMBOL_INDEX_TTL_SEC", "3600"))
+SYMBOL_INDEX_PATH = Path(
+    os.getenv("SYMBOL_INDEX_PATH", str(Path(__file__).resolve().parents[2] / "data" / "exchange_info.cache.json"))
+)
+
+ZERO = Decimal("0")
+
+
+def _dec(value, default: Decimal = ZERO) -> Decimal:
+    try:
+        return Decimal(str(value)).normalize() if value is not None else default
+    except Exception:
+        return default
+
+
+def floor_to_step(value, step: Decimal) -> Decimal:
+    """Múltiplo de `step` más cercano por debajo de `value` (exacto en Decimal)."""
+    v = _dec(value)
+    if step <= 0:
+        return v
+    return ((v / step).to_integral_value(rounding=ROUND_DOWN) * step).quantize(step)
+
+
+def round_to_step(value, step: Decimal) -> Decimal:
+    v = _dec(value)
+    if step <= 0:
+        return v
+    return ((v / step).to_integral_value(rounding=ROUND_HALF_UP) * step).quantize(step)
+
+
+@dataclass(frozen=True)
+class SymbolFilters:
+    symbol: str
+    status: str
+    base_asset: str
+    quote_asset: str
+    step_size: Decimal = ZERO
+    min_qty: Decimal = ZERO
+    max_qty: Decimal = ZERO
+    tick_size: Decimal = ZERO
+    min_price: Decimal = ZERO
+    max_price: Decimal = ZERO
+    min_notional: Decimal = ZERO
+
+    @classmethod
+    def from_exchange_info(cls, s: dict) -> "SymbolFilters":
+        f = {x.get("filterType"): x for x in s.get("filters", [])}
+        lot = f.get("LOT_SIZE", {})
+        price = f.get("PRICE_FILTER", {})
+        notional = f.get("MIN_NOTIONAL") or f.get("NOTIONAL") or {}
+        return cls(
+            symbol=s["symbol"],
+            status=s.get("status", ""),
+            base_asset=s.get("baseAsset", ""),
+            quote_asset=s.get("quoteAsset", ""),
+            step_size=_dec(lot.get("stepSize")),
+            min_qty=_dec(lot.get("minQty")),
+            max_qty=_dec(lot.get("maxQty")),
+            tick_size=_dec(price.get("tickSize")),
+            min_price=_dec(price.get("minPrice")),
+            max_price=_dec(price.get("maxPrice")),
+            min_notional=_dec(notional.get("minNotional")),
+        )
+
+    @property
+    def trading(self) -> bool:
+        return self.status == "TRADING"
+
+    @property
+    def qty_precision(self) -> int:
+        return max(-self.step_size.as_tuple().exponent, 0) if self.step_size > 0 else 8
+
+    @property
+    def price_precision(self) -> int:
+        return max(-self.tick_size.as_tuple().exponent, 0) if self.tick_size > 0 else 8
+
+    def round_qty(self, qty) -> Decimal:
+        q = floor_to_step(qty, self.step_size)
+        if self.max_qty > 0 and q > self.max_qty:
+            q = floor_to_step(self.max_qty, self.step_size)
+        return q if q >= self.min_qty else ZERO
+
+    def round_price(self, price) -> Decimal:
+        return round_to_step(price, self.tick_size)
+
+    def check(self, qty, price) -> Optional[str]:
+        """Motivo por el que la orden sería rechazada, o None si pasa los filtros."""
+        q, p = _dec(qty), _dec(price)
+        if not self.trading:
+            return f"status {self.status}"
+        if q <= 0 or q < self.min_qty:
+            return f"qty {q} < minQty {self.min_qty}"
+        if self.min_notional > 0 and q * p < self.min_notional:
+            return f"notional {q * p} < minNotional {self.min_notional}"
+        return None
+
+
+class SymbolIndex:
+    def __init__(self, path: Path = SYMBOL_INDEX_PATH, ttl: float = SYMBOL_INDEX_TTL_SEC):
+        self.path = path
+        self.ttl = ttl
+        self._by_symbol: Dict[str, SymbolFilters] = {}
+        self.loaded_at: Optional[float] = None  # epoch (se conserva al leer de disco)
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    # -----------------------------
+    # Carga
+    # -----------------------------
+    def load(self, exchange_info: dict, loaded_at: Optional[float] = None):
+        self._by_symbol = {
+            s["symbol"]: SymbolFilters.from_exchange_info(s)
+            for s in exchange_info.get("symbols", []) if s.get("symbol")
+        }
+        self.loaded_at = loaded_at or time.time()
+
+    def load_disk(self) -> bool:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f)
+            self.load(raw["exchange_info"], raw.get("loaded_at"))
+            logger.info(f"[SymbolIndex] 💾 {len(self._by_symbol)} símbolos desde {self.path.name}")
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.error(f"[SymbolIndex] ⚠️ Caché en disco inválida: {e}")
+            return False
+
+    def _save_disk(self, exchange_info: dict):
+        # Sólo lo que usa el índice: el exchangeInfo completo pesa varios MB
+        slim = {
+            "symbols": [
+                {k: s.get(k) for k in ("symbol", "status", "baseAsset", "quoteAsset", "filters")}
+                for s in exchange_info.get("symbols", [])
+            ]
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"loaded_at": self.loaded_at, "exchange_info": slim}, f)
+        os.replace(tmp, self.path)
+
+    async def refresh(self):
+        info = await get_exchange().exchange_info()
+        self.load(info)
+        try:
+            await asyncio.to_thread(self._save_disk, info)
+        except Exception as e:
+            logger.error(f"[SymbolIndex] ⚠️ No se pudo persistir exchangeInfo: {e}")
+        logger.info(f"[SymbolIndex] 🔄 exchangeInfo actualizado ({len(self._by_symbol)} símbolos)")
+
+    @property
+    def stale(self) -> bool:
+        return self.loaded_at is None or time.time() - self.loaded_at > self.ttl
+
+    async def ensure(self):
+        """Garantiza un índice cargado: disco si está vacío; red sólo si no hay nada."""
+        if self._by_symbol:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._by_symbol or self.load_disk():
+                return
+            await self.refresh()
+
+    async def _run(self):
+        while True:
+            try:
+                if self.stale:
+                    await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[SymbolIndex] ⚠️ Error refrescando exchangeInfo: {e}")
+            await asyncio.sleep(max(min(self.ttl / 4, 300.0), 5.0))
+
+    def start(self):
+        if not self._by_symbol:
+            self.load_disk()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # -----------------------------
+    # Lectura
+    # -----------------------------
+    def get(self, symbol: str) -> Optional[SymbolFilters]:
+        return self._by_symbol.get(symbol.upper())
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self._by_symbol
+
+    def __len__(self) -> int:
+        return len(self._by_symbol)
+
+    def symbols(self, quote: Optional[str] = None, trading_only: bool = True) -> list[str]:
+        return [
+            s for s, f in self._by_symbol.items()
+            if (not trading_only or f.trading) and (quote is None or f.quote_asset == quote)
+        ]
+
+    def round_qty(self, symbol: str, qty) -> float:
+        """Cantidad válida para LOT_SIZE (0.0 si queda por debajo de minQty o el símbolo no existe)."""
+        f = self.get(symbol)
+        return float(f.round_qty(qty)) if f else 0.0
+
+    def round_price(self, symbol: str, price) -> float:
+        f = self.get(symbol)
+        return float(f.round_price(price)) if f else float(price)
+
+    def round_quantities(self, symbols: Iterable[str], qtys: Iterable[float]) -> list[float]:
+        """Redondeo por lotes: cuenta de pasos con NumPy, reconstrucción exacta con Decimal."""
+        symbols = list(symbols)
+        filters = [self.get(s) for s in symbols]
+        steps = np.array([float(f.step_size) if f and f.step_size > 0 else 0.0 for f in filters])
+        q = np.asarray(list(qtys), dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # margen relativo para no perder un paso por 0.3/0.1 = 2.9999…
+            counts = np.where(steps > 0, np.floor(q / steps * (1 + 1e-12)), 0)
+        out = []
+        for f, n, raw in zip(filters, counts, q):
+            if f is None:
+                out.append(0.0)
+            elif f.step_size > 0:
+                out.append(float(f.round_qty(Decimal(int(n)) * f.step_size)))
+            else:
+                out.append(float(f.round_qty(raw)))
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self._by_symbol),
+            "age_sec": round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+            "ttl_sec": self.ttl,
+            "path": str(self.path),
+            "running": bool(self._task and not self._task.done()),
+        }
+
+
+symbol_index = SymbolIndex()
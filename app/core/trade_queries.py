@@ -0,0 +1,88 @@
+# app/core/trade_queries.py
+"""
+Consultas set-based sobre posiciones cerradas y sus trades.
+
+En vez de dos `select(Trade)` por posición (primer y último trade), una sola
+consulta trae el primer y último trade como subconsultas correlacionadas
+resueltas sobre el índice (position_id, created_at): el costo de cada página
+depende de su tamaño y no del histórico. Paginación keyset sobre
+(closed_at DESC, id DESC).
+"""
+
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select
+
+from app.core.models import Position, Trade
+
+
+def _edge(column, first: bool):
+    """Valor del primer/último trade de la posición (usa ix_trades_position_created)."""
+    order = Trade.created_at.asc() if first else Trade.created_at.desc()
+    return (
+        select(column)
+        .where(Trade.position_id == Position.id)
+        .order_by(order, Trade.id.asc() if first else Trade.id.desc())
+        .limit(1)
+        .correlate(Position)
+        .scalar_subquery()
+    )
+
+
+def closed_positions_query(symbol: Optional[str] = None, since: Optional[datetime] = None):
+    """
+    Posiciones CLOSED con precio/fees del primer y último trade en columnas:
+    (Position, entry_trade_price, entry_trade_fees, exit_trade_price, exit_trade_fees)
+    """
+    stmt = (
+        select(
+            Position,
+            _edge(Trade.price, True).label("entry_trade_price"),
+            _edge(Trade.fees, True).label("entry_trade_fees"),
+            _edge(Trade.price, False).label("exit_trade_price"),
+            _edge(Trade.fees, False).label("exit_trade_fees"),
+        )
+        .where(Position.status == "CLOSED")
+    )
+    if symbol:
+        stmt = stmt.where(Position.symbol == symbol)
+    if since:
+        stmt = stmt.where(Position.closed_at >= since)
+    return stmt
+
+
+# =============================
+# Keyset cursor
+# =============================
+def encode_cursor(closed_at: Optional[datetime], pos_id: int) -> str:
+    raw = f"{closed_at.isoformat() if closed_at else ''}|{pos_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[datetime], int]:
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    ts, pos_id = raw.split("|", 1)
+    return (datetime.fromisoformat(ts) if ts else None), int(pos_id)
+
+
+def after_cursor(stmt, cursor: Optional[str]):
+    """Orden (closed_at DESC, id DESC), NULLs al final, continuando después de `cursor`."""
+    stmt = stmt.order_by(Position.closed_at.desc().nulls_last(), Position.id.desc())
+    if not cursor:
+        return stmt
+    try:
+        ts, pos_id = decode_cursor(cursor)
+    except ValueError:  # base64/utf-8/iso/int inválidos
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if ts is None:
+        return stmt.where(Position.closed_at.is_(None), Position.id < pos_id)
+    return stmt.where(or_(
+        Position.closed_at < ts,
+        and_(Position.closed_at == ts, Position.id < pos_id),
+        Position.closed_at.is_(None),
+    ))
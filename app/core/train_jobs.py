@@ -0,0 +1,450 @@
+# app/core/train_jobs.py
+"""
+Servicio de entrenamiento fuera del event loop.
+
+Cada entrenamiento SmartTrading es un job con id propio que corre en un
+proceso aparte (contexto `spawn`, prioridad baja y hilos de BLAS/OpenMP
+acotados). Como mucho `TRAIN_MAX_JOBS` procesos a la vez; el resto espera en
+cola. Cancelar un job en cola lo descarta y uno en curso termina su proceso
+(y el pool de la búsqueda).
+
+- Motor: `smart_search` (paralelo, successive halving, `TRAIN_CPU_PER_JOB`
+  workers) o `smart_train_and_export` con `engine="legacy"`.
+- `mode="incremental"`: warm start sobre `base_manifest` con sólo las velas
+  nuevas; `result.improved` indica si se publicó una versión nueva.
+
+- Estado persistido en `train_jobs` (escrito por el escritor único de la DB).
+- Progreso: los workers publican en una cola multiprocessing; una tarea la
+  reparte a los suscriptores (`subscribe(job_id)`), p. ej. `/ws/smart/retrain`.
+- Los eventos usan el mismo formato que los mensajes WS:
+  {"job_id", "status": queued|running|progress|done|error|cancelled, ...}.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import multiprocessing as mp
+import os
+import signal
+import time
+import traceback
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import JSON, Column, DateTime, Integer, String, Text, select
+
+from app.core.db import Base
+from app.core.db_writer import get_writer, read_session
+
+logger = logging.getLogger(__name__)
+
+TRAIN_MAX_JOBS = int(os.getenv("TRAIN_MAX_JOBS", "1"))
+TRAIN_CPU_PER_JOB = int(os.getenv("TRAIN_CPU_PER_JOB", str(max(1, (os.cpu_count() or 2) // 2))))
+TRAIN_NICE = int(os.getenv("TRAIN_NICE", "10"))
+SMART_TRAIN_ENGINE = os.getenv("SMART_TRAIN_ENGINE", "search")   # search | legacy
+PROGRESS_PERSIST_SEC = 1.0
+
+TERMINAL = ("done", "error", "cancelled")
+
+
+class TrainJob(Base):
+    __tablename__ = "train_jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(16), nullable=False, default="smart")
+    pair = Column(String(20), nullable=True)
+    timeframe = Column(String(8), nullable=True)
+    status = Column(String(12), nullable=False, default="queued", index=True)
+    progress = Column(Integer, nullable=False, default=0)
+    message = Column(Text, nullable=True)
+    params = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "pair": self.pair,
+            "timeframe": self.timeframe,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def train_params(cfg: dict) -> dict:
+    """Payload del frontend (camelCase) → parámetros serializables del job."""
+    return {
+        "data_path": cfg["dataPath"],
+        "pair": cfg["pair"],
+        "timeframe": cfg.get("timeframe", "1h"),
+        "outdir": cfg.get("outdir", "artifacts"),
+        "max_combinations": int(cfg.get("maxCombinations", 200)),
+        "engine": cfg.get("engine", SMART_TRAIN_ENGINE),
+        "mode": cfg.get("mode", "full"),               # full | incremental (warm start)
+        "base_manifest": cfg.get("baseManifest"),
+        "rules": {
+            "min_accuracy": float(cfg.get("minAccuracy", 0.7)),
+            "min_profit": float(cfg.get("minProfit", 0.05)),
+            "profit_target": float(cfg.get("profitTarget", 0.1)),
+            "stop_loss": float(cfg.get("stopLoss", 0.05)),
+            "delta_t": int(cfg.get("deltaT", 60)),
+            "trailing_enabled": bool(cfg.get("trailingEnabled", True)),
+            "trailing_distance": float(cfg.get("trailingDistance", 0.01)),
+        },
+    }
+
+
+# =============================
+# Proceso worker
+# =============================
+class _Ready:
+    """Awaitable ya resuelto: el callback sirve tanto si el entrenador lo await-ea como si no."""
+
+    def __await__(self):
+        return iter(())
+
+
+def _search_and_export(params: dict, cpu_limit: int, progress) -> str:
+    from app.core.smart_search import SmartSearch
+
+    search = SmartSearch(
+        data_path=params["data_path"], rules=params["rules"],
+        max_combinations=params["max_combinations"], workers=cpu_limit,
+    )
+    results = search.run(progress)
+    return search.export(results, params["pair"], params["timeframe"], params["outdir"])
+
+
+def _warm_start(params: dict, cpu_limit: int, progress) -> dict:
+    from app.core.smart_search import warm_start
+
+    return warm_start(
+        params["base_manifest"], params["data_path"], params["rules"], params["outdir"],
+        nthread=cpu_limit, progress=progress,
+    )
+
+
+def _legacy_train(params: dict, progress) -> str:
+    from app.core.smart_trading_api import GoldenRules, smart_train_and_export
+
+    res = smart_train_and_export(
+        data_path=params["data_path"],
+        pair=params["pair"],
+        timeframe=params["timeframe"],
+        outdir=params["outdir"],
+        rules=GoldenRules(**params["rules"]),
+        max_combinations=params["max_combinations"],
+        progress_callback=progress,
+    )
+    if inspect.isawaitable(res):
+        res = asyncio.run(res)
+    return res
+
+
+def _train_worker(job_id: str, params: dict, events, cpu_limit: int):
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(cpu_limit)
+    if hasattr(os, "nice"):
+        os.nice(TRAIN_NICE)
+
+    def on_term(signum, frame):
+        # cancelar el job también termina el pool de la búsqueda
+        for child in mp.active_children():
+            child.terminate()
+        os._exit(1)
+
+    signal.signal(signal.SIGTERM, on_term)
+
+    def progress(current: int, total: int, message: str):
+        events.put({
+            "job_id": job_id,
+            "status": "progress",
+            "progress": int(current / max(total, 1) * 100),
+            "message": message,
+        })
+        return _Ready()
+
+    try:
+        if params.get("mode") == "incremental":
+            result = _warm_start(params, cpu_limit, progress)
+        elif params.get("engine", SMART_TRAIN_ENGINE) == "legacy":
+            result = {"manifest_path": _legacy_train(params, progress)}
+        else:
+            result = {"manifest_path": _search_and_export(params, cpu_limit, progress)}
+        events.put({"job_id": job_id, "status": "done", "progress": 100, "result": result})
+    except Exception as e:
+        events.put({"job_id": job_id, "status": "error", "message": str(e), "traceback": traceback.format_exc()})
+
+
+# =============================
+# Servicio
+# =============================
+async def _update_job(session, job_id: str, **fields):
+    job = await session.get(TrainJob, job_id)
+    if job is None:
+        return None
+    for k, v in fields.items():
+        setattr(job, k, v)
+    return job_id
+
+
+async def _insert_job(session, job: TrainJob):
+    session.add(job)
+    return job.id
+
+
+async def _fail_stale(session):
+    rows = (await session.execute(
+        select(TrainJob).where(TrainJob.status.in_(("queued", "running")))
+    )).scalars().all()
+    for job in rows:
+        job.status = "error"
+        job.error = "Interrumpido por reinicio del backend"
+        job.finished_at = datetime.utcnow()
+    return len(rows)
+
+
+class TrainingService:
+    def __init__(self, max_jobs: int = TRAIN_MAX_JOBS, cpu_per_job: int = TRAIN_CPU_PER_JOB):
+        self.max_jobs = max_jobs
+        self.cpu_per_job = cpu_per_job
+        self._ctx = mp.get_context("spawn")
+        self._events = None
+        self._pump_task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._procs: Dict[str, mp.process.BaseProcess] = {}
+        self._results: Dict[str, asyncio.Future] = {}   # evento terminal enviado por el worker
+        self._subs: Dict[str, set] = {}
+        self._last: Dict[str, dict] = {}
+        self._persisted_at: Dict[str, float] = {}
+        self._queued: deque = deque()
+        self._on_done: list[Callable[[dict, dict], Awaitable]] = []
+        self.completed = 0
+        self.failed = 0
+
+    # -----------------------------
+    # Eventos
+    # -----------------------------
+    def _publish(self, ev: dict):
+        job_id = ev["job_id"]
+        if ev["status"] in TERMINAL:
+            self._last.pop(job_id, None)   # desde acá el estado se lee de la DB
+            self._persisted_at.pop(job_id, None)
+        else:
+            self._last[job_id] = ev
+        for q in self._subs.get(job_id, ()):
+            q.put_nowait(ev)
+
+    async def _persist(self, ev: dict):
+        job_id, status = ev["job_id"], ev["status"]
+        fields = {"message": ev.get("message")}
+        if status == "progress":
+            now = time.monotonic()
+            if now - self._persisted_at.get(job_id, 0.0) < PROGRESS_PERSIST_SEC:
+                return
+            self._persisted_at[job_id] = now
+            fields["progress"] = ev["progress"]
+        else:
+            fields["status"] = status
+            if status == "running":
+                fields["started_at"] = datetime.utcnow()
+            if status in TERMINAL:
+                fields["finished_at"] = datetime.utcnow()
+                fields["result"] = ev.get("result")
+                fields["error"] = ev.get("message") if status == "error" else None
+                if status == "done":
+                    fields["progress"] = 100
+        try:
+            await get_writer().execute(_update_job, job_id, **fields)
+        except Exception as e:
+            logger.error(f"[TrainJobs] ⚠️ No se pudo persistir {job_id}: {e}")
+
+    async def _emit(self, ev: dict):
+        await self._persist(ev)
+        self._publish(ev)
+
+    async def _pump(self):
+        """Cola multiprocessing → suscriptores (lectura bloqueante en un hilo)."""
+        while True:
+            ev = await asyncio.to_thread(self._events.get)
+            if ev is None:
+                return
+            if ev["status"] in TERMINAL:
+                # `_run` lo emite después de recoger el proceso
+                fut = self._results.get(ev["job_id"])
+                if fut and not fut.done():
+                    fut.set_result(ev)
+                continue
+            await self._emit(ev)
+
+    # -----------------------------
+    # Jobs
+    # -----------------------------
+    async def submit(self, params: dict, kind: str = "smart") -> str:
+        job_id = uuid.uuid4().hex
+        await get_writer().execute(_insert_job, TrainJob(
+            id=job_id, kind=kind, pair=(params.get("pair") or "").upper() or None, timeframe=params.get("timeframe"),
+            status="queued", params=params, created_at=datetime.utcnow(),
+        ))
+        self._results[job_id] = asyncio.get_running_loop().create_future()
+        self._queued.append(job_id)
+        self._publish({"job_id": job_id, "status": "queued", "progress": 0, "message": "En cola"})
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, params))
+        logger.info(f"[TrainJobs] 📥 Job {job_id} en cola ({params.get('pair')} {params.get('timeframe')})")
+        return job_id
+
+    async def _run(self, job_id: str, params: dict):
+        result = self._results[job_id]
+        try:
+            async with self._slots:
+                self._queued.remove(job_id)
+                proc = self._ctx.Process(
+                    target=_train_worker, args=(job_id, params, self._events, self.cpu_per_job)
+                )   # no daemon: la búsqueda abre su propio pool de procesos
+                proc.start()
+                self._procs[job_id] = proc
+                await self._emit({"job_id": job_id, "status": "running", "progress": 0, "message": f"PID {proc.pid}"})
+
+                # Resultado por la cola o muerte del proceso sin avisar (OOM, crash)
+                while not result.done() and proc.is_alive():
+                    await asyncio.wait({result}, timeout=1.0)
+                if not result.done():
+                    await asyncio.wait({result}, timeout=2.0)   # eventos en vuelo tras la salida
+                await asyncio.to_thread(proc.join, 5)
+                ev = result.result() if result.done() else {
+                    "job_id": job_id, "status": "error", "message": f"Proceso terminó con código {proc.exitcode}",
+                }
+            await self._emit(ev)
+            if ev["status"] == "done":
+                self.completed += 1
+                for cb in self._on_done:
+                    asyncio.create_task(cb(params, ev))
+            else:
+                self.failed += 1
+        except asyncio.CancelledError:
+            if job_id in self._queued:
+                self._queued.remove(job_id)
+            await self._emit({"job_id": job_id, "status": "cancelled", "message": "Cancelado"})
+        finally:
+            proc = self._procs.pop(job_id, None)
+            if proc is not None and proc.is_alive():
+                proc.terminate()
+            self._tasks.pop(job_id, None)
+            self._results.pop(job_id, None)
+
+    def on_done(self, cb: Callable[[dict, dict], Awaitable]):
+        """Registra `cb(params, evento)` para cada job terminado con éxito."""
+        self._on_done.append(cb)
+
+    async def cancel(self, job_id: str) -> bool:
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+        proc = self._procs.get(job_id)
+        if proc is not None and proc.is_alive():
+            proc.terminate()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        logger.info(f"[TrainJobs] 🛑 Job {job_id} cancelado")
+        return True
+
+    async def wait(self, job_id: str) -> dict:
+        """Espera el evento terminal del job."""
+        async for ev in self.subscribe(job_id):
+            if ev["status"] in TERMINAL:
+                return ev
+        return {"job_id": job_id, "status": "error", "message": "Job desconocido"}
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[dict]:
+        """Último evento conocido y los siguientes, hasta el terminal."""
+        q: asyncio.Queue = asyncio.Queue()
+        last = self._last.get(job_id)
+        if last is None:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            last = {"job_id": job_id, **{k: job[k] for k in ("status", "progress", "message", "result")}}
+        q.put_nowait(last)
+        self._subs.setdefault(job_id, set()).add(q)
+        try:
+            while True:
+                ev = await q.get()
+                yield ev
+                if ev["status"] in TERMINAL:
+                    return
+        finally:
+            self._subs[job_id].discard(q)
+            if not self._subs[job_id]:
+                self._subs.pop(job_id, None)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        async with read_session() as session:
+            job = await session.get(TrainJob, job_id)
+            return job.as_dict() if job else None
+
+    async def latest_manifest(self, pair: str) -> Optional[str]:
+        """Manifest del último entrenamiento exitoso del par."""
+        async with read_session() as session:
+            job = (await session.execute(
+                select(TrainJob)
+                .where(TrainJob.pair == pair.upper(), TrainJob.status == "done")
+                .order_by(TrainJob.finished_at.desc())
+                .limit(1)
+            )).scalars().first()
+            return (job.result or {}).get("manifest_path") if job else None
+
+    async def list(self, limit: int = 50) -> list[dict]:
+        async with read_session() as session:
+            rows = (await session.execute(
+                select(TrainJob).order_by(TrainJob.created_at.desc()).limit(limit)
+            )).scalars().all()
+            return [j.as_dict() for j in rows]
+
+    # -----------------------------
+    # Ciclo de vida
+    # -----------------------------
+    async def start(self):
+        if self._pump_task:
+            return
+        stale = await get_writer().execute(_fail_stale)
+        if stale:
+            logger.warning(f"[TrainJobs] ⚠️ {stale} jobs interrumpidos marcados como error")
+        self._events = self._ctx.Queue()
+        self._slots = asyncio.Semaphore(self.max_jobs)
+        self._pump_task = asyncio.create_task(self._pump())
+
+    async def stop(self):
+        for job_id in list(self._tasks):
+            await self.cancel(job_id)
+        if self._pump_task:
+            self._events.put(None)
+            await asyncio.gather(self._pump_task, return_exceptions=True)
+            self._pump_task = None
+
+    def stats(self) -> dict:
+        return {
+            "max_jobs": self.max_jobs,
+            "cpu_per_job": self.cpu_per_job,
+            "running": [j for j, p in self._procs.items() if p.is_alive()],
+            "queued": list(self._queued),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+training_service = TrainingService()
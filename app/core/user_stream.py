@@ -0,0 +1,194 @@
+# app/core/user_stream.py
+"""
+User-data stream de Binance (eventos de nuestra cuenta) y estado en memoria.
+
+- `BinanceUserDataStream`: obtiene un listenKey, lo renueva cada 30 min y
+  entrega los eventos (`executionReport`, `outboundAccountPosition`,
+  `balanceUpdate`) con reconexión automática.
+- `ReplayUserDataStream`: reproduce eventos grabados (JSONL) para pruebas.
+- `AccountState`: balances y órdenes abiertas de la cuenta, sembrados con un
+  snapshot REST y mantenidos con los deltas del stream.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, Optional
+
+import websockets
+
+from app.core.config import settings
+from app.core.exchange import get_exchange
+from app.core.liquidation import resolve_fill
+
+logger = logging.getLogger(__name__)
+
+WS_URL_MAINNET = "wss://stream.binance.com:9443/ws"
+WS_URL_TESTNET = "wss://stream.testnet.binance.vision/ws"
+LISTEN_KEY_RENEW_SEC = 30 * 60
+
+
+class BinanceUserDataStream:
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or (WS_URL_TESTNET if settings.BINANCE_TESTNET else WS_URL_MAINNET)
+        self.listen_key: Optional[str] = None
+        self.connected = False
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(LISTEN_KEY_RENEW_SEC)
+            try:
+                await get_exchange().renew_listen_key(self.listen_key)
+            except Exception as e:
+                logger.error(f"[UserStream] ⚠️ No se pudo renovar listenKey: {e}")
+
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        backoff = 1
+        while True:
+            keepalive = None
+            try:
+                self.listen_key = (await get_exchange().new_listen_key())["listenKey"]
+                keepalive = asyncio.create_task(self._keepalive())
+                async with websockets.connect(f"{self.url}/{self.listen_key}", ping_interval=20) as ws:
+                    logger.info("[UserStream] 🔗 Conectado al user-data stream")
+                    self.connected = True
+                    backoff = 1
+                    # Marca de (re)conexión: el consumidor re-siembra con un snapshot REST
+                    yield {"e": "streamConnected", "E": int(time.time() * 1000)}
+                    async for raw in ws:
+                        msg = json.loads(raw)
+                        yield msg.get("data", msg)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[UserStream] ⚠️ Conexión perdida: {e}. Reintentando en {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                self.connected = False
+                if keepalive:
+                    keepalive.cancel()
+
+
+class ReplayUserDataStream:
+    """Reproduce eventos grabados (una línea JSON por evento). `speed=0` sin pausas."""
+
+    def __init__(self, source: str | Path | Iterable[dict], speed: float = 0.0):
+        self.source = source
+        self.speed = speed
+        self.connected = True
+
+    def _messages(self) -> Iterable[dict]:
+        if isinstance(self.source, (str, Path)):
+            with open(self.source, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            yield from self.source
+
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        for msg in self._messages():
+            await asyncio.sleep(self.speed)
+            yield msg.get("data", msg)
+
+
+# =============================
+# Estado de la cuenta
+# =============================
+@dataclass
+class AccountDelta:
+    assets: set = field(default_factory=set)          # activos con balance modificado
+    fills: Dict[str, dict] = field(default_factory=dict)  # symbol -> último fill {price, side, qty, fees}
+
+
+class AccountState:
+    def __init__(self):
+        self.balances: Dict[str, tuple[float, float]] = {}   # asset -> (free, locked)
+        self.open_orders: Dict[int, dict] = {}
+        self.last_event_ms: Optional[int] = None
+        self.seeded_at: Optional[float] = None
+        self.events = 0
+
+    def seed(self, account: dict, open_orders: Optional[list] = None):
+        self.balances = {
+            b["asset"]: (float(b["free"]), float(b["locked"])) for b in account.get("balances", [])
+        }
+        if open_orders is not None:
+            self.open_orders = {int(o["orderId"]): o for o in open_orders}
+        self.seeded_at = time.time()
+
+    def total(self, asset: str) -> float:
+        free, locked = self.balances.get(asset, (0.0, 0.0))
+        return free + locked
+
+    @property
+    def live(self) -> bool:
+        return self.seeded_at is not None
+
+    def apply(self, ev: dict) -> AccountDelta:
+        delta = AccountDelta()
+        kind = ev.get("e")
+        if kind is None:
+            return delta
+        self.events += 1
+        self.last_event_ms = ev.get("E", self.last_event_ms)
+
+        if kind == "outboundAccountPosition":
+            for b in ev.get("B", []):
+                self.balances[b["a"]] = (float(b["f"]), float(b["l"]))
+                delta.assets.add(b["a"])
+
+        elif kind == "balanceUpdate":
+            free, locked = self.balances.get(ev["a"], (0.0, 0.0))
+            self.balances[ev["a"]] = (free + float(ev["d"]), locked)
+            delta.assets.add(ev["a"])
+
+        elif kind == "executionReport":
+            order_id = int(ev["i"])
+            status = ev.get("X")
+            order = {
+                "symbol": ev["s"],
+                "orderId": order_id,
+                "side": ev.get("S"),
+                "type": ev.get("o"),
+                "status": status,
+                "executedQty": ev.get("z"),
+                "cummulativeQuoteQty": ev.get("Z"),
+            }
+            if status in ("NEW", "PARTIALLY_FILLED"):
+                self.open_orders[order_id] = order
+            else:
+                self.open_orders.pop(order_id, None)
+            if ev.get("x") == "TRADE" and float(ev.get("l", 0) or 0) > 0:
+                delta.fills[ev["s"]] = {
+                    "price": float(ev["L"]),
+                    "qty": float(ev["l"]),
+                    "side": ev.get("S"),
+                    "commission": float(ev.get("n") or 0.0),
+                    "commission_asset": ev.get("N"),
+                }
+            # Confirmación para quien espera el fill (stop-all)
+            resolve_fill(order_id, order)
+
+        return delta
+
+    def snapshot(self) -> dict:
+        return {
+            "live": self.live,
+            "events": self.events,
+            "last_event_age_ms": (
+                round(time.time() * 1000 - self.last_event_ms, 1) if self.last_event_ms else None
+            ),
+            "seeded_age_sec": round(time.time() - self.seeded_at, 1) if self.seeded_at else None,
+            "balances": {a: round(f + l, 8) for a, (f, l) in self.balances.items() if f + l > 0},
+            "open_orders": len(self.open_orders),
+        }
+
+
+account_state = AccountState()
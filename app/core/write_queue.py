@@ -0,0 +1,235 @@
+# app/core/write_queue.py
+"""
+Persistencia write-behind para inserts de alto volumen (DecisionLog, Trade,
+EquitySnapshot).
+
+Los llamadores encolan objetos ORM y siguen; una tarea única los vuelca en
+transacciones por lotes cuando se junta `WRITE_QUEUE_MAX_BATCH` filas o pasa
+`WRITE_QUEUE_FLUSH_SEC`. El commit lo hace el escritor único (`db_writer`),
+local o remoto. Como se insertan por la sesión ORM, los hooks
+`before_flush` (rollups de equity, agregados de PnL) siguen funcionando.
+
+- `submit(obj)`: fire-and-forget (devuelve un future que se resuelve al commit).
+- `await write(obj)` / `await flush()`: read-your-writes para quien lo necesite.
+- Un error no transitorio parte el lote en mitades: sólo se descartan las
+  filas que realmente fallan.
+- SQLite: WAL + synchronous=NORMAL + busy_timeout en cada conexión nueva.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app.core.db import engine
+from app.core.db_writer import get_writer, orm_row
+
+logger = logging.getLogger(__name__)
+
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "500"))
+WRITE_QUEUE_FLUSH_SEC = float(os.getenv("WRITE_QUEUE_FLUSH_SEC", "0.5"))
+WRITE_QUEUE_MAX_DEPTH = int(os.getenv("WRITE_QUEUE_MAX_DEPTH", "20000"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+# =============================
+# Pragmas SQLite
+# =============================
+_pragmas_installed = False
+
+
+def install_sqlite_pragmas(target_engine=engine):
+    """WAL (lectores no bloquean al escritor), fsync en checkpoint y espera ante locks."""
+    global _pragmas_installed
+    if _pragmas_installed or target_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(target_engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
+
+    _pragmas_installed = True
+
+
+# =============================
+# Cola
+# =============================
+async def _add_all(session, objs: list):
+    session.add_all(objs)
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        writer=None,
+        max_batch: int = WRITE_QUEUE_MAX_BATCH,
+        flush_interval: float = WRITE_QUEUE_FLUSH_SEC,
+        max_depth: int = WRITE_QUEUE_MAX_DEPTH,
+    ):
+        self.writer = writer   # None → escritor único del proceso (`get_writer()`)
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_depth = max_depth
+        self._buffer: deque = deque()   # (obj, future)
+        self._wake: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        # métricas
+        self.rows_written = 0
+        self.batches = 0
+        self.errors = 0
+        self.latencies: deque = deque(maxlen=200)
+        self.last_flush: Optional[float] = None
+
+    def _ensure_primitives(self):
+        if self._wake is None:
+            self._wake = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+
+    # -----------------------------
+    # Encolar
+    # -----------------------------
+    def submit(self, obj) -> asyncio.Future:
+        self._ensure_primitives()
+        fut = asyncio.get_running_loop().create_future()
+        self._buffer.append((obj, fut))
+        if len(self._buffer) >= self.max_batch:
+            self._wake.set()
+        return fut
+
+    def submit_many(self, objs: Iterable) -> list[asyncio.Future]:
+        return [self.submit(o) for o in objs]
+
+    async def write(self, obj):
+        """Encola y espera el commit del lote que lo contiene (read-your-writes)."""
+        fut = self.submit(obj)
+        await self.flush()
+        return await fut
+
+    # -----------------------------
+    # Volcado
+    # -----------------------------
+    async def flush(self) -> int:
+        """Vuelca todo lo pendiente; devuelve filas escritas."""
+        self._ensure_primitives()
+        written = 0
+        async with self._flush_lock:
+            while self._buffer:
+                n = min(len(self._buffer), self.max_batch)
+                batch = [self._buffer.popleft() for _ in range(n)]
+                written += await self._write_batch(batch)
+        return written
+
+    async def _commit(self, objs: list):
+        writer = self.writer or get_writer()
+        if writer.remote:
+            # Otro proceso es dueño de la DB: filas serializadas por modelo
+            by_model: dict[str, list] = {}
+            for obj in objs:
+                by_model.setdefault(type(obj).__name__, []).append(orm_row(obj))
+            for model, rows in by_model.items():
+                await writer.call("insert_rows", model=model, rows=rows)
+        else:
+            await writer.execute(_add_all, objs)
+
+    async def _write_batch(self, batch: list) -> int:
+        t0 = time.perf_counter()
+        for attempt in range(3):
+            try:
+                await self._commit([obj for obj, _ in batch])
+                break
+            except OperationalError as e:
+                # "database is locked": reintento corto antes de fallar el lote
+                if attempt == 2:
+                    return self._fail(batch, e)
+                await asyncio.sleep(0.1 * (attempt + 1))
+            except Exception as e:
+                if len(batch) == 1:
+                    return self._fail(batch, e)
+                # error no transitorio (p. ej. IntegrityError): bisección para aislar
+                # las filas malas sin descartar el resto del lote
+                logger.warning(f"[WriteQueue] ⚠️ Lote de {len(batch)} filas rechazado ({e}); reintentando por mitades")
+                mid = len(batch) // 2
+                return await self._write_batch(batch[:mid]) + await self._write_batch(batch[mid:])
+
+        self.latencies.append((time.perf_counter() - t0) * 1000)
+        self.rows_written += len(batch)
+        self.batches += 1
+        self.last_flush = time.time()
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_result(None)
+        return len(batch)
+
+    def _fail(self, batch: list, e: Exception) -> int:
+        self.errors += 1
+        logger.error(f"[WriteQueue] ❌ {len(batch)} fila(s) descartada(s): {e}")
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(e)
+                fut.exception()  # marcada como recuperada: los fire-and-forget no la esperan
+        return 0
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"[WriteQueue] ⚠️ Error en flush: {e}")
+            if len(self._buffer) > self.max_depth:
+                logger.warning(f"[WriteQueue] ⚠️ Cola por encima de {self.max_depth} filas ({len(self._buffer)})")
+
+    def start(self):
+        self._ensure_primitives()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # -----------------------------
+    # Métricas
+    # -----------------------------
+    def stats(self) -> dict:
+        lat = sorted(self.latencies)
+        return {
+            "depth": len(self._buffer),
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "errors": self.errors,
+            "avg_batch": round(self.rows_written / self.batches, 1) if self.batches else 0.0,
+            "flush_p50_ms": round(lat[len(lat) // 2], 2) if lat else None,
+            "flush_p95_ms": round(lat[min(int(len(lat) * 0.95), len(lat) - 1)], 2) if lat else None,
+            "last_flush_age_sec": round(time.time() - self.last_flush, 1) if self.last_flush else None,
+            "running": bool(self._task and not self._task.done()),
+        }
+
+
+# Antes de que el pool abra conexiones: todas nacen con los pragmas
+install_sqlite_pragmas()
+
+write_queue = WriteBehindQueue()
@@ -2,19 +2,33 @@
 
 from __future__ import annotations
 import asyncio
-import re
+import os
+import time
 import logging
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import yaml
 from sqlalchemy import select
 
 # Core imports
-from app.core.indicators import add_indicators
+from app.core.indicator_state import indicator_states, periods_from_params
+from app.core.candle_store import interval_ms
+from app.core.kline_stream import BinanceKlineStream, ReplayKlineStream
+from app.core.rule_compiler import compile_condition, compile_formula, formula_for_symbol
 from app.core.config import settings
 from app.core.binance_client import get_spot
 from app.core.market import get_active_symbols
 from app.core.db import SessionLocal
-from app.core.models import TradingConfig, Position
+from app.core.models import TradingConfig, Position, DecisionLog
 from app.core.order_service import open_market_quote, close_position_market
+from app.core import pnl_stats  # noqa: F401 - registra el hook de agregados al cerrar posiciones
+from app.core.write_queue import write_queue
+from app.core.db_writer import connect_remote, get_writer
+from app.core.model_registry import STRATEGIES, model_registry
+from app.core.smart_signals import score_symbols
+from app.core.train_jobs import training_service
 
 # ======================================================
 # Variables globales
@@ -22,6 +36,11 @@ from app.core.order_service import open_market_quote, close_position_market
 last_signal_time: dict[str, datetime] = {}
 RSI_COOLDOWN = 120  # segundos
 TRADE_USDT_AMOUNT = 50  # valor fijo por orden
+HISTORY_BARS = 100  # velas para sembrar el estado de indicadores (una sola vez)
+SMART_LIVE_TRADING = os.getenv("BOT_SMART_LIVE", "0") == "1"  # opt-in: órdenes reales desde fórmulas SMART
+SMART_ACTIONS = {1: "BUY", 2: "SELL"}  # clases del modelo (0=HOLD)
+CONFIG_PATH = Path(__file__).resolve().parent / "config.yaml"
+pair_timings: dict[str, float] = {}  # ms de la última evaluación por par
 logger = logging.getLogger("bot")
 
 # ======================================================
@@ -29,45 +48,70 @@ logger = logging.getLogger("bot")
 # ======================================================
 def parse_human_rule(formula: str) -> list[tuple[str, str]]:
     try:
-        rules = []
-        formula = (
-            formula.replace("→", "->")
-                   .replace("↗", ">")
-                   .replace("↘", "<")
-                   .replace("\n", "|")
-        )
-        for part in formula.split("|"):
-            if "->" not in part:
-                continue
-            condition, action = part.split("->", 1)
-            rules.append((condition.strip(), action.strip().upper()))
-        return rules
+        return compile_formula(formula).rules
     except Exception as e:
         logger.error(f"❌ Error parseando fórmula '{formula}': {e}")
         return []
 
 
-def evaluate_condition(expr: str, indicators: dict) -> bool:
-    match = re.match(r"([A-Za-z0-9_]+)\s*(>=|<=|>|<|==)\s*([A-Za-z0-9_\.]+)", expr)
-    if not match:
-        return False
-    left, op, right = match.groups()
+@lru_cache(maxsize=512)
+def _compiled_condition(expr: str):
+    try:
+        return compile_condition(expr)
+    except ValueError:
+        return None
 
-    def resolve(val):
-        try:
-            return float(val)
-        except ValueError:
-            return indicators.get(val.lower()) or indicators.get(val.upper())
 
-    left_val, right_val = resolve(left), resolve(right)
-    if left_val is None or right_val is None:
-        return False
-    return eval(f"{left_val} {op} {right_val}")
+def evaluate_condition(expr: str, indicators: dict) -> bool:
+    cond = _compiled_condition(expr)
+    return bool(cond(indicators)) if cond else False
 
 
-def can_trigger(symbol: str) -> bool:
-    """Evita repetir señales en ventana corta."""
-    now = datetime.utcnow()
+def load_bot_config() -> dict:
+    """Lee config.yaml (límites globales del bot). Devuelve {} si no existe."""
+    try:
+        with open(CONFIG_PATH, encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo leer {CONFIG_PATH.name}: {e}")
+        return {}
+
+
+def pair_periods(configs: dict, pair: str) -> dict:
+    """Períodos de indicadores del TradingConfig del par (los que escribe el optimizador)."""
+    cfg_db = configs.get(pair)
+    return periods_from_params(getattr(cfg_db, "params", None))
+
+
+def sync_indicators(client, pair: str, interval: str, periods: dict | None = None) -> dict | None:
+    """
+    Mantiene el estado incremental de indicadores del par.
+    La primera vez (o si cambian los períodos del par) se siembra con
+    HISTORY_BARS velas; después sólo se piden las velas posteriores al último
+    cierre aplicado.
+    """
+    state = indicator_states.get(pair, interval, periods)
+    if state.ready and state.last_time is not None:
+        kl = client.klines(pair, interval, startTime=state.last_time + 1)
+    else:
+        kl = client.klines(pair, interval, limit=HISTORY_BARS)
+
+    now_ms = int(time.time() * 1000)
+    forming = None
+    for k in kl:
+        if int(k[6]) >= now_ms:
+            forming = float(k[4])
+            continue
+        state.update(float(k[4]), int(k[0]))
+
+    if forming is not None:
+        return state.peek(forming)
+    return state.values() if state.ready else None
+
+
+def can_trigger(symbol: str, now: datetime | None = None) -> bool:
+    """Evita repetir señales en ventana corta (`now`: reloj de la vela en replay)."""
+    now = now or datetime.utcnow()
     last = last_signal_time.get(symbol)
     if last and (now - last).total_seconds() < RSI_COOLDOWN:
         return False
@@ -110,75 +154,302 @@ async def execute_signal(session, symbol: str, action: str, reason: str):
         logger.error(f"❌ Error ejecutando {action} en {symbol}: {e}", exc_info=True)
 
 
+# ======================================================
+# Estrategias
+# ======================================================
+def decide_signal(cfg_db, indicators: dict) -> dict | None:
+    """Aplica la estrategia configurada (RSI/EMA/MACD/SMART) a los indicadores del par."""
+    if not cfg_db:
+        return None
+    method = cfg_db.method
+    params = cfg_db.params or {}
+
+    # RSI Strategy
+    if method == "RSI":
+        rsi = indicators.get("rsi")
+        if not rsi:
+            return None
+        if rsi > float(params.get("rsiOverbought", 70)):
+            return {"action": "SELL", "reason": f"RSI Overbought ({rsi:.1f})"}
+        elif rsi < float(params.get("rsiOversold", 30)):
+            return {"action": "BUY", "reason": f"RSI Oversold ({rsi:.1f})"}
+
+    # EMA Strategy
+    elif method == "EMA":
+        short, long = indicators.get("ema_short"), indicators.get("ema_long")
+        if short and long:
+            if short > long:
+                return {"action": "BUY", "reason": "EMA Crossover"}
+            elif short < long:
+                return {"action": "SELL", "reason": "EMA Crossover"}
+
+    # MACD Strategy
+    elif method == "MACD":
+        macd, sig = indicators.get("macd"), indicators.get("signal")
+        if macd and sig:
+            if macd > sig:
+                return {"action": "BUY", "reason": "MACD Crossover"}
+            elif macd < sig:
+                return {"action": "SELL", "reason": "MACD Crossover"}
+
+    # SMART Strategy: señal del modelo activo en el registro del bot (`smart_signal`)
+    # o, si el par no tiene modelo cargado, la fórmula activada vía /smart/activate.
+    # Sólo con BOT_SMART_LIVE=1: sin eso las configs SMART no operan en vivo.
+    elif method == "SMART" and SMART_LIVE_TRADING:
+        pred = indicators.get("smart_signal")
+        if pred is not None:
+            action = SMART_ACTIONS.get(int(pred))
+            if action:
+                return {"action": action, "reason": f"SMART model ({indicators.get('smart_confidence', 0):.2f})"}
+            return None
+        formula = params.get("formula_human")
+        if formula:
+            action = formula_for_symbol(cfg_db.symbol, formula).evaluate(indicators)
+            if action in ("BUY", "SELL"):
+                return {"action": action, "reason": f"SMART {getattr(cfg_db, 'active_strategy', '') or ''}".strip()}
+
+    return None
+
+
 # ======================================================
 # LOOP PRINCIPAL
 # ======================================================
-async def run_loop(client, pairs, cfg):
+async def load_trading_configs() -> dict:
+    """TradingConfig por símbolo, con una sesión de vida corta."""
     async with SessionLocal() as session:
-        while True:
-            try:
-                result = await session.execute(select(TradingConfig))
-                configs = {c.symbol: c for c in result.scalars().all()}
-
-                for pair in pairs:
-                    if not pair.endswith("USDT"):
-                        continue
-
-                    if not can_trigger(pair):
-                        continue
-
-                    kl = client.klines(pair, cfg.get("interval", "1m"), limit=100)
-                    closes = [float(k[4]) for k in kl]
-                    if not closes:
-                        continue
-
-                    indicators = add_indicators(closes)
-                    cfg_db = configs.get(pair)
-                    signal = None
-                    method = None
-
-                    if cfg_db:
-                        method = cfg_db.method
-                        params = cfg_db.params or {}
-
-                        # RSI Strategy
-                        if method == "RSI":
-                            rsi = indicators.get("rsi")
-                            if not rsi:
-                                continue
-                            if rsi > float(params.get("rsiOverbought", 70)):
-                                signal = {"action": "SELL", "reason": f"RSI Overbought ({rsi:.1f})"}
-                            elif rsi < float(params.get("rsiOversold", 30)):
-                                signal = {"action": "BUY", "reason": f"RSI Oversold ({rsi:.1f})"}
-
-                        # EMA Strategy
-                        elif method == "EMA":
-                            short, long = indicators.get("ema_short"), indicators.get("ema_long")
-                            if short and long:
-                                if short > long:
-                                    signal = {"action": "BUY", "reason": "EMA Crossover"}
-                                elif short < long:
-                                    signal = {"action": "SELL", "reason": "EMA Crossover"}
-
-                        # MACD Strategy
-                        elif method == "MACD":
-                            macd, sig = indicators.get("macd"), indicators.get("signal")
-                            if macd and sig:
-                                if macd > sig:
-                                    signal = {"action": "BUY", "reason": "MACD Crossover"}
-                                elif macd < sig:
-                                    signal = {"action": "SELL", "reason": "MACD Crossover"}
-
-                    # === Ejecutar señales reales ===
-                    if signal:
-                        logger.info(f"⚡ Señal {signal['action']} en {pair} ({signal['reason']})")
-                        await execute_signal(session, pair, signal["action"], signal["reason"])
-
-                await asyncio.sleep(cfg.get("refresh_interval", 15))
+        result = await session.execute(select(TradingConfig))
+        return {c.symbol: c for c in result.scalars().all()}
+
+
+def _smart_strategy(cfg_db) -> str | None:
+    strategy = getattr(cfg_db, "active_strategy", None)
+    return strategy if strategy in STRATEGIES else None
+
+
+def uses_model(cfg_db) -> bool:
+    """Par SMART operable con un modelo cargado en el registro de este proceso."""
+    return bool(
+        SMART_LIVE_TRADING and cfg_db and cfg_db.method == "SMART"
+        and model_registry.get(cfg_db.symbol, _smart_strategy(cfg_db)) is not None
+    )
+
 
+async def sync_smart_models(configs: dict):
+    """
+    Registro de modelos del bot: activa el último manifest entrenado de cada
+    par SMART (el backend no comparte su registro en memoria). Si un retrain
+    dejó un manifest nuevo, se hace el swap en la próxima recarga de configs.
+    """
+    if not SMART_LIVE_TRADING:
+        return
+    for symbol, cfg_db in configs.items():
+        if cfg_db.method != "SMART":
+            continue
+        try:
+            manifest = await training_service.latest_manifest(symbol)
+            if not manifest:
+                continue
+            strategy = _smart_strategy(cfg_db)
+            mv = model_registry.get(symbol, strategy)
+            if mv is None or mv.manifest_path != manifest:
+                await model_registry.activate(symbol, manifest, strategy)
+        except Exception as e:
+            logger.error(f"❌ No se pudo cargar el modelo SMART de {symbol}: {e}")
+
+
+async def score_smart(pairs, configs: dict) -> dict:
+    """Señales del modelo para los pares SMART, con un predict por modelo (`score_symbols`)."""
+    syms = [p for p in pairs if uses_model(configs.get(p))]
+    if not syms:
+        return {}
+    try:
+        return await score_symbols(syms)
+    except Exception as e:
+        logger.error(f"❌ Error puntuando modelos SMART: {e}", exc_info=True)
+        return {}
+
+
+async def act_on_indicators(pair: str, indicators: dict, configs: dict, dry_run: bool = False,
+                            smart: dict | None = None) -> dict | None:
+    """
+    Decide y, si hay señal, la ejecuta en una sesión propia. Con `dry_run`
+    (replay) sólo devuelve la señal: ni órdenes ni DecisionLog. `smart` es la
+    señal del modelo ya puntuada en lote; si falta y el par usa modelo, se
+    puntúa acá.
+    """
+    cfg_db = configs.get(pair)
+    if smart is None and not dry_run and uses_model(cfg_db):
+        smart = (await score_smart([pair], configs)).get(pair)
+    if smart and "signal" in smart:
+        indicators = {**indicators, "smart_signal": smart["signal"], "smart_confidence": smart["confidence"]}
+    signal = decide_signal(cfg_db, indicators)
+    if dry_run:
+        if signal:
+            logger.info(f"🧪 [dry-run] Señal {signal['action']} en {pair} ({signal['reason']})")
+        return signal
+
+    # Toda decisión (incluido HOLD) va al log por la cola write-behind
+    write_queue.submit(DecisionLog(
+        symbol=pair,
+        method=getattr(cfg_db, "method", None) or "NONE",   # decision_logs.method es NOT NULL
+        signal=signal["action"] if signal else "HOLD",
+        price=indicators.get("close"),
+        params={k: v for k, v in indicators.items() if isinstance(v, (int, float))},
+        created_at=datetime.utcnow(),
+    ))
+
+    # === Ejecutar señales reales ===
+    if signal:
+        logger.info(f"⚡ Señal {signal['action']} en {pair} ({signal['reason']})")
+        async with SessionLocal() as session:
+            await execute_signal(session, pair, signal["action"], signal["reason"])
+    return signal
+
+
+async def evaluate_pair(client, pair: str, cfg: dict, configs: dict, sem: asyncio.Semaphore,
+                        smart: dict | None = None):
+    """Evalúa un par: klines fuera del event loop, decisión y ejecución con sesión propia."""
+    async with sem:
+        t0 = time.perf_counter()
+        try:
+            indicators = await asyncio.to_thread(
+                sync_indicators, client, pair, cfg.get("interval", "1m"), pair_periods(configs, pair)
+            )
+            if not indicators:
+                return
+
+            await act_on_indicators(pair, indicators, configs, smart=smart)
+        except Exception as e:
+            logger.error(f"❌ Error evaluando {pair}: {e}", exc_info=True)
+        finally:
+            pair_timings[pair] = (time.perf_counter() - t0) * 1000
+
+
+async def run_cycle(client, pairs, cfg):
+    """Un ciclo: todos los pares en paralelo, acotado por max_pairs_concurrent."""
+    configs = await load_trading_configs()
+    await sync_smart_models(configs)
+
+    sem = asyncio.Semaphore(max(1, int(cfg.get("max_pairs_concurrent", 6))))
+    due = [p for p in pairs if p.endswith("USDT") and can_trigger(p)]
+
+    t0 = time.perf_counter()
+    smart = await score_smart(due, configs)   # un predict por modelo para todos los pares SMART
+    await asyncio.gather(*(evaluate_pair(client, p, cfg, configs, sem, smart.get(p)) for p in due))
+    elapsed = (time.perf_counter() - t0) * 1000
+
+    if due:
+        detail = " | ".join(f"{p}={pair_timings.get(p, 0):.0f}ms" for p in due)
+        logger.info(f"⏱️ Timer [Bot cycle {len(due)} pairs]: {elapsed:.2f} ms | {detail}")
+    refresh = cfg.get("refresh_interval", 15)
+    if isinstance(refresh, (int, float)) and elapsed > refresh * 1000:
+        logger.warning(f"⚠️ El ciclo ({elapsed:.0f} ms) excede refresh_interval ({refresh}s)")
+
+
+async def run_loop(client, pairs, cfg):
+    while True:
+        try:
+            await run_cycle(client, pairs, cfg)
+            await asyncio.sleep(cfg.get("refresh_interval", 15))
+
+        except Exception as e:
+            logger.error(f"❌ Error en loop principal: {e}", exc_info=True)
+            await asyncio.sleep(5)
+
+
+# ======================================================
+# LOOP EN TIEMPO REAL (refresh_interval: RT)
+# ======================================================
+async def run_stream_loop(client, pairs, cfg, stream, dry_run: bool = False) -> list[dict]:
+    """
+    Evalúa estrategias al cerrar cada vela o cuando el precio se mueve más de
+    `price_trigger_pct` desde la última evaluación del par.
+
+    Con `dry_run` (replay) no se ejecuta nada: el cooldown usa la hora de la
+    vela y se devuelven las decisiones tomadas, en orden.
+    """
+    interval = cfg.get("interval", "1m")
+    step = interval_ms(interval)
+    trigger_pct = float(cfg.get("price_trigger_pct", 0.5))
+    config_ttl = float(cfg.get("config_refresh_sec", 60))
+    pairs = [p for p in pairs if p.endswith("USDT")]
+
+    configs = await load_trading_configs()
+    configs_at = time.monotonic()
+    if not dry_run:
+        await sync_smart_models(configs)
+
+    # Siembra única del estado por REST (con los períodos de cada par)
+    for pair in pairs:
+        try:
+            await asyncio.to_thread(sync_indicators, client, pair, interval, pair_periods(configs, pair))
+        except Exception as e:
+            logger.error(f"❌ Error sembrando indicadores de {pair}: {e}")
+    last_eval_price: dict[str, float] = {}
+    sem = asyncio.Semaphore(max(1, int(cfg.get("max_pairs_concurrent", 6))))
+    tasks: set[asyncio.Task] = set()
+    decisions: list[dict] = []
+
+    async def act(pair: str, indicators: dict):
+        async with sem:
+            try:
+                await act_on_indicators(pair, indicators, configs)
             except Exception as e:
-                logger.error(f"❌ Error en loop principal: {e}", exc_info=True)
-                await asyncio.sleep(5)
+                logger.error(f"❌ Error ejecutando señal en {pair}: {e}", exc_info=True)
+
+    logger.info(f"📡 Modo tiempo real: {len(pairs)} pares, {interval}, trigger {trigger_pct}%")
+    async for ev in stream:
+        pair = ev.symbol
+        if pair not in pairs:
+            continue
+
+        periods = pair_periods(configs, pair)
+        state = indicator_states.get(pair, interval, periods)
+        if not state.ready or state.last_time is None or ev.open_time - state.last_time > step:
+            # el stream se reconectó y se perdieron velas cerradas, o cambiaron los
+            # períodos del par (optimizador): se resiembra por REST
+            logger.warning(f"⚠️ Resincronizando indicadores de {pair} ({interval})")
+            try:
+                await asyncio.to_thread(sync_indicators, client, pair, interval, periods)
+            except Exception as e:
+                logger.error(f"❌ Error resincronizando {pair}: {e}")
+                continue
+        if ev.closed:
+            indicators = state.update(ev.close, ev.open_time)
+        else:
+            ref = last_eval_price.get(pair)
+            if ref and abs(ev.close - ref) / ref * 100.0 < trigger_pct:
+                continue
+            indicators = state.peek(ev.close)
+
+        last_eval_price[pair] = ev.close
+        clock = datetime.utcfromtimestamp((ev.event_time or ev.close_time) / 1000) if dry_run else None
+        if not can_trigger(pair, clock):
+            continue
+
+        if time.monotonic() - configs_at > config_ttl:
+            configs = await load_trading_configs()
+            configs_at = time.monotonic()
+            if not dry_run:
+                await sync_smart_models(configs)
+
+        if dry_run:
+            signal = await act_on_indicators(pair, indicators, configs, dry_run=True)
+            decisions.append({
+                "symbol": pair,
+                "time": ev.open_time,
+                "closed": ev.closed,
+                "action": signal["action"] if signal else "HOLD",
+            })
+            continue
+
+        task = asyncio.create_task(act(pair, indicators))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    return decisions
 
 
 # ======================================================
@@ -186,9 +457,14 @@ async def run_loop(client, pairs, cfg):
 # ======================================================
 async def run_bot():
     logging.basicConfig(level=logging.INFO)
+    yaml_cfg = load_bot_config()
+    refresh = yaml_cfg.get("refresh_interval", 15)
     cfg = {
         "interval": "1m",
-        "refresh_interval": 15,
+        "refresh_interval": refresh if isinstance(refresh, (int, float)) else 15,
+        "realtime": str(refresh).upper() == "RT",
+        "price_trigger_pct": float(yaml_cfg.get("price_trigger_pct", 0.5)),
+        "max_pairs_concurrent": int(yaml_cfg.get("max_pairs_concurrent", 6)),
     }
 
     pairs = get_active_symbols()
@@ -197,9 +473,30 @@ async def run_bot():
         return
 
     logging.info(f"📊 Pairs activos: {pairs}")
+    replay = os.getenv("BOT_REPLAY_FILE")
+    if replay:
+        # Replay: velas e indicadores sólo de la grabación y sin órdenes reales
+        stream = ReplayKlineStream(replay)
+        logging.info(f"🎞️ Reproduciendo velas grabadas desde {replay} (dry-run)")
+        decisions = await run_stream_loop(stream.client(), pairs, cfg, stream, dry_run=True)
+        signals = sum(d["action"] != "HOLD" for d in decisions)
+        logging.info(f"🎞️ Replay terminado: {len(decisions)} decisiones, {signals} señales")
+        return
+
     client = get_spot()
-    logging.info("🚀 Entrando en loop principal (ejecución real)...")
-    await run_loop(client, pairs, cfg)
+    # Mutaciones por el escritor único del backend (si está escuchando)
+    await connect_remote()
+    write_queue.start()
+    try:
+        if cfg["realtime"]:
+            logging.info("🚀 Entrando en loop en tiempo real (WS klines)...")
+            await run_stream_loop(client, pairs, cfg, BinanceKlineStream(pairs, cfg["interval"]))
+        else:
+            logging.info("🚀 Entrando en loop principal (ejecución real)...")
+            await run_loop(client, pairs, cfg)
+    finally:
+        await write_queue.stop()
+        await get_writer().stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+"""trade/position composite indexes
+
+Revision ID: a41c7d2e9b10
+Revises: 8c48aaf76550
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a41c7d2e9b10"
+down_revision: Union[str, None] = "8c48aaf76550"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Primer/último trade por posición (subconsultas de /trades/closed, /trades/stats, /profitability)
+    op.create_index("ix_trades_position_created", "trades", ["position_id", "created_at"], if_not_exists=True)
+    # Keyset de posiciones cerradas: status + (closed_at, id)
+    op.create_index("ix_positions_status_closed", "positions", ["status", "closed_at", "id"], if_not_exists=True)
+    # Rentabilidad por símbolo en un rango de cierre
+    op.create_index("ix_positions_symbol_status_closed", "positions", ["symbol", "status", "closed_at"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_positions_symbol_status_closed", table_name="positions", if_exists=True)
+    op.drop_index("ix_positions_status_closed", table_name="positions", if_exists=True)
+    op.drop_index("ix_trades_position_created", table_name="trades", if_exists=True)
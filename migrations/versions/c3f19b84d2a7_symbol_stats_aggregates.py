@@ -0,0 +1,51 @@
+"""symbol_stats materialized PnL aggregates
+
+Revision ID: c3f19b84d2a7
+Revises: a41c7d2e9b10
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c3f19b84d2a7"
+down_revision: Union[str, None] = "a41c7d2e9b10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _counters():
+    return [
+        sa.Column("wins", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("losses", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("closed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("realized_pnl", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("fees", sa.Float(), nullable=False, server_default="0"),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "symbol_stats",
+        sa.Column("symbol", sa.String(length=20), primary_key=True),
+        *_counters(),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        "symbol_stats_buckets",
+        sa.Column("symbol", sa.String(length=20), primary_key=True),
+        sa.Column("res", sa.String(length=4), primary_key=True),
+        sa.Column("bucket_start", sa.DateTime(), primary_key=True),
+        *_counters(),
+    )
+    op.create_index("ix_symbol_stats_buckets_res_start", "symbol_stats_buckets", ["res", "bucket_start"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_symbol_stats_buckets_res_start", table_name="symbol_stats_buckets")
+    op.drop_table("symbol_stats_buckets")
+    op.drop_table("symbol_stats")
@@ -0,0 +1,38 @@
+"""equity_rollups OHLC buckets for equity history
+
+Revision ID: d7e2a5c90f14
+Revises: c3f19b84d2a7
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d7e2a5c90f14"
+down_revision: Union[str, None] = "c3f19b84d2a7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "equity_rollups",
+        sa.Column("res", sa.String(length=3), primary_key=True),
+        sa.Column("bucket_start", sa.DateTime(), primary_key=True),
+        sa.Column("open", sa.Float(), nullable=False),
+        sa.Column("high", sa.Float(), nullable=False),
+        sa.Column("low", sa.Float(), nullable=False),
+        sa.Column("close", sa.Float(), nullable=False),
+        sa.Column("sum_total", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("free_usdt", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("invested_usdt", sa.Float(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("equity_rollups")
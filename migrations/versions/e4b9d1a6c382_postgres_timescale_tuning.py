@@ -0,0 +1,29 @@
+"""postgres/timescale: hypertables for equity_snapshots and decision_logs
+
+Revision ID: e4b9d1a6c382
+Revises: d7e2a5c90f14
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.core.pg_migrate import tune_postgres, untune_postgres
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4b9d1a6c382"
+down_revision: Union[str, None] = "d7e2a5c90f14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # No-op en SQLite
+    tune_postgres(op.get_bind())
+
+
+def downgrade() -> None:
+    # Las hypertables no se revierten; sólo los índices BRIN del modo sin Timescale
+    untune_postgres(op.get_bind())
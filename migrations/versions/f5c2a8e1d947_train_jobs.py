@@ -0,0 +1,43 @@
+"""train_jobs status table for the training job service
+
+Revision ID: f5c2a8e1d947
+Revises: e4b9d1a6c382
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f5c2a8e1d947"
+down_revision: Union[str, None] = "e4b9d1a6c382"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "train_jobs",
+        sa.Column("id", sa.String(length=32), primary_key=True),
+        sa.Column("kind", sa.String(length=16), nullable=False, server_default="smart"),
+        sa.Column("pair", sa.String(length=20), nullable=True),
+        sa.Column("timeframe", sa.String(length=8), nullable=True),
+        sa.Column("status", sa.String(length=12), nullable=False, server_default="queued"),
+        sa.Column("progress", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("message", sa.Text(), nullable=True),
+        sa.Column("params", sa.JSON(), nullable=True),
+        sa.Column("result", sa.JSON(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_train_jobs_status", "train_jobs", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_train_jobs_status", table_name="train_jobs")
+    op.drop_table("train_jobs")
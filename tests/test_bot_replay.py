@@ -0,0 +1,76 @@
+# tests/test_bot_replay.py
+"""Replay del bot: indicadores desde la grabación y decisiones en dry-run."""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+bot = pytest.importorskip("bot")
+
+from app.core.indicator_state import indicator_states  # noqa: E402
+from app.core.kline_stream import ReplayKlineStream  # noqa: E402
+
+MINUTE = 60_000
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % MINUTE
+
+
+def _closes() -> list[float]:
+    # 30 velas bajando en zigzag (RSI ~30) y 30 subiendo (RSI ~70)
+    p, out = 100.0, []
+    for i in range(30):
+        p += -3 if i % 2 == 0 else 1
+        out.append(p)
+    for i in range(30):
+        p += 3 if i % 2 == 0 else -1
+        out.append(p)
+    return out
+
+
+def _write_recording(path: Path) -> Path:
+    with open(path, "w", encoding="utf-8") as f:
+        for i, c in enumerate(_closes()):
+            t = T0 + i * MINUTE
+            k = {"t": t, "T": t + MINUTE - 1, "s": "BTCUSDT", "i": "1m",
+                 "o": c, "h": c, "l": c, "c": c, "v": 1.0, "x": True}
+            f.write(json.dumps({"stream": "btcusdt@kline_1m", "data": {"e": "kline", "E": t + MINUTE, "k": k}}) + "\n")
+    return path
+
+
+def test_replay_uses_recording_and_never_executes(tmp_path, monkeypatch):
+    cfg_db = SimpleNamespace(symbol="BTCUSDT", method="RSI", active_strategy=None,
+                             params={"rsiOversold": 35, "rsiOverbought": 65})
+
+    async def configs():
+        return {"BTCUSDT": cfg_db}
+
+    async def no_orders(*args, **kwargs):
+        raise AssertionError("replay no debe ejecutar órdenes")
+
+    monkeypatch.setattr(bot, "load_trading_configs", configs)
+    monkeypatch.setattr(bot, "execute_signal", no_orders)
+    monkeypatch.setattr(bot.write_queue, "submit", no_orders)
+    bot.last_signal_time.clear()
+    indicator_states.drop("BTCUSDT")
+
+    stream = ReplayKlineStream(_write_recording(tmp_path / "klines.jsonl"))
+    decisions = asyncio.run(
+        bot.run_stream_loop(stream.client(), ["BTCUSDT"], {"interval": "1m"}, stream, dry_run=True)
+    )
+
+    # Cooldown de 120 s con el reloj de las velas: una decisión cada 2 velas
+    assert [d["time"] for d in decisions] == [T0 + i * MINUTE for i in range(0, 60, 2)]
+    signals = [(d["action"], (d["time"] - T0) // MINUTE) for d in decisions if d["action"] != "HOLD"]
+    assert signals[0] == ("BUY", 20)
+    assert all(a == "BUY" for a, i in signals if i < 30)
+    assert ("SELL", 46) in signals
+    assert all(a == "SELL" for a, i in signals if i >= 30)
+
+    # El estado quedó con las velas grabadas, no con las actuales de Binance
+    state = indicator_states.find("BTCUSDT", "1m")
+    assert state.last_time == T0 + 59 * MINUTE
+    assert state.bars == 60